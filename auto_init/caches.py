@@ -0,0 +1,268 @@
+"""
+Registries and bounded caches keyed by types, used by ``AutoInitContext`` to hold registrations and plans.
+
+The weak variants store their entries on the key classes, so that dynamically created classes can be collected.
+"""
+import itertools
+import threading
+import weakref
+from collections import OrderedDict
+from collections.abc import MutableMapping, MutableSet
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from .type_info import classify_type
+
+
+# Attribute of classes under which entries of _WeakTypeDict are stored, keyed by the dictionary's token.
+_TYPE_ENTRIES_ATTR = '__auto_init_entries__'
+
+# Guards creation of the entries of a class.
+_type_entries_lock = threading.Lock()
+
+
+class _Token:
+    __slots__ = ('__weakref__',)
+
+
+def _type_entries(cls: type, create: bool = False) -> Optional[weakref.WeakKeyDictionary]:
+    """
+    Returns the entries of _WeakTypeDict stored on a class, created if ``create`` is set and the class
+    can hold attributes.
+    """
+    entries = cls.__dict__.get(_TYPE_ENTRIES_ATTR)
+    if entries is None and create:
+        with _type_entries_lock:
+            entries = cls.__dict__.get(_TYPE_ENTRIES_ATTR)
+            if entries is None:
+                try:
+                    setattr(cls, _TYPE_ENTRIES_ATTR, weakref.WeakKeyDictionary())
+                    entries = cls.__dict__[_TYPE_ENTRIES_ATTR]
+                except (TypeError, AttributeError, KeyError):
+                    # Builtin and extension types
+                    pass
+    return entries
+
+
+class _WeakTypeDict(MutableMapping):
+    """
+    Dictionary keyed by types that stores each entry on its key class, or on a class an annotation refers to,
+    so that the entry does not keep the class alive. Other keys are kept in an ordinary dictionary.
+    """
+
+    def __init__(self, items=()):
+        self._token = _Token()
+        self._annotations_token = _Token()
+        self._types = weakref.WeakSet()
+        self._anchors = weakref.WeakSet()
+        self._other = {}
+        self.update(items)
+
+    def __getitem__(self, key):
+        if isinstance(key, type):
+            entries = key.__dict__.get(_TYPE_ENTRIES_ATTR)
+            if entries is not None and self._token in entries:
+                return entries[self._token]
+        else:
+            anchor = classify_type(key).anchor
+            if anchor is not None:
+                entries = anchor.__dict__.get(_TYPE_ENTRIES_ATTR)
+                annotations = entries.get(self._annotations_token) if entries is not None else None
+                if annotations is None:
+                    raise KeyError(key)
+                return annotations[key]
+        return self._other[key]
+
+    def __setitem__(self, key, value):
+        if isinstance(key, type):
+            entries = _type_entries(key, create=True)
+            if entries is not None:
+                entries[self._token] = value
+                self._types.add(key)
+                return
+        else:
+            anchor = classify_type(key).anchor
+            if anchor is not None:
+                entries = _type_entries(anchor, create=True)
+                annotations = entries.get(self._annotations_token)
+                if annotations is None:
+                    annotations = entries.setdefault(self._annotations_token, {})
+                annotations[key] = value
+                self._anchors.add(anchor)
+                return
+        self._other[key] = value
+
+    def __delitem__(self, key):
+        if isinstance(key, type):
+            entries = key.__dict__.get(_TYPE_ENTRIES_ATTR)
+            if entries is not None and self._token in entries:
+                del entries[self._token]
+                self._types.discard(key)
+                return
+        else:
+            anchor = classify_type(key).anchor
+            if anchor is not None:
+                entries = anchor.__dict__.get(_TYPE_ENTRIES_ATTR)
+                annotations = entries.get(self._annotations_token) if entries is not None else None
+                if annotations is None:
+                    raise KeyError(key)
+                del annotations[key]
+                return
+        del self._other[key]
+
+    def _anchored(self) -> Iterator[Dict[Any, Any]]:
+        for anchor in list(self._anchors):
+            annotations = anchor.__dict__[_TYPE_ENTRIES_ATTR].get(self._annotations_token)
+            if annotations:
+                yield annotations
+
+    def __iter__(self):
+        yield from list(self._types)
+        for annotations in self._anchored():
+            yield from list(annotations)
+        yield from list(self._other)
+
+    def __len__(self):
+        return len(self._types) + sum(map(len, self._anchored())) + len(self._other)
+
+    def clear(self):
+        for key in list(self._types):
+            key.__dict__[_TYPE_ENTRIES_ATTR].pop(self._token, None)
+        for anchor in list(self._anchors):
+            anchor.__dict__[_TYPE_ENTRIES_ATTR].pop(self._annotations_token, None)
+        self._types.clear()
+        self._anchors.clear()
+        self._other.clear()
+
+
+class _WeakTypeSet(MutableSet):
+    """
+    Set of types that does not keep the types alive, see ``_WeakTypeDict``.
+    """
+
+    def __init__(self, items=()):
+        self._types = _WeakTypeDict((t, True) for t in items)
+
+    def __contains__(self, key):
+        return key in self._types
+
+    def __iter__(self):
+        return iter(self._types)
+
+    def __len__(self):
+        return len(self._types)
+
+    def add(self, key):
+        self._types[key] = True
+
+    def discard(self, key):
+        self._types.pop(key, None)
+
+
+class _LRUCache(OrderedDict):
+    """
+    Cache holding at most ``maxsize`` entries, evicting the least recently used ones that are not ``pinned``.
+    Every read reorders the entries, so all access goes through a lock.
+    """
+
+    def __init__(self, maxsize: int, pinned: Callable[[Any], bool] = None):
+        super().__init__()
+        self.maxsize = maxsize
+        self.pinned = pinned
+        self._lock = threading.RLock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self[key]
+            except KeyError:
+                return default
+            self.move_to_end(key)
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            super().__setitem__(key, value)
+            self.move_to_end(key)
+            while len(self) > self.maxsize:
+                evicted = next((k for k, v in self.items() if self.pinned is None or not self.pinned(v)), self)
+                if evicted is self:
+                    break
+                super().__delitem__(evicted)
+
+    def __delitem__(self, key):
+        with self._lock:
+            super().__delitem__(key)
+
+    def pop(self, key, *default):
+        with self._lock:
+            return super().pop(key, *default)
+
+    def clear(self):
+        with self._lock:
+            super().clear()
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(super().__iter__()))
+
+    def keys(self):
+        with self._lock:
+            return list(super().keys())
+
+    def values(self):
+        with self._lock:
+            return list(super().values())
+
+    def items(self):
+        with self._lock:
+            return list(super().items())
+
+
+class _WeakLRUCache(MutableMapping):
+    """
+    Bounded cache like ``_LRUCache`` that does not keep its keys alive, see ``_WeakTypeDict``.
+    The keys cannot be kept in order, so each entry holds the tick of its last use and eviction scans them.
+    """
+
+    def __init__(self, maxsize: int, pinned: Callable[[Any], bool] = None):
+        self.maxsize = maxsize
+        self.pinned = pinned
+        self._entries = _WeakTypeDict()
+        self._ticks = itertools.count()
+        self._lock = threading.RLock()
+
+    def __getitem__(self, key):
+        entry = self._entries[key]
+        entry[1] = next(self._ticks)
+        return entry[0]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._entries[key] = [value, next(self._ticks)]
+            while len(self._entries) > self.maxsize:
+                unpinned = [
+                    (entry[1], k) for k, entry in self._entries.items()
+                    if self.pinned is None or not self.pinned(entry[0])
+                ]
+                if not unpinned:
+                    break
+                del self._entries[min(unpinned, key=lambda item: item[0])[1]]
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._entries[key]
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._entries))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def values(self):
+        with self._lock:
+            return [entry[0] for entry in self._entries.values()]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
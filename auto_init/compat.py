@@ -0,0 +1,38 @@
+"""
+Fallbacks for features of the standard library missing from older versions of Python.
+"""
+try:
+    from asyncio import get_running_loop
+except ImportError:  # Python < 3.7
+    from asyncio import get_event_loop as get_running_loop
+
+try:
+    from typing import ForwardRef
+except ImportError:  # Python < 3.7
+    from typing import _ForwardRef as ForwardRef
+
+try:
+    from typing import get_args, get_origin
+except ImportError:  # Python < 3.8
+    def get_origin(annotation):
+        origin = getattr(annotation, '__origin__', None)
+        # In Python 3.6 the origin of List[T] is List, whose builtin counterpart is __extra__
+        while getattr(origin, '__origin__', None) is not None:
+            origin = origin.__origin__
+        return getattr(origin, '__extra__', None) or origin
+
+    def get_args(annotation):
+        return getattr(annotation, '__args__', None) or ()
+
+# Empty tuples when missing, so that isinstance() checks match nothing.
+try:
+    from types import GenericAlias
+except ImportError:  # Python < 3.9
+    GenericAlias = ()
+
+try:
+    from types import UnionType
+except ImportError:  # Python < 3.10
+    UnionType = ()
+
+__all__ = ['ForwardRef', 'GenericAlias', 'UnionType', 'get_args', 'get_origin', 'get_running_loop']
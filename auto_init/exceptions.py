@@ -0,0 +1,40 @@
+"""
+Exceptions raised by ``AutoInitContext``.
+"""
+from typing import Dict, Type
+
+
+class CreationFailed(Exception):
+    pass
+
+
+class InitialisationFailed(Exception):
+    pass
+
+
+class CompilationFailed(CreationFailed):
+    """
+    Raised by ``AutoInitContext.compile`` with all the types reachable from the roots that cannot be provided.
+    """
+
+    def __init__(self, errors: Dict[Type, Exception]):
+        self.errors = errors
+        super().__init__(
+            'Compilation failed for:\n' + '\n'.join(f'  {t}: {e!r}' for t, e in errors.items())
+        )
+
+
+class WarmUpFailed(CreationFailed):
+    """
+    Raised by ``AutoInitContext.warm_up`` with all the singletons that could not be created.
+    """
+
+    def __init__(self, errors: Dict[Type, Exception]):
+        self.errors = errors
+        super().__init__(
+            'Warm-up failed for:\n' + '\n'.join(f'  {t}: {e!r}' for t, e in errors.items())
+        )
+
+
+class RegistrationFailed(Exception):
+    pass
@@ -0,0 +1,348 @@
+"""
+Static dependency graph of the types an ``AutoInitContext`` provides, see ``AutoInitContext.graph``.
+
+The graph is built from the compiled plans alone, no instance is created. Nodes are types annotated with the
+kind of their provider and edges are the injected attributes and constructor arguments.
+Metrics follow the resolution algorithm: a transient instance is created for every attribute, singletons are
+shared and an attribute of a type that is already being initialised on the path is left ``None``,
+a cycle break. Lazy attributes are part of the graph but not of the metrics, they are resolved on access.
+"""
+import json
+from typing import Any, Dict, List, Optional, Set, Tuple, Type
+
+# Kinds of nodes
+
+# Builtin values and ``typing`` constructs such as ``Optional[X]``, initialised without dependencies.
+PRIMITIVE = 'primitive'
+
+# Registered instance.
+INSTANCE = 'instance'
+
+# Registered factory, a new instance on every request. Its dependencies are not known.
+FACTORY = 'factory'
+
+# Registered pool, one instance checked out per resolution.
+POOL = 'pool'
+
+# Singleton created by this context.
+SINGLETON = 'singleton'
+
+# Singleton registered in and created by the parent context.
+PARENT = 'parent'
+
+# Type of which one instance is shared by everything a resolution creates.
+PER_RESOLUTION = 'per_resolution'
+
+# Dataclass or named tuple created by calling its constructor with the required fields.
+DATACLASS = 'dataclass'
+
+# Class created by the context, a new instance on every request.
+TRANSIENT = 'transient'
+
+# Kinds of nodes that are left ``None`` when requested while already being initialised.
+_BREAKABLE_KINDS = (DATACLASS, TRANSIENT)
+
+# Kinds of nodes that create a new object on every request.
+_CREATING_KINDS = (FACTORY, DATACLASS, TRANSIENT)
+
+# Kinds of nodes that create an object when they are not shared yet.
+_SHARED_KINDS = (SINGLETON, PER_RESOLUTION)
+
+_DOT_SHAPES = {
+    PRIMITIVE: 'plaintext',
+    INSTANCE: 'note',
+    FACTORY: 'component',
+    POOL: 'cylinder',
+    SINGLETON: 'doubleoctagon',
+    PARENT: 'doubleoctagon',
+    PER_RESOLUTION: 'octagon',
+    DATACLASS: 'box3d',
+    TRANSIENT: 'box',
+}
+
+
+def _type_name(instance_type: Any) -> str:
+    if isinstance(instance_type, type):
+        return f'{instance_type.__module__}:{instance_type.__qualname__}'
+    return repr(instance_type)
+
+
+def _dot_label(instance_type: Any) -> str:
+    label = getattr(instance_type, '__qualname__', None) if isinstance(instance_type, type) else None
+    return (label or repr(instance_type)).replace('\\', '\\\\').replace('"', '\\"')
+
+
+class GraphEdge:
+    __slots__ = ('source', 'target', 'attr_name', 'lazy', 'cycle_break')
+
+    def __init__(self, source: "GraphNode", target: "GraphNode", attr_name: str, lazy: bool):
+        self.source = source
+        self.target = target
+        self.attr_name = attr_name
+        self.lazy = lazy
+
+        # Set if the attribute is left ``None`` in resolutions of the roots of the graph
+        # because its type is already being initialised
+        self.cycle_break = False
+
+    def __repr__(self):
+        return f'<GraphEdge {_dot_label(self.source.instance_type)}.{self.attr_name}>'
+
+
+class GraphNode:
+    """
+    ``cyclic`` is set for types that are part of a circular dependency: their metrics depend on the path
+    on which they are reached. ``depth``, ``objects`` and ``cost`` describe the resolution of the type
+    when it is requested directly: the length of the longest chain of dependencies, the number of objects
+    created once all singletons it depends on exist, and the cost, see ``DependencyGraph``.
+    """
+
+    __slots__ = ('instance_type', 'kind', 'cyclic', 'edges', 'fan_in', 'depth', 'objects', 'cost')
+
+    def __init__(self, instance_type: Type, kind: str, cyclic: bool):
+        self.instance_type = instance_type
+        self.kind = kind
+        self.cyclic = cyclic
+        self.edges: List[GraphEdge] = []
+        self.fan_in = 0
+        self.depth = 0
+        self.objects = 0
+        self.cost = 0.0
+
+    @property
+    def fan_out(self) -> int:
+        return len(self.edges)
+
+    def __repr__(self):
+        return f'<GraphNode {_dot_label(self.instance_type)} {self.kind}>'
+
+
+class DependencyGraph:
+    """
+    Nodes and edges reachable from ``roots``, with metrics computed by ``analyse()``.
+
+    The cost of creating an object is 1 for the kinds of nodes that create objects, or the time
+    given for its type in ``timings``, which excludes the time spent creating dependencies.
+    """
+
+    def __init__(self, roots: List[Type], timings: Dict[Type, float] = None):
+        self.roots = roots
+        self.timings = timings
+        self.nodes: Dict[Type, GraphNode] = {}
+        self.edges: List[GraphEdge] = []
+
+    def add_node(self, instance_type: Type, kind: str, cyclic: bool = False) -> GraphNode:
+        node = self.nodes[instance_type] = GraphNode(instance_type, kind, cyclic)
+        return node
+
+    def add_edge(self, source_type: Type, target_type: Type, attr_name: str, lazy: bool = False) -> GraphEdge:
+        source, target = self.nodes[source_type], self.nodes[target_type]
+        edge = GraphEdge(source, target, attr_name, lazy)
+        source.edges.append(edge)
+        target.fan_in += 1
+        self.edges.append(edge)
+        return edge
+
+    def _weight(self, node: GraphNode) -> float:
+        if self.timings is not None:
+            return self.timings.get(node.instance_type, 0.0)
+        return 1.0 if node.kind in _CREATING_KINDS else 0.0
+
+    def analyse(self):
+        """
+        Computes the metrics of all nodes and marks the edges that break cycles in resolutions of the roots.
+        Results of types that are not part of a cycle do not depend on the path and are computed once.
+        """
+        memo: Dict[GraphNode, Tuple[int, int, float]] = {}
+        mark = True
+
+        def start(node: GraphNode) -> list:
+            # Node, remaining edges, objects, depth of the dependencies and cost
+            objects = 1 if node.kind in _CREATING_KINDS or node.kind in _SHARED_KINDS else 0
+            return [node, iter(node.edges), objects, 0, self._weight(node)]
+
+        def add(frame: list, objects: int, depth: int, cost: float):
+            frame[2] += objects
+            frame[3] = max(frame[3], depth)
+            frame[4] += cost
+
+        def resolve(node: GraphNode) -> Tuple[int, int, float]:
+            """
+            Depth-first traversal with an explicit stack, long chains of dependencies exceed the recursion limit.
+            """
+            result = memo.get(node)
+            if result is not None:
+                return result
+            path: Set[GraphNode] = {node}
+            stack = [start(node)]
+            while stack:
+                frame = stack[-1]
+                for edge in frame[1]:
+                    target = edge.target
+                    if edge.lazy:
+                        continue
+                    if target in path:
+                        # Left None, or the singleton being created is injected
+                        if mark and target.kind in _BREAKABLE_KINDS:
+                            edge.cycle_break = True
+                        continue
+                    if target.kind in _BREAKABLE_KINDS:
+                        result = memo.get(target)
+                        if result is None:
+                            path.add(target)
+                            stack.append(start(target))
+                            break
+                        add(frame, *result)
+                    elif target.kind in (SINGLETON, PARENT, PER_RESOLUTION):
+                        # Shared, counted once by the node requested, see _shared_per_resolution()
+                        add(frame, 0, 1, 0.0)
+                    else:
+                        add(frame, 1 if target.kind in _CREATING_KINDS else 0, 1, self._weight(target))
+                else:
+                    stack.pop()
+                    done = frame[0]
+                    path.discard(done)
+                    result = (frame[2], frame[3] + 1, frame[4])
+                    if not done.cyclic:
+                        memo[done] = result
+                    if stack:
+                        add(stack[-1], *result)
+            return result
+
+        for root in self.roots:
+            resolve(self.nodes[root])
+
+        # Types requested directly, some cycles are broken elsewhere
+        memo.clear()
+        mark = False
+        for node in self.nodes.values():
+            node.objects, node.depth, node.cost = resolve(node)
+        for node in self.nodes.values():
+            for shared in self._shared_per_resolution(node):
+                shared_objects, _, shared_cost = resolve(shared)
+                node.objects += shared_objects
+                node.cost += shared_cost
+        return self
+
+    @staticmethod
+    def _shared_per_resolution(node: GraphNode) -> List[GraphNode]:
+        """
+        Returns the per-resolution nodes created once by a resolution of ``node``, other than ``node``:
+        those reached without going through singletons, which exist already.
+        """
+        found = []
+        seen = {node}
+        stack = [node]
+        while stack:
+            for edge in stack.pop().edges:
+                target = edge.target
+                if edge.lazy or target in seen or target.kind in (SINGLETON, PARENT):
+                    continue
+                seen.add(target)
+                stack.append(target)
+                if target.kind is PER_RESOLUTION:
+                    found.append(target)
+        return found
+
+    def reachable(self, root: Type) -> List[GraphNode]:
+        """
+        Returns the nodes created or injected when ``root`` is requested, lazy attributes excluded.
+        """
+        seen = {self.nodes[root]}
+        stack = [self.nodes[root]]
+        while stack:
+            for edge in stack.pop().edges:
+                if not edge.lazy and edge.target not in seen:
+                    seen.add(edge.target)
+                    stack.append(edge.target)
+        return list(seen)
+
+    def dominant(self, fraction: float = 0.5) -> List[GraphNode]:
+        """
+        Returns the nodes, other than the roots, whose transitive cost is at least ``fraction``
+        of the cost of a root that depends on them, the most expensive first.
+        """
+        found = {}
+        for root in self.roots:
+            root_cost = self.nodes[root].cost
+            for node in self.reachable(root):
+                if node.instance_type not in self.roots and node.cost > 0 and node.cost >= fraction * root_cost:
+                    found[node.instance_type] = node
+        return sorted(found.values(), key=lambda node: node.cost, reverse=True)
+
+    def metrics(self, fraction: float = 0.5) -> Dict[str, Any]:
+        """
+        Returns the size of the graph, the maximum depth and fan-out, and for each root its depth,
+        the number of objects created per request once all singletons exist, the number of singletons
+        it depends on and its cost.
+        """
+        roots = {}
+        for root in self.roots:
+            node = self.nodes[root]
+            singletons = sum(1 for n in self.reachable(root) if n.kind is SINGLETON and n is not node)
+            roots[_type_name(root)] = {
+                'depth': node.depth,
+                'objects': node.objects,
+                'singletons': singletons,
+                'cost': node.cost,
+            }
+        return {
+            'types': len(self.nodes),
+            'edges': len(self.edges),
+            'max_depth': max((node.depth for node in self.nodes.values()), default=0),
+            'max_fan_out': max((node.fan_out for node in self.nodes.values()), default=0),
+            'roots': roots,
+            'dominant': [_type_name(node.instance_type) for node in self.dominant(fraction)],
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        ids = {node: i for i, node in enumerate(self.nodes.values())}
+        return {
+            'roots': [ids[self.nodes[root]] for root in self.roots],
+            'nodes': [
+                {
+                    'id': ids[node],
+                    'type': _type_name(node.instance_type),
+                    'kind': node.kind,
+                    'cyclic': node.cyclic,
+                    'fan_in': node.fan_in,
+                    'fan_out': node.fan_out,
+                    'depth': node.depth,
+                    'objects': node.objects,
+                    'cost': node.cost,
+                }
+                for node in self.nodes.values()
+            ],
+            'edges': [
+                {
+                    'source': ids[edge.source],
+                    'target': ids[edge.target],
+                    'attr_name': edge.attr_name,
+                    'lazy': edge.lazy,
+                    'cycle_break': edge.cycle_break,
+                }
+                for edge in self.edges
+            ],
+            'metrics': self.metrics(),
+        }
+
+    def to_json(self, indent: Optional[int] = None) -> str:
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def to_dot(self, name: str = 'dependencies') -> str:
+        """
+        Returns the graph in the Graphviz DOT language. Cycle breaks are dashed, lazy attributes dotted.
+        """
+        ids = {node: f'n{i}' for i, node in enumerate(self.nodes.values())}
+        lines = [f'digraph "{name}" {{', '    rankdir=LR;']
+        for node in self.nodes.values():
+            penwidth = ', penwidth=2' if node.instance_type in self.roots else ''
+            lines.append(
+                f'    {ids[node]} [label="{_dot_label(node.instance_type)}\\n{node.kind}", '
+                f'shape={_DOT_SHAPES[node.kind]}{penwidth}];'
+            )
+        for edge in self.edges:
+            style = ', style=dashed' if edge.cycle_break else ', style=dotted' if edge.lazy else ''
+            lines.append(f'    {ids[edge.source]} -> {ids[edge.target]} [label="{edge.attr_name}"{style}];')
+        lines.append('}')
+        return '\n'.join(lines)
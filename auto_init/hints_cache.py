@@ -0,0 +1,322 @@
+"""
+Persistent cache of evaluated type hints, to skip ``typing.get_type_hints`` in fresh processes.
+
+Evaluated hints of a class are stored in a JSON file under the qualified name of the class, with the hints
+encoded as qualified names too. An entry is only used if the source files of the modules that define the class
+and its bases are unchanged, and those of the modules they import, from which aliases such as ``Items = List[int]``
+may come. The file must also have been written by the same versions of **auto-init** and Python.
+Stale or unreadable entries are ignored and the hints are evaluated as usual.
+
+Enable it before the first context resolves anything::
+
+    from auto_init.hints_cache import enable_hints_cache
+
+    enable_hints_cache('.auto_init_hints.json')
+
+The file is loaded on first use and saved on exit if new entries were added.
+"""
+import ast
+import atexit
+import hashlib
+import importlib.util
+import json
+import os
+import sys
+import threading
+import typing
+from typing import Any, Dict, List, Optional, Type, Union
+
+from . import __version__
+from .compat import GenericAlias, UnionType
+
+# Format of the file, entries of files with a different format are ignored.
+_FORMAT = 1
+
+# Module validation modes: stat information or content hash of the source file.
+MTIME = 'mtime'
+HASH = 'hash'
+
+
+class _Unencodable(Exception):
+    pass
+
+
+def _qualified_name(obj) -> str:
+    return f'{obj.__module__}:{obj.__qualname__}'
+
+
+def _lookup(name: str):
+    """
+    Returns the object with the qualified name from an already imported module, or ``None``.
+    Modules are not imported: the hints of a class can only refer to modules imported by its own module.
+    """
+    module_name, _, qualname = name.partition(':')
+    obj = sys.modules.get(module_name)
+    for part in qualname.split('.'):
+        obj = getattr(obj, part, None)
+    return obj
+
+
+def _encode(annotation) -> Any:
+    if annotation is None or annotation is type(None):
+        return None
+    if isinstance(annotation, type) and not (GenericAlias and isinstance(annotation, GenericAlias)):
+        name = _qualified_name(annotation)
+        if _lookup(name) is not annotation:
+            raise _Unencodable(annotation)
+        return name
+    origin = getattr(annotation, '__origin__', None)
+    args = [_encode(arg) for arg in getattr(annotation, '__args__', None) or ()]
+    if origin is Union:
+        return {'union': args}
+    if isinstance(annotation, UnionType):
+        return {'union': args, 'pipe': True}
+    if isinstance(annotation, GenericAlias):
+        return {'generic': _encode(origin), 'args': args}
+    name = getattr(annotation, '_name', None)
+    if name and getattr(typing, name, None) is not None:
+        return {'generic': f'typing:{name}', 'args': args}
+    raise _Unencodable(annotation)
+
+
+def _decode(encoded) -> Any:
+    if encoded is None:
+        return type(None)
+    if isinstance(encoded, str):
+        obj = _lookup(encoded)
+        if obj is None:
+            raise LookupError(encoded)
+        return obj
+    args = tuple(_decode(arg) for arg in encoded['args' if 'generic' in encoded else 'union'])
+    if 'union' in encoded:
+        if encoded.get('pipe'):
+            result = args[0]
+            for arg in args[1:]:
+                result = result | arg
+            return result
+        return Union[args]
+    origin = _decode(encoded['generic'])
+    return origin[args] if args else origin
+
+
+class HintsCache:
+    """
+    Evaluated type hints keyed by the qualified names of classes, persisted in the JSON file at ``path``.
+
+    ``validate`` is ``MTIME`` to compare the modification time and size of module files,
+    or ``HASH`` to compare their content.
+    """
+
+    def __init__(self, path: str, validate: str = MTIME):
+        assert validate in (MTIME, HASH), validate
+        self.path = path
+        self.validate = validate
+        self._lock = threading.Lock()
+
+        # Loaded on first use
+        self._entries: Optional[Dict[str, Any]] = None
+
+        # Stamps of module files as stored in the file, and as computed in this process
+        self._stored_stamps: Dict[str, Any] = {}
+        self._stamps: Dict[str, Any] = {}
+
+        # Modules imported by the modules of cached classes, computed in this process
+        self._imports: Dict[str, Optional[List[str]]] = {}
+
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self):
+        entries, stamps = {}, {}
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get('format') == _FORMAT and data.get('version') == __version__ and \
+                    data.get('python') == list(sys.version_info[:2]) and data.get('validate') == self.validate:
+                entries, stamps = data['entries'], data['modules']
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            # Missing or corrupt file, start afresh
+            pass
+        self._entries = entries
+        self._stored_stamps = stamps
+
+    def _stamp(self, module_name: str) -> Any:
+        """
+        Returns the stamp of the source file of the module, or ``None`` if the module cannot be validated.
+        """
+        if module_name in self._stamps:
+            return self._stamps[module_name]
+        stamp = None
+        if module_name in sys.builtin_module_names:
+            # Covered by the Python version
+            stamp = True
+        else:
+            path = getattr(sys.modules.get(module_name), '__file__', None)
+            try:
+                if path is None:
+                    stamp = None
+                elif self.validate == HASH:
+                    with open(path, 'rb') as f:
+                        stamp = hashlib.sha256(f.read()).hexdigest()
+                else:
+                    stat = os.stat(path)
+                    stamp = [stat.st_mtime_ns, stat.st_size]
+            except OSError:
+                stamp = None
+        self._stamps[module_name] = stamp
+        return stamp
+
+    def _imported_modules(self, module_name: str) -> Optional[List[str]]:
+        """
+        Returns the names of the imported modules that the module imports, or ``None`` if its source
+        cannot be read. Names in annotations may refer to them, so their files are stamped too.
+        Modules without a file, such as namespace packages, define nothing that could change.
+        """
+        if module_name in self._imports:
+            return self._imports[module_name]
+        imported = None
+        module = sys.modules.get(module_name)
+        path = getattr(module, '__file__', None)
+        if module_name in sys.builtin_module_names or (path is not None and not path.endswith(('.py', '.pyc'))):
+            # Built-in and extension modules have no annotations referring to other modules
+            imported = []
+        elif path is not None and path.endswith('.py'):
+            try:
+                with open(path, 'rb') as f:
+                    tree = ast.parse(f.read(), path)
+                names = set()
+                for node in ast.walk(tree):
+                    if isinstance(node, ast.Import):
+                        # import a.b binds a
+                        for alias in node.names:
+                            parts = alias.name.split('.')
+                            names.update('.'.join(parts[:i]) for i in range(1, len(parts) + 1))
+                    elif isinstance(node, ast.ImportFrom):
+                        base = node.module or ''
+                        if node.level:
+                            base = importlib.util.resolve_name('.' * node.level + base, module.__package__)
+                        names.add(base)
+                        # Submodules imported by name
+                        names.update(f'{base}.{alias.name}' for alias in node.names)
+                imported = sorted(
+                    name for name in names if name != module_name and (
+                        name in sys.builtin_module_names or getattr(sys.modules.get(name), '__file__', None)
+                    )
+                )
+            except (OSError, SyntaxError, ValueError, ImportError):
+                imported = None
+        self._imports[module_name] = imported
+        return imported
+
+    def get(self, cls: Type) -> Optional[Dict[str, Any]]:
+        """
+        Returns the cached type hints of the class, or ``None`` if they aren't cached or are stale.
+        """
+        with self._lock:
+            if self._entries is None:
+                self._load()
+            entry = self._entries.get(_qualified_name(cls))
+            if entry is not None:
+                try:
+                    if all(self._stamp(m) is not None and self._stamp(m) == self._stored_stamps.get(m)
+                           for m in entry['modules']):
+                        hints = {name: _decode(hint) for name, hint in entry['hints'].items()}
+                        self.hits += 1
+                        return hints
+                except (LookupError, TypeError, AttributeError):
+                    # Renamed or removed classes
+                    pass
+            self.misses += 1
+            return None
+
+    def put(self, cls: Type, hints: Dict[str, Any]):
+        """
+        Stores the evaluated type hints of the class, unless the class or the hints cannot be looked up
+        by qualified name in another process.
+        """
+        with self._lock:
+            if self._entries is None:
+                self._load()
+            try:
+                name = _qualified_name(cls)
+                if _lookup(name) is not cls:
+                    return
+                encoded = {attr: _encode(hint) for attr, hint in hints.items()}
+                if {attr: _decode(hint) for attr, hint in encoded.items()} != hints:
+                    return
+            except (_Unencodable, LookupError, TypeError, AttributeError):
+                return
+            modules = {c.__module__ for c in cls.__mro__ if c is not object}
+            for module_name in list(modules):
+                imported = self._imported_modules(module_name)
+                if imported is None:
+                    return
+                modules.update(imported)
+            modules = sorted(modules)
+            stamps = [self._stamp(m) for m in modules]
+            if any(stamp is None for stamp in stamps):
+                return
+            for module_name, stamp in zip(modules, stamps):
+                if self._stored_stamps.get(module_name, stamp) != stamp:
+                    # Entries stored for an earlier version of the module must not become valid again
+                    self._entries = {k: e for k, e in self._entries.items() if module_name not in e['modules']}
+                self._stored_stamps[module_name] = stamp
+            self._entries[name] = {'hints': encoded, 'modules': modules}
+            self._dirty = True
+
+    def save(self):
+        """
+        Writes the cache to its file if entries were added. The file is replaced atomically.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {
+                'format': _FORMAT,
+                'version': __version__,
+                'python': list(sys.version_info[:2]),
+                'validate': self.validate,
+                'modules': self._stored_stamps,
+                'entries': self._entries,
+            }
+            tmp_path = f'{self.path}.{os.getpid()}.tmp'
+            try:
+                with open(tmp_path, 'w') as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.path)
+                self._dirty = False
+            except OSError:
+                # The cache is an optimisation, failing to write it must not fail the process
+                pass
+
+    def __len__(self):
+        with self._lock:
+            if self._entries is None:
+                self._load()
+            return len(self._entries)
+
+
+_active: Optional[HintsCache] = None
+
+
+def enable_hints_cache(path: str, validate: str = MTIME, save_at_exit: bool = True) -> HintsCache:
+    """
+    Makes all contexts of the process look up evaluated type hints in the cache at ``path``
+    and store the ones they evaluate. Returns the cache, whose ``save()`` may also be called explicitly.
+    """
+    global _active
+    cache = HintsCache(path, validate=validate)
+    if save_at_exit:
+        atexit.register(cache.save)
+    _active = cache
+    return cache
+
+
+def disable_hints_cache():
+    global _active
+    _active = None
+
+
+def active_hints_cache() -> Optional[HintsCache]:
+    return _active
@@ -0,0 +1,101 @@
+"""
+Registries of child contexts, which fall back to those of the parent context without copying them.
+"""
+from collections.abc import Mapping, MutableMapping, MutableSet
+from typing import Callable, Set
+
+from .type_info import _NOTHING
+
+
+class _Overlay(MutableMapping):
+    """
+    Registry or cache of a child context that holds the entries of the child in ``local`` and falls back
+    to ``inherited``, the one of the parent, without copying it. Inherited entries deleted in the child
+    are ``hidden``, and so are those for which ``accept`` returns ``False``.
+    """
+
+    def __init__(self, local: MutableMapping, inherited: Mapping, hidden: MutableSet, accept: Callable = None):
+        self.local = local
+        self.inherited = inherited
+        self.hidden = hidden
+        self.accept = accept
+
+    def _inherited(self, key):
+        if key in self.hidden:
+            return _NOTHING
+        value = self.inherited.get(key, _NOTHING)
+        if value is not _NOTHING and self.accept is not None and not self.accept(value):
+            return _NOTHING
+        return value
+
+    def get(self, key, default=None):
+        value = self.local.get(key, _NOTHING)
+        if value is _NOTHING:
+            value = self._inherited(key)
+        return default if value is _NOTHING else value
+
+    def __getitem__(self, key):
+        value = self.get(key, _NOTHING)
+        if value is _NOTHING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _NOTHING) is not _NOTHING
+
+    def __setitem__(self, key, value):
+        self.local[key] = value
+
+    def __delitem__(self, key):
+        found = self.local.pop(key, _NOTHING) is not _NOTHING
+        if self._inherited(key) is not _NOTHING:
+            self.hidden.add(key)
+        elif not found:
+            raise KeyError(key)
+
+    def __iter__(self):
+        local = list(self.local)
+        yield from local
+        yield from [
+            key for key in list(self.inherited) if key not in self.local and self._inherited(key) is not _NOTHING
+        ]
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __bool__(self):
+        return bool(self.local) or any(self._inherited(key) is not _NOTHING for key in list(self.inherited))
+
+    def clear(self):
+        self.local.clear()
+        self.inherited = {}
+
+
+class _OverlaySet(MutableSet):
+    """
+    Set of types of a child context that falls back to the set of the parent, see ``_Overlay``.
+    """
+
+    def __init__(self, local: MutableSet, inherited: Set, hidden: MutableSet):
+        self.local = local
+        self.inherited = inherited
+        self.hidden = hidden
+
+    def __contains__(self, key):
+        return key in self.local or (key in self.inherited and key not in self.hidden)
+
+    def __iter__(self):
+        local = list(self.local)
+        yield from local
+        yield from [key for key in list(self.inherited) if key not in self.local and key not in self.hidden]
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def add(self, key):
+        self.local.add(key)
+
+    def discard(self, key):
+        self.local.discard(key)
+        if key in self.inherited:
+            self.hidden.add(key)
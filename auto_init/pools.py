@@ -0,0 +1,273 @@
+"""
+Bounded pools of objects provided by ``AutoInitContext.register_pool``.
+
+A pool creates objects with its factory on demand, up to ``size`` objects alive at a time.
+Objects are checked out with ``acquire`` (blocking the thread) or ``aacquire`` (awaiting without blocking
+the event loop) and returned with ``release``, from any thread.
+"""
+import asyncio
+import inspect
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Tuple
+
+from .compat import get_running_loop
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+# Handed over to an asynchronous waiter when a slot is freed instead of an object.
+_RETRY = object()
+
+
+class Pool:
+    """
+    ``max_idle`` is the number of seconds an object may stay unused in the pool before it is discarded,
+    ``timeout`` is the number of seconds to wait for an object when all ``size`` objects are in use.
+    ``dispose`` is called with the objects that are discarded.
+    """
+
+    def __init__(
+        self,
+        factory: Callable,
+        size: int,
+        max_idle: float = None,
+        timeout: float = None,
+        dispose: Callable[[Any], None] = None,
+    ):
+        assert size > 0
+        self.factory = factory
+        self.size = size
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.dispose = dispose
+        self.is_async = inspect.iscoroutinefunction(factory)
+
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+
+        # Unused objects with the time they were released, the most recently released last
+        self._idle: Deque[Tuple[Any, float]] = deque()
+
+        # Futures of coroutines waiting for an object, with their event loops
+        self._async_waiters: Deque[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+
+        # Objects created and not discarded, idle or in use, or being created
+        self._live = 0
+
+        self._in_use = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._timeouts = 0
+        self._discarded = 0
+
+    def _take_idle(self, discarded: List[Any]) -> Any:
+        """
+        Returns the most recently released idle object, or ``_RETRY`` if there is none.
+        Objects idle for longer than ``max_idle`` are moved to ``discarded``. Called under the lock.
+        """
+        if self.max_idle is not None:
+            expired_before = time.monotonic() - self.max_idle
+            while self._idle and self._idle[0][1] < expired_before:
+                discarded.append(self._idle.popleft()[0])
+                self._live -= 1
+                self._discarded += 1
+        if self._idle:
+            return self._idle.pop()[0]
+        return _RETRY
+
+    def _checked_out(self, waited: float = None):
+        """
+        Counts a checkout. Called under the lock.
+        """
+        self._in_use += 1
+        self._checkouts += 1
+        if waited is not None:
+            self._waits += 1
+            self._wait_time += waited
+            self._max_wait_time = max(self._max_wait_time, waited)
+
+    def _dispose(self, discarded: List[Any]):
+        if self.dispose is not None:
+            for obj in discarded:
+                self.dispose(obj)
+
+    def _create(self) -> Any:
+        try:
+            return self.factory()
+        except BaseException:
+            self._slot_freed()
+            raise
+
+    def _slot_freed(self):
+        with self._lock:
+            self._live -= 1
+            self._in_use -= 1
+            self._checkouts -= 1
+            self._wake_one()
+
+    def _wake_one(self):
+        """
+        Lets one waiter retry after a slot is freed. Called under the lock.
+        """
+        if self._async_waiters:
+            loop, future = self._async_waiters.popleft()
+            loop.call_soon_threadsafe(self._hand_over, future, _RETRY)
+        else:
+            self._available.notify()
+
+    def acquire(self) -> Any:
+        """
+        Checks out an object, creating it if there is no idle one and fewer than ``size`` objects are alive,
+        otherwise waits for one to be released. Raises ``PoolTimeout`` after waiting ``timeout`` seconds.
+        """
+        assert not self.is_async, 'Objects of pools with asynchronous factories must be acquired with aacquire'
+        discarded = []
+        started = None
+        try:
+            with self._lock:
+                while True:
+                    obj = self._take_idle(discarded)
+                    if obj is not _RETRY or self._live < self.size:
+                        break
+                    if started is None:
+                        started = time.monotonic()
+                    remaining = None if self.timeout is None else started + self.timeout - time.monotonic()
+                    if (remaining is not None and remaining <= 0) or not self._available.wait(remaining):
+                        self._timeouts += 1
+                        raise PoolTimeout(f'No object available in the pool of {self.factory} after {self.timeout}s')
+                if obj is _RETRY:
+                    self._live += 1
+                self._checked_out(None if started is None else time.monotonic() - started)
+        finally:
+            self._dispose(discarded)
+        return self._create() if obj is _RETRY else obj
+
+    async def aacquire(self) -> Any:
+        """
+        Coroutine version of ``acquire`` which waits without blocking the event loop.
+        """
+        loop = get_running_loop()
+        discarded = []
+        started = None
+        while True:
+            with self._lock:
+                obj = self._take_idle(discarded)
+                if obj is not _RETRY or self._live < self.size:
+                    if obj is _RETRY:
+                        self._live += 1
+                    self._checked_out(None if started is None else time.monotonic() - started)
+                    break
+                future = loop.create_future()
+                self._async_waiters.append((loop, future))
+            self._dispose(discarded)
+            discarded = []
+            if started is None:
+                started = time.monotonic()
+            remaining = None if self.timeout is None else started + self.timeout - time.monotonic()
+            try:
+                obj = await asyncio.wait_for(future, remaining)
+            except asyncio.TimeoutError:
+                with self._lock:
+                    if (loop, future) in self._async_waiters:
+                        self._async_waiters.remove((loop, future))
+                    self._timeouts += 1
+                raise PoolTimeout(f'No object available in the pool of {self.factory} after {self.timeout}s')
+            if obj is not _RETRY:
+                # Handed over by release(), already counted as checked out
+                with self._lock:
+                    waited = time.monotonic() - started
+                    self._waits += 1
+                    self._wait_time += waited
+                    self._max_wait_time = max(self._max_wait_time, waited)
+                return obj
+        self._dispose(discarded)
+        if obj is not _RETRY:
+            return obj
+        obj = self._create()
+        if inspect.isawaitable(obj):
+            try:
+                obj = await obj
+            except BaseException:
+                self._slot_freed()
+                raise
+        return obj
+
+    def _hand_over(self, future: asyncio.Future, obj: Any):
+        """
+        Completes the future of a waiting coroutine, in its event loop.
+        """
+        if not future.done():
+            future.set_result(obj)
+        elif obj is _RETRY:
+            with self._lock:
+                self._wake_one()
+        else:
+            # The waiter timed out or was cancelled meanwhile
+            with self._lock:
+                self._in_use -= 1
+                self._checkouts -= 1
+            self.release(obj, checked_out=False)
+
+    def release(self, obj: Any, checked_out: bool = True):
+        """
+        Returns a checked out object to the pool, or hands it over to a waiting coroutine.
+        """
+        with self._lock:
+            if checked_out:
+                self._in_use -= 1
+            if self._async_waiters:
+                loop, future = self._async_waiters.popleft()
+                self._checked_out()
+                loop.call_soon_threadsafe(self._hand_over, future, obj)
+            else:
+                self._idle.append((obj, time.monotonic()))
+                self._available.notify()
+
+    def clear(self):
+        """
+        Discards all idle objects.
+        """
+        with self._lock:
+            discarded = [obj for obj, _ in self._idle]
+            self._idle.clear()
+            self._live -= len(discarded)
+            self._discarded += len(discarded)
+            for _ in discarded:
+                self._wake_one()
+        self._dispose(discarded)
+
+    def _after_fork(self):
+        """
+        Forgets the objects of the parent process in a child process after a fork, without disposing of them.
+        """
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._idle.clear()
+        self._async_waiters.clear()
+        self._live = 0
+        self._in_use = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns a snapshot of the utilisation of the pool and the time spent waiting for objects.
+        """
+        with self._lock:
+            return {
+                'size': self.size,
+                'live': self._live,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'utilisation': self._in_use / self.size,
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_time': self._wait_time,
+                'max_wait_time': self._max_wait_time,
+                'timeouts': self._timeouts,
+                'discarded': self._discarded,
+            }
@@ -1,15 +1,33 @@
-from typing import Any, Callable, Dict, List, Optional, Tuple, Type, get_type_hints
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Type, Union
 
+import asyncio
+import concurrent.futures
+import copy
 import dataclasses
+import functools
+import importlib
+import inspect
+import itertools
+import os
+import sys
+import threading
+import time
+import weakref
+from collections.abc import Mapping, MutableMapping, MutableSet
+from contextlib import contextmanager
 from contextvars import ContextVar
 
-
-class CreationFailed(Exception):
-    pass
-
-
-class InitialisationFailed(Exception):
-    pass
+from . import graph as _graph
+from .caches import _LRUCache, _WeakLRUCache, _WeakTypeDict, _WeakTypeSet
+from .compat import get_running_loop
+from .exceptions import CompilationFailed, CreationFailed, InitialisationFailed, RegistrationFailed, WarmUpFailed
+from .overlays import _Overlay, _OverlaySet
+from .pools import Pool, PoolTimeout
+from .tracing import (
+    CYCLE_BREAK, FACTORY_CALL, FAILURE, RESOLVE_END, RESOLVE_START, SINGLETON_HIT, TYPE_HINTS, ResolutionEvent,
+    ResolutionStats, ResolutionTree,
+)
+from .type_info import _NOTHING, _is_named_tuple, classify_type, none_factory  # noqa: F401
 
 
 class AutoInitContext:
@@ -31,15 +49,18 @@ class AutoInitContext:
     # Fixed instances that are always returned when an instance of the particular type is requested.
     _instances: Dict[Type, Any]
 
-    # Stack of types, instances of which are being initialised.
-    # If we are instantiating a type when another instance of this type
-    # is requested, we will always return None unless the instance_type
-    # is marked as a singleton and we have an instance (regardless
-    # of its initialisation state) available.
-    _pending_types: List[Type]
+    # State of the top-level resolution in progress in the current thread, if any.
+    # See _Resolution and the _pending_types property.
+    _local: "_ThreadState"
+
+    # Guards analysis of the graph of plans and _lock_waiters. Never taken on the hot path.
+    _lock: threading.Lock
 
-    # Cache of type hints
-    _type_hints: Dict[Type, Dict[str, Type]]
+    # Singleton creations in progress in event loops, keyed by the singleton lock and the loop.
+    _async_creations: Dict[Tuple[Any, Any], "asyncio.Future"]
+
+    # Coroutines waiting for singleton locks held by other threads, with their event loops, see _alock_singleton().
+    _lock_waiters: Dict[Any, List[Tuple[asyncio.AbstractEventLoop, "asyncio.Future"]]]
 
     # List of types for which, if requested, a single instance is created upon the first
     # request and then returned every time a new instance is requested.
@@ -47,51 +68,974 @@ class AutoInitContext:
 
     # Registry of singletons. This is different from _instances in that objects in _singletons are
     # created and initialised by the context whereas _instances are supplied by the user of this context.
+    # Singletons are added here only once they are fully initialised. Until then they are only visible
+    # to the resolution creating them (see _Resolution.singletons), under the lock of the singleton's plan.
     _singletons: Dict[Type, "_InitState"] = {}
 
-    def __init__(self):
-        self._factories = {}
-        self._instances = {}
-        self._pending_types = []
-        self._type_hints = {}
-        self._singleton_types = {}
-        self._singletons = {}
+    # Cache of compiled resolution plans, one per requested type.
+    # Plans depend on the registries so plans that refer to a type are evicted when its registration changes.
+    _plans: Dict[Type, "_Plan"]
+
+    # Guards publication of compiled plans, so that all threads use the same plan of a type
+    # and with it the same singleton lock. Plans are compiled outside of it.
+    _plans_lock: threading.Lock
+
+    # Reverse-dependency index of the plan cache: the requested types whose plans refer to each registry key,
+    # see _invalidate_dependents().
+    _dependents: Dict[Any, Set[Type]]
+
+    # Guards updates and reads of _dependents, which are made by resolutions of any thread.
+    _index_lock: threading.Lock
+
+    # If set, a specialised builder function is generated for every type that can be
+    # created without the generic initialisation machinery (see _generate_builder).
+    codegen: bool
+
+    # If set, attributes that require creation of other instances are injected lazily:
+    # they are resolved on first access (see _LazyAttribute).
+    lazy: bool
+
+    # Pools of objects of types registered with register_pool().
+    _pools: Dict[Type, Pool]
+
+    # Pooled objects checked out by resolutions of this context, returned to their pools by close().
+    _checked_out: Dict[Pool, Any]
+
+    # Types whose attributes are injected lazily regardless of the ``lazy`` setting.
+    _lazy_types: Set[Type]
+
+    # Types whose instances are cloned from a captured prototype, see register_prototype().
+    _prototype_types: Set[Type]
+
+    # Types of which a single instance is shared by everything a top-level resolution creates,
+    # see register_per_resolution().
+    _per_resolution_types: Set[Type]
+
+    # Registrations made with import paths, keyed by the type or its import path, with the name of the registry,
+    # the provider (or its import path) to store once the type is first requested and whether it is an import path,
+    # see _resolve_deferred().
+    _deferred: Dict[Any, Tuple[str, Any, bool]]
+
+    # Guards the resolution of deferred registrations, which may import modules that use this context.
+    _deferred_lock: threading.RLock
+
+    # Context of which this is a child context, see child().
+    _parent: Optional["AutoInitContext"]
+
+    # Live child contexts, whose plans registrations in this context invalidate, see _invalidate_dependents().
+    _children: MutableSet
+
+    # Guards _children, which child() of any thread adds to.
+    _children_lock: threading.Lock
+
+    # Child contexts share registries, plans and singletons with their parent until the first registration.
+    # From then on their registries and plans are overlays of those of the parent, see _copy_on_write().
+    _owns_registries: bool
+
+    # Types registered in this context, as opposed to those inherited from the parent.
+    _own_types: Set[Type]
+
+    # Set by freeze(), registries of a frozen context cannot change.
+    _frozen: bool
+
+    # Callables notified of resolution events, see add_hook().
+    _hooks: List[Callable[[ResolutionEvent], None]]
+
+    # Hook installed by enable_stats().
+    _stats: Optional[ResolutionStats]
+
+    # If set, registries and caches keyed by classes do not keep the classes alive (see _WeakTypeDict).
+    weak_types: bool
+
+    # If set, the plan cache holds at most this many entries.
+    cache_size: Optional[int]
+
+    # If set, singletons not registered as fork-safe are dropped in child processes after a fork,
+    # see _after_fork().
+    fork_aware: bool
+
+    # Singleton types whose instances may be used by child processes after a fork.
+    _fork_safe_types: Set[Type]
+
+    def __init__(
+        self,
+        codegen: bool=False,
+        lazy: bool=False,
+        weak_types: bool=False,
+        cache_size: int=None,
+        fork_aware: bool=False,
+    ):
+        assert cache_size is None or cache_size > 0
+        self.codegen = codegen
+        self.lazy = lazy
+        self.weak_types = weak_types
+        self.cache_size = cache_size
+        self.fork_aware = fork_aware
+        self._fork_safe_types = self._new_type_set()
+        self._lazy_types = self._new_type_set()
+        self._prototype_types = self._new_type_set()
+        self._per_resolution_types = self._new_type_set()
+        self._factories = self._new_registry()
+        self._instances = self._new_registry()
+        self._pools = self._new_registry()
+        self._checked_out = {}
+        self._checkout_lock = threading.Lock()
+        self._local = _ThreadState()
+        self._lock = threading.Lock()
+        self._async_creations = {}
+        self._lock_waiters = {}
+        self._singleton_types = self._new_registry()
+        self._singletons = self._new_registry()
+        self._plans = self._new_cache(pinned=_is_pinned_plan)
+        self._plans_lock = threading.Lock()
+        self._dependents = self._new_registry()
+        self._index_lock = threading.Lock()
+        self._children_lock = threading.Lock()
+        self._deferred = {}
+        self._deferred_lock = threading.RLock()
+        self._parent = None
+        self._children = weakref.WeakSet()
+        self._owns_registries = True
+        self._frozen = False
+        self._hooks = []
+        self._stats = None
+        self._own_types = self._new_type_set()
+        if fork_aware:
+            _fork_aware_contexts.add(self)
+
+    def child(self) -> "AutoInitContext":
+        """
+        Create a child context, for example for a single request, which falls back to the registrations of this one.
+        Singletons registered in the child are dropped when it is closed, those of this context stay shared.
+        """
+        child = copy.copy(self)
+        child._local = _ThreadState()
+        child._parent = self
+        child._children = weakref.WeakSet()
+        child._children_lock = threading.Lock()
+        child._owns_registries = False
+        child._frozen = False
+        child._own_types = child._new_type_set()
+        child._checked_out = {}
+        child._checkout_lock = threading.Lock()
+        child._hooks = []
+        child._stats = None
+        with self._children_lock:
+            self._children.add(child)
+        if '_provide' in child.__dict__:
+            # Hooks are not inherited. The plans of this context are compiled for them, the child compiles its own.
+            child._copy_on_write()
+            child._remove_instrumentation()
+        return child
+
+    def close(self):
+        """
+        Return the pooled objects checked out by this context to their pools
+        and drop the singletons registered in and created by this child context.
+        """
+        with self._checkout_lock:
+            checked_out, self._checked_out = self._checked_out, {}
+        for pool, obj in checked_out.items():
+            if isinstance(obj, asyncio.Future):
+                if not obj.done():
+                    # Still waiting for the pool, returned as soon as it is checked out
+                    obj.add_done_callback(functools.partial(_release_checkout, pool))
+                    continue
+                if obj.cancelled() or obj.exception() is not None:
+                    continue
+                obj = obj.result()
+            pool.release(obj)
+        if self._parent is not None and self._owns_registries:
+            self._singletons.clear()
+
+    def compile(self, roots: Iterable[Type]):
+        """
+        Compiles the plans of all types reachable from ``roots`` so that no reflection is left for request time.
+        Raises ``CompilationFailed`` listing every type that cannot be provided.
+        """
+        errors = {}
+        plans = []
+        seen = set()
+        stack = [_import_object(t) if _is_import_path(t) else t for t in roots]
+        while stack:
+            instance_type = stack.pop()
+            if instance_type in seen:
+                continue
+            seen.add(instance_type)
+            try:
+                plan = self._get_plan(instance_type)
+                self._check_provider(plan)
+            except Exception as e:
+                errors[instance_type] = e
+                continue
+            plans.append(plan)
+            stack.extend(plan.dependency_types())
+            if plan.kind is _COMPOSITE:
+                stack.extend(attr_type for _, attr_kind, _, attr_type in plan.steps if attr_kind is _LAZY)
+
+        if errors:
+            raise CompilationFailed(errors)
+
+        for plan in plans:
+            # Singletons of parent contexts are checked with the plans of the contexts that create them
+            owner = self
+            while plan.kind is _PARENT:
+                owner = plan.provider
+                plan = owner._get_plan(plan.instance_type)
+            if plan.singleton:
+                pooled_type = owner._find_pooled_dependency(plan)
+                if pooled_type is not None:
+                    errors[plan.instance_type] = CreationFailed(
+                        f"Singleton {plan.instance_type} depends on pooled type {pooled_type}"
+                    )
+        if errors:
+            raise CompilationFailed(errors)
+
+        for plan in plans:
+            self._may_await(plan)
+
+    def _find_pooled_dependency(self, plan: "_Plan") -> Optional[Type]:
+        """
+        Returns a pooled type the plan depends on through dependencies created with it, if any.
+        """
+        seen = set()
+        stack = plan.dependency_types()
+        while stack:
+            instance_type = stack.pop()
+            if instance_type in seen:
+                continue
+            seen.add(instance_type)
+            dependency = self._get_plan(instance_type)
+            if dependency.kind is _POOL:
+                return instance_type
+            if not dependency.singleton and dependency.kind is not _PARENT:
+                stack.extend(dependency.dependency_types())
+        return None
+
+    def graph(self, roots: Iterable[Type], timings: Dict[Type, float] = None) -> _graph.DependencyGraph:
+        """
+        Returns the dependency graph of ``roots`` with its metrics, built without creating instances,
+        see ``auto_init.graph``. ``timings`` are self times of the types, for example from a ``ResolutionTree``.
+        """
+        roots = [_import_object(t) if _is_import_path(t) else t for t in roots]
+        self.compile(roots)
+
+        graph = _graph.DependencyGraph(roots, timings)
+        plans = []
+        stack = list(roots)
+        while stack:
+            instance_type = stack.pop()
+            if instance_type in graph.nodes:
+                continue
+            plan = self._get_plan(instance_type)
+            graph.add_node(instance_type, self._graph_node_kind(plan), cyclic=bool(plan.cyclic))
+            plans.append(plan)
+            stack.extend(attr_type for _, attr_type, _ in self._graph_edges(plan))
+
+        for plan in plans:
+            for attr_name, attr_type, lazy in self._graph_edges(plan):
+                graph.add_edge(plan.instance_type, attr_type, attr_name, lazy)
+        return graph.analyse()
+
+    @staticmethod
+    def _graph_node_kind(plan: "_Plan") -> str:
+        if plan.singleton:
+            return _graph.SINGLETON
+        if plan.per_resolution:
+            return _graph.PER_RESOLUTION
+        if plan.kind is _SIMPLE and classify_type(plan.instance_type).is_typing:
+            return _graph.PRIMITIVE
+        return _GRAPH_NODE_KINDS[plan.kind]
+
+    @staticmethod
+    def _graph_edges(plan: "_Plan") -> List[Tuple[str, Type, bool]]:
+        """
+        Returns ``(attr_name, attr_type, lazy)`` of the constructor arguments and attributes injected by the plan.
+        """
+        edges = [(attr_name, attr_type, False) for attr_name, attr_type in plan.arguments or ()]
+        if plan.kind is _COMPOSITE:
+            edges.extend(
+                (attr_name, attr_type, attr_kind is _LAZY) for attr_name, attr_kind, _, attr_type in plan.steps
+            )
+        return edges
+
+    def warm_up(self, roots: Iterable[Type] = (), executor: concurrent.futures.Executor = None):
+        """
+        Compiles the plans of ``roots`` and of all registered types, for example before forking worker processes.
+        With an ``executor``, the singletons reachable from ``roots`` are also created, or all singletons of this
+        context if there are no ``roots``, see ``_create_singletons``.
+        """
+        roots = [_import_object(t) if _is_import_path(t) else t for t in roots]
+        registered = itertools.chain(self._singleton_types, self._factories, self._deferred)
+        self.compile(itertools.chain(roots, (t for t in registered if isinstance(t, type) or _is_import_path(t))))
+        if executor is not None:
+            self._create_singletons(executor, self._reachable_singleton_types(roots) if roots else None)
+
+    def _reachable_singleton_types(self, roots: List[Type]) -> List[Type]:
+        """
+        Returns the singleton types that resolutions of ``roots`` create, including through lazy attributes.
+        """
+        singleton_types = []
+        seen = set()
+        stack = list(roots)
+        while stack:
+            instance_type = stack.pop()
+            if instance_type in seen:
+                continue
+            seen.add(instance_type)
+            plan = self._get_plan(instance_type)
+            if plan.singleton:
+                singleton_types.append(instance_type)
+            stack.extend(plan.dependency_types())
+            if plan.kind is _COMPOSITE:
+                stack.extend(attr_type for _, attr_kind, _, attr_type in plan.steps if attr_kind is _LAZY)
+        return singleton_types
+
+    def _create_singletons(self, executor: concurrent.futures.Executor, singleton_types: List[Type] = None):
+        """
+        Creates the singletons of ``singleton_types``, by default all of this context, concurrently, each component
+        of the dependency graph once the components it depends on exist. Singletons with asynchronous factories
+        are left to ``aget_instance``.
+        """
+        if singleton_types is None:
+            singleton_types = list(self._singleton_types)
+        singletons = [
+            plan for plan in map(self._get_plan, singleton_types)
+            if plan.singleton and plan.instance_type not in self._singletons and not self._may_await(plan)
+        ]
+
+        def singleton_dependencies(plan: _Plan) -> List[_Plan]:
+            # Singletons reached through any number of transient instances
+            found = []
+            seen = {id(plan)}
+            stack = [plan]
+            while stack:
+                for dependency in map(self._get_plan, stack.pop().dependency_types()):
+                    if id(dependency) in seen:
+                        continue
+                    seen.add(id(dependency))
+                    if dependency.singleton:
+                        found.append(dependency)
+                    else:
+                        stack.append(dependency)
+            return found
+
+        dependencies = {id(plan): singleton_dependencies(plan) for plan in singletons}
+        components = _strongly_connected_components(singletons, lambda plan: dependencies.get(id(plan), ()))
+
+        # Components in topological order, each at the level after the highest level of its dependencies
+        levels: List[List[List[_Plan]]] = []
+        level_of: Dict[int, int] = {}
+        for component in components:
+            level = 1 + max(
+                (level_of.get(id(d), -1) for member in component for d in dependencies.get(id(member), ())),
+                default=-1,
+            )
+            for member in component:
+                level_of[id(member)] = level
+            if level == len(levels):
+                levels.append([])
+            levels[level].append(component)
+
+        errors = {}
+        failed = set()
+        for level in levels:
+            futures = {}
+            for component in level:
+                failed_dependency = next(
+                    (d for member in component for d in dependencies.get(id(member), ()) if id(d) in failed), None
+                )
+                if failed_dependency is not None:
+                    failed.update(id(member) for member in component)
+                    errors[component[0].instance_type] = CreationFailed(
+                        f"Dependency {failed_dependency.instance_type} could not be created"
+                    )
+                    continue
+                futures[executor.submit(self.get_instance, component[0].instance_type)] = component
+            for future in concurrent.futures.as_completed(futures):
+                if future.exception() is not None:
+                    component = futures[future]
+                    failed.update(id(member) for member in component)
+                    errors[component[0].instance_type] = future.exception()
+
+        if errors:
+            raise WarmUpFailed(errors)
+
+    def _after_fork(self):
+        """
+        Called in the child process after a fork. Drops singletons that are not fork-safe, to be created again
+        on request, and replaces the locks, which may have been held by threads that do not exist in the child.
+        Compiled plans and type hints are kept.
+        """
+        self._lock = threading.Lock()
+        self._deferred_lock = threading.RLock()
+        self._index_lock = threading.Lock()
+        self._children_lock = threading.Lock()
+        self._plans_lock = threading.Lock()
+        if isinstance(self._plans, (_LRUCache, _WeakLRUCache)):
+            # Bounded caches take their own lock, on every read
+            self._plans._lock = threading.RLock()
+        self._async_creations = {}
+        self._lock_waiters = {}
+        self._checked_out = {}
+        self._checkout_lock = threading.Lock()
+        for pool in self._pools.values():
+            pool._after_fork()
+        for instance_type in list(self._singletons):
+            if instance_type not in self._fork_safe_types:
+                del self._singletons[instance_type]
+
+        locks = {}
+        for plan in list(self._plans.values()):
+            if plan.lock is not None:
+                # Singletons of a strongly connected component keep sharing a lock
+                plan.lock = locks.setdefault(plan.lock, threading.RLock())
+            if plan.prototype is not None:
+                # Captured prototypes may share dropped singletons
+                plan.prototype = _Prototype()
+
+    def freeze(self):
+        """
+        Makes the registries of the context immutable, further registrations raise ``RegistrationFailed``.
+        Plans compiled so far are analysed upfront so that providing them never takes the context lock.
+        """
+        for plan in list(self._plans.values()):
+            self._may_await(plan)
+        self._frozen = True
+
+    @staticmethod
+    def _check_provider(plan: "_Plan"):
+        """
+        Checks that the provider of the plan can be called with the injected constructor arguments only.
+        """
+        if plan.kind not in (_FACTORY, _SIMPLE, _COMPOSITE, _CONSTRUCTOR) or not callable(plan.provider):
+            return
+        try:
+            signature = inspect.signature(plan.provider)
+        except (TypeError, ValueError):
+            # Builtins without signature metadata
+            return
+        try:
+            signature.bind(**dict.fromkeys(attr_name for attr_name, _ in plan.arguments or ()))
+        except TypeError as e:
+            raise CreationFailed(f"Provider {plan.provider} of {plan.instance_type} requires arguments: {e}") from e
+
+    def add_hook(self, hook: Callable[[ResolutionEvent], None]):
+        """
+        Add a callable to be notified of every resolution event, see ``auto_init.tracing``.
+        Resolutions are only instrumented while there is at least one hook.
+        """
+        install = not self._hooks
+        self._hooks = self._hooks + [hook]
+        if install:
+            self._install_tracing()
+
+    def remove_hook(self, hook: Callable[[ResolutionEvent], None]):
+        self._hooks = [h for h in self._hooks if h is not hook]
+        if not self._hooks:
+            self._uninstall_tracing()
+
+    def enable_stats(self) -> ResolutionStats:
+        """
+        Start collecting per-type counters and timings and cache hit rates, see ``stats()``.
+        """
+        if self._stats is None:
+            self._stats = ResolutionStats()
+            self.add_hook(self._stats)
+        return self._stats
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Returns a snapshot of the statistics collected since ``enable_stats()``.
+        """
+        assert self._stats is not None, 'Statistics are not enabled, call enable_stats() first'
+        return self._stats.snapshot()
+
+    @contextmanager
+    def record_tree(self):
+        """
+        Records the tree of resolutions done by the current thread within the ``with`` block.
+        """
+        tree = ResolutionTree()
+        self.add_hook(tree)
+        try:
+            yield tree
+        finally:
+            self.remove_hook(tree)
+
+    def _install_tracing(self):
+        """
+        Replaces the resolution methods of this context with instrumented versions.
+        Plans are recompiled without inlined factories and generated builders so that all creations are seen.
+        """
+        self._copy_on_write()
+        self._recompile_for_tracing()
+
+        provide = self._provide
+        aprovide = self._aprovide
+        get_type_hints = self._get_type_hints
+        perf_counter = time.perf_counter
+
+        def emit(event: ResolutionEvent):
+            for hook in self._hooks:
+                hook(event)
+
+        def leaf_event(instance_type: Type, plan: _Plan, resolution: _Resolution) -> Optional[str]:
+            if plan.singleton:
+                if instance_type in self._singletons or instance_type in resolution.singletons:
+                    return SINGLETON_HIT
+            elif plan.kind is _PARENT:
+                if instance_type in plan.provider._singletons:
+                    return SINGLETON_HIT
+            elif plan.kind is _COMPOSITE and instance_type in resolution.pending_types:
+                return CYCLE_BREAK
+            return None
+
+        def end_events(instance_type: Type, plan: _Plan, duration: float):
+            if plan.kind is _FACTORY or (plan.singleton and not isinstance(plan.provider, type)):
+                emit(ResolutionEvent(FACTORY_CALL, instance_type, duration))
+            emit(ResolutionEvent(RESOLVE_END, instance_type, duration, singleton=plan.singleton))
+
+        def traced_provide(instance_type: Type, resolution: _Resolution):
+            plan = self._get_plan(instance_type)
+            event = leaf_event(instance_type, plan, resolution)
+            if event is not None:
+                emit(ResolutionEvent(event, instance_type, singleton=plan.singleton))
+                return provide(instance_type, resolution)
+
+            emit(ResolutionEvent(RESOLVE_START, instance_type))
+            started = perf_counter()
+            try:
+                result = provide(instance_type, resolution)
+            except Exception as e:
+                emit(ResolutionEvent(FAILURE, instance_type, perf_counter() - started, error=e))
+                raise
+            end_events(instance_type, plan, perf_counter() - started)
+            return result
+
+        async def traced_aprovide(instance_type: Type, resolution: _Resolution):
+            plan = self._get_plan(instance_type)
+            if not self._may_await(plan):
+                return self._provide(instance_type, resolution)
+            event = leaf_event(instance_type, plan, resolution)
+            if event is not None:
+                emit(ResolutionEvent(event, instance_type, singleton=plan.singleton))
+                return await aprovide(instance_type, resolution)
+
+            emit(ResolutionEvent(RESOLVE_START, instance_type))
+            started = perf_counter()
+            try:
+                result = await aprovide(instance_type, resolution)
+            except Exception as e:
+                emit(ResolutionEvent(FAILURE, instance_type, perf_counter() - started, error=e))
+                raise
+            end_events(instance_type, plan, perf_counter() - started)
+            return result
+
+        def traced_get_type_hints(instance_type: Type):
+            type_info = classify_type(instance_type)
+            cached = type_info.hints is not None or (
+                type_info.hints_type is not None and classify_type(type_info.hints_type).hints is not None
+            )
+            emit(ResolutionEvent(TYPE_HINTS, instance_type, cached=cached))
+            return get_type_hints(instance_type)
+
+        self._provide = traced_provide
+        self._aprovide = traced_aprovide
+        self._get_type_hints = traced_get_type_hints
+
+    def _uninstall_tracing(self):
+        if '_provide' in self.__dict__:
+            self._remove_instrumentation()
+            self._recompile_for_tracing()
+
+    def _remove_instrumentation(self):
+        del self._provide
+        del self._aprovide
+        del self._get_type_hints
+
+    @property
+    def _traced(self) -> bool:
+        """
+        Plans are compiled for tracing if the context that owns them has hooks,
+        a child context that has not registered anything yet shares the plans of its parent.
+        """
+        context = self
+        while not context._owns_registries:
+            context = context._parent
+        return bool(context._hooks)
+
+    def _recompile_for_tracing(self):
+        """
+        Recompiles the parts of the cached plans that depend on tracing: inlined factories, generated builders
+        and prototypes. The plans themselves are kept, so that singletons keep their locks.
+        A child context stops using the plans of its parent, which are compiled for the hooks of the parent.
+        """
+        if isinstance(self._plans, _Overlay):
+            self._plans.inherited = {}
+        # Plans are usually cached before the plans they refer to, whose builders are better generated first
+        for plan in reversed(list(self._plans.values())):
+            if plan.kind is _COMPOSITE:
+                self._compile_steps(plan)
+                plan.prototype = self._new_prototype(plan)
+                plan.builder = self._generate_builder(plan, self._plans) if self.codegen else None
+
+    def _copy_on_write(self):
+        """
+        Gives a child context registries of its own, overlays of those of the parent, before the first registration.
+        Plans of the parent are used until a registration of the child hides them, see ``_invalidate_dependents``.
+        """
+        if self._owns_registries:
+            return
+        self._factories = self._inherit_registry(self._factories)
+        self._instances = self._inherit_registry(self._instances)
+        self._pools = self._inherit_registry(self._pools)
+        self._singleton_types = self._inherit_registry(self._singleton_types)
+        self._lazy_types = self._inherit_type_set(self._lazy_types)
+        self._prototype_types = self._inherit_type_set(self._prototype_types)
+        self._per_resolution_types = self._inherit_type_set(self._per_resolution_types)
+        self._fork_safe_types = self._inherit_type_set(self._fork_safe_types)
+        self._deferred = _Overlay({}, self._deferred, set())
+        self._deferred_lock = threading.RLock()
+        self._singletons = self._new_registry()
+        self._plans = _Overlay(
+            self._new_cache(pinned=_is_pinned_plan), self._plans, self._new_type_set(),
+            functools.partial(_is_inheritable_plan, next(_plan_generations)),
+        )
+        self._dependents = self._new_registry()
+        self._index_lock = threading.Lock()
+        self._plans_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._async_creations = {}
+        self._lock_waiters = {}
+        self._owns_registries = True
+
+    def _inherit_registry(self, registry: Mapping) -> "_Overlay":
+        return _Overlay(self._new_registry(), registry, self._new_type_set())
+
+    def _inherit_type_set(self, types: Set) -> "_OverlaySet":
+        return _OverlaySet(self._new_type_set(), types, self._new_type_set())
+
+    def cache_sizes(self) -> Dict[str, int]:
+        """
+        Returns the number of entries in each of the registries and caches of the context.
+        """
+        return {
+            'factories': len(self._factories),
+            'instances': len(self._instances),
+            'pools': len(self._pools),
+            'singleton_types': len(self._singleton_types),
+            'singletons': len(self._singletons),
+            'lazy_types': len(self._lazy_types),
+            'prototype_types': len(self._prototype_types),
+            'per_resolution_types': len(self._per_resolution_types),
+            'fork_safe_types': len(self._fork_safe_types),
+            'deferred': len(self._deferred),
+            'plans': len(self._plans),
+        }
+
+    def _new_registry(self, items=()) -> MutableMapping:
+        return _WeakTypeDict(items) if self.weak_types else dict(items)
+
+    def _new_type_set(self, items=()) -> MutableSet:
+        return _WeakTypeSet(items) if self.weak_types else set(items)
+
+    def _new_cache(self, pinned: Callable[[Any], bool] = None) -> MutableMapping:
+        """
+        Returns a new cache of values derived from the registries, bounded if ``cache_size`` is set.
+        """
+        if self.cache_size is not None:
+            return _WeakLRUCache(self.cache_size, pinned) if self.weak_types else _LRUCache(self.cache_size, pinned)
+        return self._new_registry()
 
     def is_custom_provided_type(self, instance_type: Type):
+        if not _is_import_path(instance_type):
+            instance_type = classify_type(instance_type).key
         return (
             instance_type in self._factories or
             instance_type in self._singleton_types or
-            instance_type in self._instances
+            instance_type in self._instances or
+            instance_type in self._pools or
+            (bool(self._deferred) and self._find_deferred(instance_type) is not None)
         )
 
-    def register_singleton(self, instance_type: Type, factory: Callable=None):
+    def _prepare_registration(self, instance_type: Type, override: bool = False, shared: bool = False) -> Type:
+        """
+        Checks that ``instance_type`` can be registered and returns its registry key.
+        Registrations of the context itself are only replaced with ``override``.
+        """
+        if self._frozen:
+            raise RegistrationFailed(f"Cannot register {instance_type} in a frozen context")
+        if not _is_import_path(instance_type):
+            instance_type = classify_type(instance_type).key
+        assert override or (instance_type not in self._own_types and (
+            self._parent is not None or not self.is_custom_provided_type(instance_type)
+        )), f'{instance_type} is already registered, pass override=True to replace the registration'
+        assert not shared or instance_type not in self._per_resolution_types, (
+            f'{instance_type} is registered per resolution'
+        )
+        self._copy_on_write()
+        for key in self._registration_keys(instance_type):
+            self._factories.pop(key, None)
+            self._singleton_types.pop(key, None)
+            self._instances.pop(key, None)
+            self._pools.pop(key, None)
+            self._deferred.pop(key, None)
+            self._fork_safe_types.discard(key)
+            # A replaced singleton is created again, instances that already refer to it keep the old one
+            self._singletons.pop(key, None)
+        self._own_types.add(instance_type)
+        return instance_type
+
+    @staticmethod
+    def _registration_keys(instance_type: Any) -> List[Any]:
+        """
+        Returns the registry keys under which ``instance_type`` may be registered:
+        an import path is also the type it leads to once its module is imported.
+        """
+        if not _is_import_path(instance_type):
+            return [classify_type(instance_type).key]
+        keys = [instance_type]
+        if instance_type.partition(':')[0] in sys.modules:
+            try:
+                keys.append(classify_type(_import_object(instance_type)).key)
+            except CreationFailed:
+                # Module still being imported
+                pass
+        return keys
+
+    def register_singleton(
+        self, instance_type: Type, factory: Callable=None, fork_safe: bool=False, override: bool=False,
+    ):
         """
         Register a type for which only a single instance should be created.
+        The type and the factory may be given as import paths, ``'package.module:Name'``.
         """
-        assert not self.is_custom_provided_type(instance_type)
-        self._singleton_types[instance_type] = factory or instance_type
+        instance_type = self._prepare_registration(instance_type, override, shared=True)
+        if fork_safe:
+            self._fork_safe_types.add(instance_type)
+        if _is_import_path(instance_type) or _is_import_path(factory):
+            self._deferred[instance_type] = ('_singleton_types', factory, _is_import_path(factory))
+        else:
+            self._singleton_types[instance_type] = factory or instance_type
+        self._invalidate_dependents(instance_type)
 
-    def register_factory(self, instance_type: Type, factory: Callable):
+    def register_factory(self, instance_type: Type, factory: Callable, override: bool=False):
         """
         Register a callable that should be used to create a new instance of type ``instance_type``.
+        The type and the factory may be given as import paths, see ``register_singleton``.
         """
-        assert not self.is_custom_provided_type(instance_type)
-        self._factories[instance_type] = factory
+        instance_type = self._prepare_registration(instance_type, override)
+        if _is_import_path(instance_type) or _is_import_path(factory):
+            self._deferred[instance_type] = ('_factories', factory, _is_import_path(factory))
+        else:
+            self._factories[instance_type] = factory
+        self._invalidate_dependents(instance_type)
 
-    def register_instance(self, instance: Any, instance_type: Type=None):
+    def register_instance(
+        self, instance: Any, instance_type: Type=None, override: bool=False, import_instance: bool=False,
+    ):
         """
         Register an instance that is always returned when a new instance of type ``instance_type`` is requested.
+        With ``import_instance``, ``instance`` is an import path too, see ``register_singleton``.
         """
+        assert not import_instance or (instance_type is not None and _is_import_path(instance))
         if instance_type is None:
             instance_type = type(instance)
+        instance_type = self._prepare_registration(instance_type, override, shared=True)
+        if _is_import_path(instance_type) or import_instance:
+            self._deferred[instance_type] = ('_instances', instance, import_instance)
+        else:
+            self._instances[instance_type] = instance
+        self._invalidate_dependents(instance_type)
+
+    def register_pool(
+        self,
+        instance_type: Type,
+        factory: Callable,
+        size: int,
+        max_idle: float = None,
+        timeout: float = None,
+        dispose: Callable[[Any], None] = None,
+        override: bool = False,
+    ) -> Pool:
+        """
+        Register a bounded pool of instances created by ``factory``, see ``auto_init.pools``. A context checks out
+        one instance for all of its resolutions, returned to the pool when the context is closed.
+        """
+        assert not _is_import_path(instance_type)
+        instance_type = self._prepare_registration(instance_type, override, shared=True)
+        pool = self._pools[instance_type] = Pool(factory, size, max_idle=max_idle, timeout=timeout, dispose=dispose)
+        self._invalidate_dependents(instance_type)
+        return pool
+
+    def pool_stats(self) -> Dict[Type, Dict[str, Any]]:
+        """
+        Returns the utilisation and wait time counters of the pools of this context.
+        """
+        return {instance_type: pool.stats() for instance_type, pool in self._pools.items()}
+
+    def _checkout(self, plan: "_Plan", resolution: "_Resolution") -> Any:
+        self._check_checkout(plan, resolution)
+        pool = plan.provider
+        with self._checkout_lock:
+            obj = self._checked_out.get(pool, _NOTHING)
+            if obj is _NOTHING:
+                try:
+                    obj = pool.acquire()
+                except PoolTimeout as e:
+                    raise CreationFailed(f"Creation of instance of type {plan.instance_type} timed out: {e}") from e
+                self._checked_out[pool] = obj
+            elif isinstance(obj, asyncio.Future):
+                if not obj.done():
+                    raise CreationFailed(
+                        f"Instance of pooled type {plan.instance_type} is being checked out by aget_instance"
+                    )
+                obj = obj.result()
+        return obj
+
+    async def _acheckout(self, plan: "_Plan", resolution: "_Resolution") -> Any:
+        """
+        Concurrent resolutions share the checkout in progress, which is stored as a task until it is done.
+        """
+        self._check_checkout(plan, resolution)
+        pool = plan.provider
+        with self._checkout_lock:
+            checkout = self._checked_out.get(pool, _NOTHING)
+            if checkout is _NOTHING:
+                checkout = self._checked_out[pool] = asyncio.ensure_future(self._acquire(plan))
+                checkout.add_done_callback(functools.partial(self._checkout_done, pool))
+        if not isinstance(checkout, asyncio.Future):
+            return checkout
+        # A cancelled resolution must not cancel the checkout shared with the others
+        return await asyncio.shield(checkout)
+
+    def _checkout_done(self, pool: Pool, checkout: asyncio.Future):
+        """
+        Replaces a finished checkout task by its object, or forgets it if it failed so that the next resolution retries.
+        """
+        with self._checkout_lock:
+            if self._checked_out.get(pool) is not checkout:
+                # Returned by close() meanwhile
+                return
+            if checkout.cancelled() or checkout.exception() is not None:
+                del self._checked_out[pool]
+            else:
+                self._checked_out[pool] = checkout.result()
+
+    def _check_checkout(self, plan: "_Plan", resolution: "_Resolution"):
+        """
+        Checked out objects are returned to the pool when the context that resolved them is closed.
+        """
+        if resolution.locks:
+            # Singletons, including those created by a parent for a child, outlive the scope
+            raise CreationFailed(f"Instances of pooled type {plan.instance_type} cannot be injected into singletons")
+
+    async def _acquire(self, plan: "_Plan") -> Any:
+        pool = plan.provider
+        try:
+            obj = await pool.aacquire()
+        except PoolTimeout as e:
+            raise CreationFailed(f"Creation of instance of type {plan.instance_type} timed out: {e}") from e
+        return obj
+
+    def _find_deferred(self, key: Any) -> Any:
+        """
+        Returns the key of the deferred registration of ``key``, a type or an import path, or ``None``.
+        Registrations by import path match a type if their module is already imported and the path leads to it.
+        """
+        if key in self._deferred:
+            return key
+        if not isinstance(key, type):
+            return None
+        path = f'{key.__module__}:{key.__qualname__}'
+        if path in self._deferred:
+            return path
+        for path in self._deferred:
+            if _is_import_path(path) and path.partition(':')[0] in sys.modules:
+                try:
+                    if _import_object(path) is key:
+                        return path
+                except CreationFailed:
+                    # Module still being imported
+                    pass
+        return None
+
+    def _resolve_deferred(self, key: Any):
+        """
+        Imports the providers of the deferred registration of ``key``, if any, and moves it to the registries,
+        so that later requests find it with a direct lookup.
+        A child context lets the parent resolve registrations inherited from it so that they are shared.
+        """
+        with self._deferred_lock:
+            path = self._find_deferred(key)
+            if path is None:
+                return
+            if self._parent is not None and self._owns_registries and path not in self._own_types:
+                self._parent._resolve_deferred(key)
+                for registry_name in ('_factories', '_singleton_types', '_instances'):
+                    parent_registry = getattr(self._parent, registry_name)
+                    if key in parent_registry:
+                        getattr(self, registry_name)[key] = parent_registry[key]
+                # Resolved by the parent, which removed it from the registry this one falls back to
+                self._deferred.pop(path, None)
+            else:
+                registry_name, provider, is_import_path = self._deferred[path]
+                if is_import_path:
+                    provider = _import_object(provider)
+                elif provider is None:
+                    provider = key
+                getattr(self, registry_name)[key] = provider
+                if path in self._own_types:
+                    self._own_types.add(key)
+                if path in self._fork_safe_types:
+                    self._fork_safe_types.add(key)
+                del self._deferred[path]
+
+    def register_lazy(self, instance_type: Type):
+        """
+        Register a type whose attributes should be injected lazily, on first access.
+        Lazy attributes are injected by descriptors installed on the class, which remain when the context is gone,
+        see ``_LazyAttribute``.
+        """
+        if self._frozen:
+            raise RegistrationFailed(f"Cannot register {instance_type} in a frozen context")
+        self._copy_on_write()
+        self._lazy_types.add(classify_type(instance_type).key)
+        self._invalidate_dependents(instance_type)
+
+    def register_prototype(self, instance_type: Type):
+        """
+        Register a type whose instances are created by cloning the structure of the first one,
+        with fresh copies of its transient instances.
+        """
+        if self._frozen:
+            raise RegistrationFailed(f"Cannot register {instance_type} in a frozen context")
         assert not self.is_custom_provided_type(instance_type)
-        self._instances[instance_type] = instance
+        self._copy_on_write()
+        self._prototype_types.add(classify_type(instance_type).key)
+        self._invalidate_dependents(instance_type)
+
+    def register_per_resolution(self, instance_type: Type):
+        """
+        Register a type of which a single instance is shared by everything created by one top-level
+        resolution, and a new one is created for the next resolution.
+        """
+        if self._frozen:
+            raise RegistrationFailed(f"Cannot register {instance_type} in a frozen context")
+        key = classify_type(instance_type).key
+        assert key not in self._singleton_types and key not in self._instances and key not in self._pools
+        self._copy_on_write()
+        self._per_resolution_types.add(key)
+        self._invalidate_dependents(instance_type)
 
     def get_instance(self, instance_type: Type):
         """
-        Provides an instance of the specified type.
+        Provides an instance of the specified type, which may be given as an import path.
         It could be a new instance or an existing instance depending on the context.
         """
+        if _is_import_path(instance_type):
+            instance_type = _import_object(instance_type)
         if instance_type in self._instances:
             return self._instances[instance_type]
 
@@ -100,117 +1044,1104 @@ class AutoInitContext:
             assert init_state.initialised
         return instance
 
+    def get_instances(self, instance_type: Type, n: int) -> List[Any]:
+        """
+        Provides ``n`` instances of the specified type.
+        The plan and the singletons shared by the instances are resolved once for the whole batch.
+        """
+        if _is_import_path(instance_type):
+            instance_type = _import_object(instance_type)
+        if instance_type in self._instances:
+            return [self._instances[instance_type]] * n
+
+        resolution = self._local.resolution
+        if resolution is not None:
+            return self._provide_batch(instance_type, n, resolution)
+
+        with _TopLevelResolution(self) as resolution:
+            return self._provide_batch(instance_type, n, resolution)
+
     def init_instance(self, instance):
         """
         Initialise attributes of an existing instance.
         """
-        instance_type = instance.__class__
-        type_hints = self._get_type_hints(instance_type)
+        plan = self._get_plan(instance.__class__)
+        resolution = self._local.resolution
+        if resolution is not None:
+            return self._init_existing_instance(instance, plan, resolution)
+
+        with _TopLevelResolution(self) as resolution:
+            return self._init_existing_instance(instance, plan, resolution)
+
+    def init_instances(self, instances: Iterable[Any], chunk_size: int = 1000) -> Iterator[Any]:
+        """
+        Initialise attributes of a stream of existing instances, yielding each instance once initialised.
+        Instances are initialised in chunks of ``chunk_size``, so only one chunk is held in memory at a time.
+        """
+        assert chunk_size > 0
+        instances = iter(instances)
+        while True:
+            chunk = list(itertools.islice(instances, chunk_size))
+            if not chunk:
+                return
+            self._init_chunk(chunk)
+            yield from chunk
+
+    def _init_chunk(self, chunk: List[Any]):
+        resolution = self._local.resolution
+        if resolution is not None:
+            return self._init_batch(chunk, resolution)
+
+        # Each chunk is a top-level resolution so that nothing leaks to the consumer between chunks
+        with _TopLevelResolution(self) as resolution:
+            self._init_batch(chunk, resolution)
+
+    def _init_batch(self, instances: List[Any], resolution: "_Resolution"):
+        batch_plans = {}
+        for instance in instances:
+            instance_type = instance.__class__
+            batch_plan = batch_plans.get(instance_type)
+            if batch_plan is None:
+                batch_plan = self._get_batch_plan(self._get_plan(instance_type), resolution)
+                batch_plans[instance_type] = batch_plan
+            if batch_plan.singleton:
+                self._init_singleton(batch_plan, resolution, instance)
+            else:
+                self._init_instance(instance, batch_plan, True, resolution)
+
+    def _provide_batch(self, instance_type: Type, n: int, resolution: "_Resolution") -> List[Any]:
+        plan = self._get_plan(instance_type)
+        if plan.singleton or plan.kind is _PARENT or plan.per_resolution:
+            # The batch is one resolution, which shares a single per-resolution instance
+            return [self._provide(instance_type, resolution)[0]] * n
+        generic = (
+            plan.kind is not _COMPOSITE or plan.builder is not None or plan.prototype is not None or
+            instance_type in resolution.pending_types
+        )
+        if generic:
+            return [self._provide(instance_type, resolution)[0] for _ in range(n)]
+
+        batch_plan = self._get_batch_plan(plan, resolution)
+        new_instance = self._new_instance
+        init_instance = self._init_instance
+        provider = plan.provider
+        check_existing = plan.check_existing
+        return [
+            init_instance(new_instance(instance_type, provider), batch_plan, check_existing, resolution)[0]
+            for _ in range(n)
+        ]
+
+    def _get_batch_plan(self, plan: "_Plan", resolution: "_Resolution") -> "_Plan":
+        """
+        Returns a copy of ``plan`` in which attributes of singleton types are resolved to the singleton instances,
+        to be used for a batch of instances within one resolution.
+        """
+        if plan.kind is not _COMPOSITE or plan.singleton:
+            return plan
+        if plan.steps is None:
+            self._compile_steps(plan)
+
+        steps = []
+        for step in plan.steps:
+            attr_name, attr_kind, _, attr_type = step
+            if attr_kind is _NESTED:
+                attr_plan = self._get_plan(attr_type)
+                if attr_plan.singleton or attr_plan.kind is _PARENT or attr_plan.per_resolution:
+                    attr_value, attr_init_state = self._provide(attr_type, resolution)
+                    # Singletons that are part of a pending circular reference must be checked per instance
+                    if attr_init_state is None or attr_init_state.initialised:
+                        step = (attr_name, _INSTANCE, attr_value, attr_type)
+            steps.append(step)
+        return plan.with_steps(steps)
+
+    def _init_existing_instance(self, instance, plan: "_Plan", resolution: "_Resolution"):
+        if plan.singleton:
+            return self._init_singleton(plan, resolution, instance)
+        return self._init_instance(instance, plan, True, resolution)
+
+    @property
+    def _pending_types(self) -> List[Type]:
+        """
+        Stack of types, instances of which are being initialised in the current thread.
+        If we are instantiating a type when another instance of this type
+        is requested, we will always return None unless the instance_type
+        is marked as a singleton and we have an instance (regardless
+        of its initialisation state) available.
+        """
+        resolution = self._local.resolution
+        if resolution is None:
+            return []
+        return resolution.pending_types
+
+    def _init_instance(self, instance, plan: "_Plan", check_existing: bool, resolution: "_Resolution"):
+        init_state = self._start_init(instance, plan, resolution)
+        try:
+            for attr_name, attr_type in self._inject(instance, plan, check_existing, resolution.pending_types):
+                attr_value, attr_init_state = self._provide(attr_type, resolution)
+                setattr(instance, attr_name, attr_value)
+                if attr_init_state is not None:
+                    init_state.add_dependency(attr_init_state)
+            return self._finish_init(init_state, resolution)
+
+        except (CreationFailed, InitialisationFailed):
+            raise
+
+        except Exception as e:
+            raise InitialisationFailed(
+                f"Initialisation of {init_state.instance_type} failed with an exception: {e!r}"
+            ) from e
 
-        self._pending_types.append(instance_type)
+    def _start_init(self, instance, plan: "_Plan", resolution: "_Resolution") -> "_InitState":
+        instance_type = plan.instance_type
+        if plan.steps is None:
+            self._compile_steps(plan)
+
+        resolution.pending_types.append(instance_type)
 
         init_state = _InitState(
             instance_type,
             instance,
         )
 
-        if instance_type in self._singleton_types:
-            self._singletons[instance_type] = init_state
+        if plan.singleton:
+            resolution.add_singleton(instance_type, init_state, plan.lock)
+        elif plan.per_resolution and not isinstance(resolution.shared.get(instance_type), tuple):
+            resolution.shared[instance_type] = (instance, init_state)
+        return init_state
 
-        try:
-            for attr_name, attr_type in type_hints.items():
+    def _inject(self, instance, plan: "_Plan", check_existing: bool, pending_types: List[Type]):
+        """
+        Sets the attributes of the instance that the steps of the plan provide directly and yields
+        ``(attr_name, attr_type)`` of those that need a nested resolution, done by the caller.
+        """
+        for attr_name, attr_kind, attr_provider, attr_type in plan.steps:
+
+            # Do not initialise already initialised attributes
+            if check_existing and self._is_attribute_set(instance, attr_name, attr_kind):
+                continue
+
+            if attr_kind is _INSTANCE:
+                setattr(instance, attr_name, attr_provider)
+            elif attr_kind is _NESTED:
+                yield attr_name, attr_type
+            elif attr_kind is _LAZY:
+                self._bind_lazy_attributes(instance, pending_types)
+            else:
+                setattr(instance, attr_name, attr_provider())
+
+    @staticmethod
+    def _finish_init(init_state: "_InitState", resolution: "_Resolution") -> Tuple[Any, "_InitState"]:
+        init_state._initialised = True
+        resolution.pending_types.pop()
+
+        for d in init_state.dependencies:
+            if not d.initialised:
+                # Part of a circular reference, decided once the resolution is over.
+                resolution.states.append(init_state)
+                break
+        else:
+            init_state.initialised = True
 
-                # Do not initialise already initialised attributes
-                if hasattr(instance, attr_name):
-                    continue
+        return init_state.instance, init_state
 
-                attr_value, attr_init_state = self._create_instance(attr_type)
-                setattr(init_state.instance, attr_name, attr_value)
-                if attr_init_state is not None:
-                    init_state.dependencies.append(attr_init_state)
+    @staticmethod
+    def _is_attribute_set(instance, attr_name: str, attr_kind: str) -> bool:
+        if attr_kind is _LAZY:
+            # Don't trigger resolution of a lazy attribute bound earlier
+            return attr_name in instance.__dict__ or _LAZY_BINDING_ATTR in instance.__dict__
+        return hasattr(instance, attr_name)
 
-            if init_state.has_dependencies_resolved():
-                init_state._initialised = True
-                self._pending_types.remove(instance_type)
+    def _bind_lazy_attributes(self, instance, pending_types: List[Type]):
+        """
+        Binds lazy attributes of the instance to this context.
+        The binding remembers the types being initialised so that circular references are broken
+        the same way as they would be if the attributes were initialised eagerly.
+        """
+        if _LAZY_BINDING_ATTR not in instance.__dict__:
+            instance.__dict__[_LAZY_BINDING_ATTR] = _LazyBinding(self, tuple(pending_types))
 
-            return init_state.instance, init_state
+    def _resolve_lazy_attribute(self, instance, attr_name: str, binding: "_LazyBinding"):
+        """
+        Resolves a lazy attribute on its first access and stores the value in the instance ``__dict__``.
+        """
+        attr_type = self._get_type_hints(type(instance))[attr_name]
 
+        try:
+            with _TopLevelResolution(self, binding.pending_types) as resolution:
+                attr_value, _ = self._provide(attr_type, resolution)
         except (CreationFailed, InitialisationFailed):
             raise
-
         except Exception as e:
             raise InitialisationFailed(
-                f"Initialisation of {init_state.instance_type} failed with an exception: {e!r}"
+                f"Initialisation of {type(instance)}.{attr_name} failed with an exception: {e!r}"
             ) from e
 
-    def _new_instance(self, instance_type: Type):
+        # Another thread may have been quicker
+        return instance.__dict__.setdefault(attr_name, attr_value)
+
+    def _new_instance(self, instance_type: Type, factory: Callable=None):
         try:
-            instance_type = InstanceType(instance_type)
-            return instance_type()
+            if factory is None:
+                factory = classify_type(instance_type).factory
+            return factory()
         except Exception as e:
             raise CreationFailed(
-                f"Creation of instance of type {instance_type.original_type} failed with an "
+                f"Creation of instance of type {instance_type} failed with an "
                 f"exception: {e!r}"
             ) from e
 
     def _create_instance(self, instance_type: Type) -> Tuple[Any, Optional["_InitState"]]:
-        if instance_type in self._PRIMITIVE_BUILTIN_TYPES:
-            return self._new_instance(instance_type), None
+        resolution = self._local.resolution
+        if resolution is not None:
+            return self._provide(instance_type, resolution)
+
+        with _TopLevelResolution(self) as resolution:
+            return self._provide(instance_type, resolution)
 
+    def _provide(self, instance_type: Type, resolution: "_Resolution") -> Tuple[Any, Optional["_InitState"]]:
+        """
+        Provides an instance of ``instance_type`` according to its plan, singletons under the lock of their plan.
+        Creation is inlined rather than delegated so that each level of a deep graph takes only two frames.
+        """
+        plan = self._plans.get(instance_type)
+        if plan is None:
+            plan = self._get_plan(instance_type)
+        kind = plan.kind
+        lock = None
+
+        if plan.singleton:
+            singleton_init_state = self._singletons.get(instance_type)
+            if singleton_init_state is None:
+                # Circular reference to a singleton being created by this resolution.
+                singleton_init_state = resolution.singletons.get(instance_type)
+            if singleton_init_state is not None:
+                return singleton_init_state.instance, singleton_init_state
+            if plan.arguments and instance_type in resolution.pending_types:
+                # Circular reference to a singleton whose constructor arguments are being created.
+                return None, None
+            lock = self._lock_singleton(plan, resolution)
+            if lock is not None:
+                singleton_init_state = self._singletons.get(instance_type)
+                if singleton_init_state is not None:
+                    self._unlock_singleton(lock, resolution)
+                    return singleton_init_state.instance, singleton_init_state
+
+        elif plan.per_resolution:
+            shared = resolution.shared.get(instance_type)
+            if shared is not None:
+                return shared
+
+        try:
+            if kind is _COMPOSITE:
+                if plan.builder is not None:
+                    try:
+                        result = plan.builder(self, resolution), None
+                    except (CreationFailed, InitialisationFailed):
+                        raise
+                    except Exception as e:
+                        raise InitialisationFailed(
+                            f"Initialisation of {instance_type} failed with an exception: {e!r}"
+                        ) from e
+                elif instance_type in resolution.pending_types:
+                    # We are already initialising an instance of this type so must be a circular reference.
+                    return None, None
+                elif plan.prototype is not None:
+                    result = self._provide_from_prototype(plan, resolution)
+                else:
+                    if plan.arguments:
+                        instance = self._construct(plan, resolution)
+                    else:
+                        instance = self._new_instance(instance_type, plan.provider)
+                    result = self._init_instance(instance, plan, plan.check_existing, resolution)
+
+            elif kind is _INSTANCE:
+                return plan.provider, None
+
+            elif kind is _PARENT:
+                return plan.provider._provide(instance_type, resolution)
+
+            elif kind is _POOL:
+                if plan.provider.is_async:
+                    raise CreationFailed(
+                        f"Creation of instance of type {instance_type} requires an asynchronous provider, "
+                        f"use aget_instance"
+                    )
+                return self._checkout(plan, resolution), None
+
+            elif plan.awaitable:
+                raise CreationFailed(
+                    f"Creation of instance of type {instance_type} requires an asynchronous provider, "
+                    f"use aget_instance"
+                )
+
+            elif kind is _FACTORY:
+                result = plan.provider(), None
+
+            elif kind is _CONSTRUCTOR:
+                if instance_type in resolution.pending_types:
+                    # Circular reference through constructor arguments
+                    return None, None
+                result = self._construct(plan, resolution), None
+
+            else:
+                result = self._new_instance(instance_type, plan.provider), None
+
+            if plan.singleton:
+                if result[1] is None:
+                    # Singletons need to have InitState for consistent storage in self._singletons
+                    init_state = _InitState(instance_type, result[0], initialised=True)
+                    resolution.add_singleton(instance_type, init_state, plan.lock)
+                    result = result[0], init_state
+                if lock is not None:
+                    resolution.publish(self._singletons, lock)
+            elif plan.per_resolution and result[0] is not None:
+                resolution.shared.setdefault(instance_type, result)
+            return result
+
+        finally:
+            if lock is not None:
+                self._unlock_singleton(lock, resolution)
+
+    def _lock_singleton(self, plan: "_Plan", resolution: "_Resolution") -> Optional[threading.RLock]:
+        """
+        Takes the lock under which the singleton of ``plan`` is created, or returns ``None`` if the resolution
+        already holds it because it is creating another member of the dependency cycle.
+        """
+        lock = plan.lock or self._get_singleton_lock(plan)
+        if lock in resolution.locks:
+            return None
+        lock.acquire()
+        resolution.locks.add(lock)
+        return lock
+
+    def _unlock_singleton(self, lock: threading.RLock, resolution: "_Resolution"):
+        resolution.locks.discard(lock)
+        resolution.discard_singletons(lock)
+        lock.release()
+        if self._lock_waiters:
+            with self._lock:
+                waiters = self._lock_waiters.pop(lock, ())
+            for loop, waiter in waiters:
+                loop.call_soon_threadsafe(_wake_up, waiter)
+
+    def _construct(self, plan: "_Plan", resolution: "_Resolution"):
+        """
+        Creates an instance in a single call of the provider with the required constructor arguments.
+        The type is pending while the arguments are created so that circular references to it are left ``None``.
+        """
+        pending_types = resolution.pending_types
+        pending_types.append(plan.instance_type)
+        try:
+            arguments = {}
+            for attr_name, attr_type in plan.arguments:
+                if attr_type in self._instances:
+                    arguments[attr_name] = self._instances[attr_type]
+                else:
+                    arguments[attr_name] = self._provide(attr_type, resolution)[0]
+        finally:
+            pending_types.pop()
+        return self._call_constructor(plan, arguments)
+
+    async def _aconstruct(self, plan: "_Plan", resolution: "_Resolution"):
+        pending_types = resolution.pending_types
+        pending_types.append(plan.instance_type)
+        try:
+            values = await self._aprovide_all([attr_type for _, attr_type in plan.arguments], plan, resolution)
+        finally:
+            pending_types.pop()
+        arguments = {attr_name: value for (attr_name, _), (value, _) in zip(plan.arguments, values)}
+        return self._call_constructor(plan, arguments)
+
+    @staticmethod
+    def _call_constructor(plan: "_Plan", arguments: Dict[str, Any]):
+        try:
+            return plan.provider(**arguments)
+        except Exception as e:
+            raise CreationFailed(
+                f"Creation of instance of type {plan.instance_type} failed with an exception: {e!r}"
+            ) from e
+
+    def _provide_from_prototype(self, plan: "_Plan", resolution: "_Resolution") -> Tuple[Any, Optional["_InitState"]]:
+        instance_type = plan.instance_type
+        prototype = plan.prototype
+        clone = prototype.clone
+        if clone is not None and prototype.types.isdisjoint(resolution.pending_types):
+            try:
+                return clone(self, resolution), None
+            except (CreationFailed, InitialisationFailed):
+                raise
+            except Exception as e:
+                raise InitialisationFailed(
+                    f"Initialisation of {instance_type} failed with an exception: {e!r}"
+                ) from e
+
+        instance = self._new_instance(instance_type, plan.provider)
+        instance, init_state = self._init_instance(instance, plan, plan.check_existing, resolution)
+        if clone is None and prototype.supported and (init_state is None or init_state.initialised):
+            if self._may_await(plan):
+                prototype.supported = False
+            else:
+                self._capture_prototype(plan, instance, resolution)
+        return instance, init_state
+
+    def _capture_prototype(self, plan: "_Plan", instance, resolution: "_Resolution"):
+        """
+        Generates the function that clones ``instance``, a fully initialised instance of a prototype type.
+        Nothing is captured if the structure depends on the resolution in progress.
+        """
+        namespace = {'_new': object.__new__}
+        lines = []
+        types = set()
+
+        def constant(value) -> str:
+            name = f'_c{len(namespace)}'
+            namespace[name] = value
+            return name
+
+        def emit(obj, obj_plan: _Plan) -> Optional[str]:
+            types.add(obj_plan.instance_type)
+            items = []
+            for attr_name, attr_kind, attr_provider, attr_type in obj_plan.steps:
+                if attr_name not in obj.__dict__:
+                    return None
+                value = obj.__dict__[attr_name]
+                if attr_kind is _INSTANCE:
+                    expression = constant(value)
+                elif attr_kind is _NESTED:
+                    if value is None:
+                        if attr_type in resolution.pending_types:
+                            return None
+                        expression = 'None'
+                    else:
+                        attr_plan = self._get_plan(attr_type)
+                        copied = (
+                            attr_plan.kind is _COMPOSITE and attr_plan.prototype is None and
+                            _can_build_directly(attr_plan)
+                        )
+                        if attr_plan.singleton or attr_plan.kind is _PARENT:
+                            if not self._is_published_singleton(attr_plan, value):
+                                return None
+                            expression = constant(value)
+                        elif attr_plan.kind is _INSTANCE:
+                            expression = constant(value)
+                        elif copied:
+                            expression = emit(value, attr_plan)
+                            if expression is None:
+                                return None
+                        else:
+                            expression = f'context._provide({constant(attr_type)}, resolution)[0]'
+                else:
+                    expression = f'{constant(attr_provider)}()'
+                items.append(f'{attr_name!r}: {expression}')
+
+            name = f'_o{len(lines)}'
+            lines.append(f'    {name} = _new({constant(obj_plan.instance_type)})')
+            lines.append(f'    {name}.__dict__.update({{{", ".join(items)}}})')
+            return name
+
+        root = emit(instance, plan)
+        if root is None:
+            return
+
+        source = 'def clone(context, resolution):\n%s\n    return %s\n' % ('\n'.join(lines), root)
+        exec(compile(source, f'<auto_init prototype of {plan.instance_type!r}>', 'exec'), namespace)
+        plan.prototype.types = frozenset(types)
+        plan.prototype.clone = namespace['clone']
+
+    def _is_published_singleton(self, plan: "_Plan", instance) -> bool:
+        """
+        Returns ``True`` if ``instance`` is the published singleton of the plan's type, in this or the parent context.
+        """
+        singletons = plan.provider._singletons if plan.kind is _PARENT else self._singletons
+        singleton_init_state = singletons.get(plan.instance_type)
+        return singleton_init_state is not None and singleton_init_state.instance is instance
+
+    def _init_singleton(self, plan: "_Plan", resolution: "_Resolution", instance) -> Tuple[Any, "_InitState"]:
+        """
+        Initialises ``instance`` and makes it the singleton of ``plan.instance_type``, replacing any existing one.
+        """
+        lock = self._lock_singleton(plan, resolution)
+        try:
+            result = self._init_instance(instance, plan, True, resolution)
+            if lock is not None:
+                resolution.publish(self._singletons, lock)
+            return result
+        finally:
+            if lock is not None:
+                self._unlock_singleton(lock, resolution)
+
+    async def aget_instance(self, instance_type: Type):
+        """
+        Provides an instance of the specified type, awaiting any asynchronous factories.
+        Attributes that depend on asynchronous factories are created concurrently.
+        """
+        if _is_import_path(instance_type):
+            instance_type = _import_object(instance_type)
         if instance_type in self._instances:
-            return self._instances[instance_type], None
+            return self._instances[instance_type]
 
-        # The type that will be used to create the actual instance.
-        actual_instance_type: Type = instance_type
+        with _TopLevelResolution(self, thread_local=False) as resolution:
+            instance, init_state = await self._aprovide(instance_type, resolution)
+        if init_state is not None:
+            assert init_state.initialised
+        return instance
 
-        if instance_type in self._singleton_types:
-            actual_instance_type = self._singleton_types[instance_type]
-            if instance_type in self._singletons:
-                singleton_init_state = self._singletons[instance_type]
+    async def ainit_instance(self, instance):
+        """
+        Initialise attributes of an existing instance, awaiting any asynchronous factories.
+        """
+        plan = self._get_plan(instance.__class__)
+        with _TopLevelResolution(self, thread_local=False) as resolution:
+            if plan.singleton:
+                return await self._aprovide_singleton(plan, resolution, instance=instance)
+            return await self._ainit_instance(instance, plan, True, resolution)
+
+    async def _aprovide(self, instance_type: Type, resolution: "_Resolution") -> Tuple[Any, Optional["_InitState"]]:
+        plan = self._plans.get(instance_type)
+        if plan is None:
+            plan = self._get_plan(instance_type)
+
+        if not self._may_await(plan):
+            return self._provide(instance_type, resolution)
+
+        if plan.singleton:
+            singleton_init_state = self._singletons.get(instance_type)
+            if singleton_init_state is not None:
                 return singleton_init_state.instance, singleton_init_state
+            return await self._aprovide_singleton(plan, resolution)
+
+        if plan.per_resolution:
+            return await self._aprovide_shared(plan, resolution)
+
+        return await self._aprovide_new(plan, resolution)
 
-        if instance_type in self._factories:
-            instance = self._factories[instance_type]()
+    async def _aprovide_shared(self, plan: "_Plan", resolution: "_Resolution") -> Tuple[Any, Optional["_InitState"]]:
+        """
+        Concurrent branches of the resolution share the creation in progress, which is stored as a task,
+        like checkouts of pools. Types with circular references are created by each branch that finds none
+        and the first one is kept, waiting for each other could deadlock.
+        """
+        instance_type = plan.instance_type
+        shared = resolution.shared.get(instance_type)
+        if isinstance(shared, asyncio.Future):
+            if instance_type in resolution.pending_types:
+                # Circular reference while its dependencies are created
+                return None, None
+            return await asyncio.shield(shared)
+        if shared is not None:
+            return shared
+        if plan.cyclic:
+            result = await self._aprovide_new(plan, resolution)
+            if result[0] is not None:
+                result = resolution.shared.setdefault(instance_type, result)
+            return result
+
+        creation = resolution.shared[instance_type] = asyncio.ensure_future(
+            self._aprovide_new(plan, resolution.fork())
+        )
+        try:
+            result = await asyncio.shield(creation)
+        except BaseException:
+            if resolution.shared.get(instance_type) is creation:
+                del resolution.shared[instance_type]
+            raise
+        if result[0] is None:
+            del resolution.shared[instance_type]
+        else:
+            resolution.shared[instance_type] = result
+        return result
+
+    async def _aprovide_new(self, plan: "_Plan", resolution: "_Resolution") -> Tuple[Any, Optional["_InitState"]]:
+        instance_type = plan.instance_type
+        kind = plan.kind
+
+        if kind is _COMPOSITE:
+            if instance_type in resolution.pending_types:
+                # We are already initialising an instance of this type so must be a circular reference.
+                return None, None
+            if plan.arguments:
+                instance = await self._aconstruct(plan, resolution)
+            else:
+                instance = self._new_instance(instance_type, plan.provider)
+            return await self._ainit_instance(instance, plan, plan.check_existing, resolution)
+
+        if kind is _PARENT:
+            return await plan.provider._aprovide(instance_type, resolution)
+
+        if kind is _POOL:
+            return await self._acheckout(plan, resolution), None
+
+        if kind is _FACTORY:
+            instance = plan.provider()
+            if inspect.isawaitable(instance):
+                instance = await instance
             return instance, None
 
+        if kind is _CONSTRUCTOR:
+            if instance_type in resolution.pending_types:
+                # Circular reference through constructor arguments
+                return None, None
+            return await self._aconstruct(plan, resolution), None
+
+        instance = self._new_instance(instance_type, plan.provider)
+        if inspect.isawaitable(instance):
+            try:
+                instance = await instance
+            except Exception as e:
+                raise CreationFailed(
+                    f"Creation of instance of type {instance_type} failed with an exception: {e!r}"
+                ) from e
+        return instance, None
+
+    async def _aprovide_all(self, instance_types: List[Type], plan: "_Plan", resolution: "_Resolution"):
+        """
+        Provides instances of ``instance_types`` needed by ``plan``.
+        Instances which may need to be awaited are created concurrently, each in its own branch of the resolution,
+        unless the plan is part of a cycle in which case the order of creation decides where the cycle is broken.
+        """
+        concurrent = [
+            i for i, t in enumerate(instance_types)
+            if self._may_await(self._get_plan(t))
+        ]
+        if len(concurrent) < 2 or plan.cyclic:
+            return [await self._aprovide(t, resolution) for t in instance_types]
+
+        results = [None] * len(instance_types)
+        gathered = await asyncio.gather(*(
+            self._aprovide(instance_types[i], resolution.fork()) for i in concurrent
+        ))
+        for i, result in zip(concurrent, gathered):
+            results[i] = result
+        for i, t in enumerate(instance_types):
+            if results[i] is None:
+                results[i] = self._provide(t, resolution)
+        return results
+
+    async def _ainit_instance(self, instance, plan: "_Plan", check_existing: bool, resolution: "_Resolution"):
+        init_state = self._start_init(instance, plan, resolution)
+        try:
+            nested = list(self._inject(instance, plan, check_existing, resolution.pending_types))
+            values = await self._aprovide_all([attr_type for _, attr_type in nested], plan, resolution)
+            for (attr_name, _), (attr_value, attr_init_state) in zip(nested, values):
+                setattr(instance, attr_name, attr_value)
+                if attr_init_state is not None:
+                    init_state.add_dependency(attr_init_state)
+            return self._finish_init(init_state, resolution)
+
+        except (CreationFailed, InitialisationFailed):
+            raise
+
+        except Exception as e:
+            raise InitialisationFailed(
+                f"Initialisation of {init_state.instance_type} failed with an exception: {e!r}"
+            ) from e
+
+    async def _aprovide_singleton(
+        self, plan: "_Plan", resolution: "_Resolution", instance=None,
+    ) -> Tuple[Any, "_InitState"]:
+        """
+        Asynchronous counterpart of the creation of singletons in ``_provide``.
+        Tasks of the same event loop await the creation in progress instead of blocking on the lock.
+        """
+        instance_type = plan.instance_type
+        replace = instance is not None
+        lock = self._get_singleton_lock(plan)
+
+        if lock in resolution.locks:
+            # Circular reference to a singleton being created by this branch of the resolution,
+            # or another member of the dependency cycle.
+            singleton_init_state = resolution.singletons.get(instance_type)
+            if singleton_init_state is not None and not replace:
+                return singleton_init_state.instance, singleton_init_state
+            return await self._acreate_singleton(plan, resolution, instance)
+
+        loop = get_running_loop()
+        creation_key = (lock, loop)
+        while True:
+            if not replace:
+                singleton_init_state = self._singletons.get(instance_type)
+                if singleton_init_state is not None:
+                    return singleton_init_state.instance, singleton_init_state
+            creation = self._async_creations.get(creation_key)
+            if creation is None:
+                break
+            await asyncio.shield(creation)
+
+        self._async_creations[creation_key] = creation = loop.create_future()
+        try:
+            await self._alock_singleton(lock, loop)
+            resolution.locks.add(lock)
+            try:
+                if not replace:
+                    singleton_init_state = self._singletons.get(instance_type)
+                    if singleton_init_state is not None:
+                        return singleton_init_state.instance, singleton_init_state
+                result = await self._acreate_singleton(plan, resolution, instance)
+                resolution.publish(self._singletons, lock)
+                return result
+            finally:
+                self._unlock_singleton(lock, resolution)
+        finally:
+            del self._async_creations[creation_key]
+            creation.set_result(None)
+
+    async def _alock_singleton(self, lock: threading.RLock, loop: asyncio.AbstractEventLoop):
+        """
+        Takes a singleton lock without blocking the event loop while another thread holds it,
+        the coroutine waits until ``_unlock_singleton`` wakes it up.
+        """
+        while True:
+            waiter = loop.create_future()
+            with self._lock:
+                self._lock_waiters.setdefault(lock, []).append((loop, waiter))
+            # Registered first so that a release by the thread holding the lock cannot be missed.
+            # Once the lock is taken, the waiter is left to be woken up by the release of this coroutine.
+            if lock.acquire(blocking=False):
+                return
+            await waiter
+
+    async def _acreate_singleton(self, plan: "_Plan", resolution: "_Resolution", instance=None):
+        if instance is None:
+            instance, init_state = await self._aprovide_new(plan, resolution)
+        else:
+            instance, init_state = await self._ainit_instance(instance, plan, True, resolution)
+        if init_state is None:
+            # Singletons need to have InitState for consistent storage in self._singletons
+            init_state = _InitState(plan.instance_type, instance, initialised=True)
+            resolution.add_singleton(plan.instance_type, init_state, plan.lock)
+        return instance, init_state
+
+    def _get_singleton_lock(self, plan: "_Plan") -> threading.RLock:
+        """
+        Returns the lock under which the singleton of ``plan`` is created.
+        """
+        if plan.lock is None:
+            self._analyse_plan_graph(plan)
+        return plan.lock
+
+    def _may_await(self, plan: "_Plan") -> bool:
+        """
+        Returns ``True`` if providing an instance according to the plan may involve asynchronous providers.
+        """
+        if plan.may_await is None:
+            self._analyse_plan_graph(plan)
+        return plan.may_await
+
+    def _analyse_plan_graph(self, plan: "_Plan"):
+        """
+        Analyses the graph of plans reachable from ``plan`` in one pass. Singletons of a strongly connected
+        component share one lock, so locks are taken in topological order and never deadlock.
+        """
+        # Plans seen by the analysis, a bounded cache may evict them meanwhile
+        plans = {}
+
+        def get_plan(t: Type) -> _Plan:
+            p = plans.get(t)
+            if p is None:
+                p = plans[t] = self._plans.get(t) or self._cache_plan(t)
+            return p
+
+        def unanalysed_dependencies(p: _Plan):
+            return [d for d in map(get_plan, p.dependency_types()) if d.may_await is None]
+
+        with self._lock:
+            if plan.may_await is not None:
+                return
+            try:
+                components = _strongly_connected_components([plan], unanalysed_dependencies)
+            except Exception:
+                # Let the creation report any problems with the dependencies.
+                plan.lock = plan.lock or threading.RLock()
+                plan.cyclic = True
+                plan.may_await = plan.awaitable
+                return
+
+            for component in components:
+                lock = threading.RLock()
+                member_types = {member.instance_type for member in component}
+                cyclic = len(component) > 1 or component[0].instance_type in component[0].dependency_types()
+                may_await = False
+                for member in component:
+                    may_await = may_await or member.awaitable or any(
+                        get_plan(t).may_await
+                        for t in member.dependency_types() if t not in member_types
+                    )
+                for member in component:
+                    if member.singleton and member.lock is None:
+                        member.lock = lock
+                    member.cyclic = cyclic
+                    member.may_await = may_await
+                if self.codegen:
+                    # Components come after those they depend on, whose builders are then generated already
+                    for member in component:
+                        if member.kind is _COMPOSITE:
+                            member.builder = self._generate_builder(member, plans)
+
+    def _get_plan(self, instance_type: Type) -> "_Plan":
+        """
+        Returns the resolution plan for the specified type, compiling it on first request.
+        """
+        plan = self._plans.get(instance_type)
+        if plan is None:
+            plan = self._cache_plan(instance_type)
+            if self.codegen and plan.kind is _COMPOSITE and plan.may_await is None:
+                # Builders are generated by the analysis, which knows the plans reachable from this one
+                self._analyse_plan_graph(plan)
+        return plan
+
+    def _cache_plan(self, instance_type: Type) -> "_Plan":
+        """
+        Compiles the plan of ``instance_type`` and caches it, unless another thread cached one meanwhile.
+        """
+        compiled = self._compile_plan(instance_type)
+        # Threads compiling the same type concurrently all continue with the plan published first
+        with self._plans_lock:
+            plan = self._plans.get(instance_type)
+            if plan is None:
+                compiled.generation = next(_plan_generations)
+                plan = self._plans[instance_type] = compiled
+        if plan is compiled:
+            self._index_plan(plan)
+        return plan
+
+    def _compile_plan(self, instance_type: Type) -> "_Plan":
+        """
+        Makes all the decisions of how to provide an instance of ``instance_type``
+        that do not depend on the state of a particular resolution.
+        """
+        plan = _Plan(instance_type)
+        key = classify_type(instance_type).key
+        plan.lazy = self.lazy or key in self._lazy_types
+        plan.per_resolution = key in self._per_resolution_types
+
+        if instance_type in self._PRIMITIVE_BUILTIN_TYPES:
+            plan.kind = _PRIMITIVE
+            plan.provider = instance_type
+            return plan
+
+        if self._deferred:
+            self._resolve_deferred(key)
+
+        if key in self._instances:
+            plan.kind = _INSTANCE
+            plan.provider = self._instances[key]
+            return plan
+
+        if key in self._pools:
+            plan.kind = _POOL
+            plan.provider = self._pools[key]
+            # Even pools with synchronous factories are awaited so that waiting does not block the event loop
+            plan.awaitable = True
+            return plan
+
+        # The type that will be used to create the actual instance.
+        actual_instance_type: Type = instance_type
+
+        if key in self._singleton_types:
+            if self._parent is not None and self._owns_registries and key not in self._own_types:
+                # Singletons registered in a parent context are created and stored by the parent
+                plan.kind = _PARENT
+                plan.provider = self._parent
+                plan.awaitable = self._parent._may_await(self._parent._get_plan(instance_type))
+                return plan
+            plan.singleton = True
+            actual_instance_type = self._singleton_types[key]
+
+        if key in self._factories:
+            plan.kind = _FACTORY
+            plan.provider = self._factories[key]
+            plan.awaitable = inspect.iscoroutinefunction(plan.provider)
+            return plan
+
+        type_hints = self._get_type_hints(instance_type)
+        type_info = classify_type(instance_type)
+
+        if dataclasses.is_dataclass(instance_type) or _is_named_tuple(instance_type):
+            # Created in a single call with the required fields, other fields keep their defaults
+            plan.kind = _CONSTRUCTOR
+            plan.provider = type_info.factory
+            plan.arguments = type_info.constructor_arguments() or []
+            return plan
+
+        if actual_instance_type is instance_type:
+            # Injected constructor arguments of classes that cannot be created without them
+            plan.arguments = type_info.constructor_arguments() or None
+
+        if not type_hints and not plan.arguments:
+            plan.kind = _SIMPLE
+            if actual_instance_type is instance_type:
+                plan.provider = type_info.factory
+            else:
+                # Singleton factory
+                plan.provider = actual_instance_type
+                plan.awaitable = inspect.iscoroutinefunction(plan.provider)
+            return plan
+
+        plan.kind = _COMPOSITE
+        plan.provider = type_info.factory
+        self._compile_steps(plan)
+        plan.prototype = self._new_prototype(plan)
+        return plan
+
+    def _new_prototype(self, plan: "_Plan") -> Optional["_Prototype"]:
+        key = classify_type(plan.instance_type).key
+        if key in self._prototype_types and _can_build_directly(plan) and not self._traced:
+            return _Prototype()
+        return None
+
+    def _compile_steps(self, plan: "_Plan"):
+        """
+        Compiles the attribute injection steps of the plan.
+        Attributes of types that can be provided without recursion are resolved here to their providers.
+        """
+        instance_type = plan.instance_type
         type_hints = self._get_type_hints(instance_type)
 
-        if dataclasses.is_dataclass(instance_type):
-            # Inject only the required attributes
-            required = {}
-            for f in dataclasses.fields(instance_type):  # type: dataclasses.Field
-                if f.default is dataclasses.MISSING and f.default_factory is dataclasses.MISSING:
-                    required[f.name] = self.get_instance(type_hints[f.name])
-            instance = instance_type(**required)
-            return instance, None
+        # Attributes that are always set on fresh instances needn't be checked for each new instance.
+        plan.check_existing = not (
+            getattr(instance_type, '__init__', None) is object.__init__ and
+            getattr(instance_type, '__new__', None) is object.__new__ and
+            getattr(instance_type, '__getattribute__', None) is object.__getattribute__ and
+            not hasattr(instance_type, '__getattr__')
+        )
 
-        if not type_hints:
-            instance = self._new_instance(actual_instance_type)
-            if instance_type in self._singleton_types:
-                # Singletons need to have InitState for consistent storage in self._singletons
-                self._singletons[instance_type] = _InitState(instance_type, instance, initialised=True)
-                return instance, self._singletons[instance_type]
-            return instance, None
+        # Attributes passed to the constructor
+        arguments = {attr_name for attr_name, _ in plan.arguments or ()}
+
+        steps = []
+        for attr_name, attr_type in type_hints.items():
+            if attr_name in arguments:
+                continue
+            if not plan.check_existing and _has_plain_class_attribute(instance_type, attr_name):
+                continue
+            attr_type_info = classify_type(attr_type)
+            key = attr_type_info.key
+            if attr_type in self._PRIMITIVE_BUILTIN_TYPES:
+                steps.append((attr_name, _PRIMITIVE, attr_type, attr_type))
+            elif key in self._instances:
+                steps.append((attr_name, _INSTANCE, self._instances[key], attr_type))
+            elif key in self._per_resolution_types:
+                # Shared through the resolution
+                steps.append((attr_name, _NESTED, None, attr_type))
+            elif key in self._factories and not inspect.iscoroutinefunction(self._factories[key]) and not self._traced:
+                steps.append((attr_name, _FACTORY, self._factories[key], attr_type))
+            elif key not in self._singleton_types and attr_type_info.is_typing:
+                steps.append((attr_name, _PRIMITIVE, attr_type_info.factory, attr_type))
+            else:
+                steps.append((attr_name, _NESTED, None, attr_type))
+
+            if plan.lazy and steps[-1][1] in (_NESTED, _FACTORY) and _install_lazy_attribute(instance_type, attr_name):
+                steps[-1] = (attr_name, _LAZY, None, attr_type)
+        plan.steps = steps
 
-        if instance_type in self._pending_types:
-            # We are already initialising an instance of this type so must be a circular reference.
-            return None, None
+    def _generate_builder(self, plan: "_Plan", plans: Mapping) -> Optional[Callable]:
+        """
+        Generates a straight-line function that creates and initialises an instance of ``plan.instance_type``,
+        or returns ``None`` if the type needs the generic path of ``_init_instance``.
+        Builders of the attributes are taken from ``plans``, the analysed plans reachable from ``plan``.
+        """
+        instance_type = plan.instance_type
+        if not _can_build_directly(plan) or plan.prototype is not None or self._traced:
+            return None
+        if plan.cyclic is not False:
+            # Part of a cycle, which relies on _pending_types to be broken, or not analysed
+            return None
+
+        namespace = {
+            '_new': object.__new__,
+            '_type': instance_type,
+        }
+        items = []
+        for i, (attr_name, attr_kind, attr_provider, attr_type) in enumerate(plan.steps):
+            name = f'_p{i}'
+            if attr_kind is _INSTANCE:
+                namespace[name] = attr_provider
+                items.append(f'{attr_name!r}: {name}')
+            elif attr_kind is _NESTED:
+                attr_plan = plans.get(attr_type)
+                if attr_plan is not None and attr_plan.builder is not None:
+                    namespace[name] = attr_plan.builder
+                    items.append(f'{attr_name!r}: {name}(context, resolution)')
+                else:
+                    namespace[name] = attr_type
+                    items.append(f'{attr_name!r}: context._provide({name}, resolution)[0]')
+            else:
+                namespace[name] = attr_provider
+                items.append(f'{attr_name!r}: {name}()')
+
+        source = (
+            'def build(context, resolution):\n'
+            '    instance = _new(_type)\n'
+            '    instance.__dict__.update({%s})\n'
+            '    return instance\n'
+        ) % ', '.join(items)
+        exec(compile(source, f'<auto_init builder of {instance_type!r}>', 'exec'), namespace)
+        return namespace['build']
+
+    def _index_plan(self, plan: "_Plan"):
+        """
+        Records the plan in the reverse-dependency index under the keys of its own type
+        and of the types it refers to, see ``_invalidate_dependents``.
+        """
+        keys = {classify_type(plan.instance_type).key}
+        keys.update(classify_type(attr_type).key for _, _, _, attr_type in plan.steps or ())
+        keys.update(classify_type(attr_type).key for _, attr_type in plan.arguments or ())
+        with self._index_lock:
+            for key in keys:
+                dependents = self._dependents.get(key)
+                if dependents is None:
+                    dependents = self._dependents[key] = self._new_type_set()
+                dependents.add(plan.instance_type)
+
+    def _invalidate_dependents(self, instance_type: Type):
+        """
+        Evicts the plans of ``instance_type`` and of the types that refer to it, directly or transitively,
+        after its registration changed. Their providers, generated builders, prototypes and singleton locks
+        may all depend on the evicted plan, all other plans are kept. Child contexts fall back to the changed
+        registration unless they replaced it, so the plans they compiled themselves are evicted as well.
+        """
+        stack = self._registration_keys(instance_type)
+        seen = set()
+        with self._index_lock:
+            while stack:
+                key = stack.pop()
+                if key in seen:
+                    continue
+                seen.add(key)
+                dependent_types = list(self._dependents.pop(key, ()))
+                if isinstance(self._plans, _Overlay):
+                    # Plans inherited from the parent are hidden from this context, the parent keeps them
+                    dependent_types.extend(self._parent._dependent_types(key))
+                for dependent_type in dependent_types:
+                    self._plans.pop(dependent_type, None)
+                    stack.append(classify_type(dependent_type).key)
+        self._invalidate_children(instance_type)
+
+    def _invalidate_children(self, instance_type: Type):
+        with self._children_lock:
+            children = list(self._children)
+        for child in children:
+            if child._owns_registries:
+                child._invalidate_dependents(instance_type)
+            else:
+                # Shares the plans of this context, but its own children may not
+                child._invalidate_children(instance_type)
 
-        instance = self._new_instance(instance_type)
-        return self.init_instance(instance)
+    def _dependent_types(self, key: Any) -> List[Type]:
+        """
+        Returns the types whose plans refer to the registry key in this context, including inherited plans.
+        """
+        with self._index_lock:
+            dependent_types = list(self._dependents.get(key, ()))
+        if isinstance(self._plans, _Overlay):
+            dependent_types.extend(self._parent._dependent_types(key))
+        return dependent_types
 
     def _get_type_hints(self, instance_type: Type) -> Dict[str, Type]:
         """
-        Returns type hints for the specified instance type.
+        Returns type hints for the specified instance type, from the cache shared by all contexts.
         """
-        if instance_type not in self._type_hints:
-            if InstanceType(instance_type).is_typing:
-                # Do not attempt to get type hints from typing.* classes because it doesn't work in Python 3.7
-                # and we are not expecting anything useful anyway.
-                self._type_hints[instance_type] = {}
-            else:
-                self._type_hints[instance_type] = dict(get_type_hints(instance_type))
-        return self._type_hints[instance_type]
+        return classify_type(instance_type).type_hints()
 
     def __enter__(self):
         if auto_init_context_stack.get() is None:
@@ -222,111 +2153,464 @@ class AutoInitContext:
         stack = auto_init_context_stack.get()
         assert stack[-1] is self
         stack.pop()
+        self.close()
 
 
-auto_init_context_stack = ContextVar('auto_init_context_stack', default=[AutoInitContext()])
+# Provider kinds of resolution plans and of their attribute steps.
+_PRIMITIVE = 'primitive'
+_INSTANCE = 'instance'
+_FACTORY = 'factory'
+_CONSTRUCTOR = 'constructor'
+_SIMPLE = 'simple'
+_COMPOSITE = 'composite'
+_NESTED = 'nested'
+_LAZY = 'lazy'
+_PARENT = 'parent'
+_POOL = 'pool'
 
+# Kinds of the nodes of dependency graphs by the kind of the plan of the type, see AutoInitContext.graph().
+_GRAPH_NODE_KINDS = {
+    _PRIMITIVE: _graph.PRIMITIVE,
+    _INSTANCE: _graph.INSTANCE,
+    _FACTORY: _graph.FACTORY,
+    _POOL: _graph.POOL,
+    _PARENT: _graph.PARENT,
+    _CONSTRUCTOR: _graph.DATACLASS,
+    _SIMPLE: _graph.TRANSIENT,
+    _COMPOSITE: _graph.TRANSIENT,
+}
 
-class _InitState:
+# Contexts created with fork_aware=True, see AutoInitContext._after_fork().
+_fork_aware_contexts: MutableSet = weakref.WeakSet()
+
+
+def _wake_up(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def _release_checkout(pool: Pool, checkout: asyncio.Future):
+    if not checkout.cancelled() and checkout.exception() is None:
+        pool.release(checkout.result())
+
+
+def _reset_after_fork():
+    for ctx in list(_fork_aware_contexts):
+        ctx._after_fork()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _is_import_path(obj: Any) -> bool:
+    return isinstance(obj, str) and ':' in obj
+
+
+def _import_object(path: str) -> Any:
     """
-    Represents the initialisation state of an instance of non-primitive type `instance_type`.
+    Returns the object at the import path ``'package.module:Qualified.Name'``, importing the module if needed.
     """
-    def __init__(self, instance_type: Type, instance: Any, *, created: bool=True, initialised: bool=False):
+    module_name, _, qualname = path.partition(':')
+    try:
+        obj = sys.modules.get(module_name) or importlib.import_module(module_name)
+        for name in qualname.split('.'):
+            obj = getattr(obj, name)
+    except (ImportError, AttributeError) as e:
+        raise CreationFailed(f"Cannot import {path}: {e!r}") from e
+    return obj
+
+
+def _can_build_directly(plan: "_Plan") -> bool:
+    """
+    Returns ``True`` if instances of a composite plan can be created by setting their ``__dict__`` directly,
+    without the generic initialisation machinery.
+    """
+    return (
+        not plan.singleton and
+        not plan.per_resolution and
+        not plan.check_existing and
+        bool(getattr(plan.instance_type, '__dictoffset__', 0)) and
+        not any(attr_kind is _LAZY for _, attr_kind, _, _ in plan.steps)
+    )
+
+
+class _Prototype:
+    """
+    Structure of an instance of a prototype type captured for cloning, see ``AutoInitContext.register_prototype``.
+    """
+
+    __slots__ = ('clone', 'types', 'supported')
+
+    def __init__(self):
+        # Generated function that creates a copy of the captured instance, once captured.
+        self.clone: Optional[Callable] = None
+
+        # Types of the transient instances the clone creates. The clone is only used when none of them
+        # is being initialised, or circular references would be broken differently.
+        self.types: frozenset = frozenset()
+
+        # Cleared if the structure cannot be captured, for example because it involves asynchronous providers.
+        self.supported = True
+
+
+# Source of _Plan.generation.
+_plan_generations = itertools.count(1)
+
+
+def _is_inheritable_plan(generation: int, plan: "_Plan") -> bool:
+    """
+    Plans of the parent that a child context uses if it started registering at ``generation``. Registrations of
+    the child only hide the plans cached before, and plans of singletons are compiled again as ``_PARENT`` plans.
+    """
+    return plan.generation < generation and not plan.singleton
+
+
+def _is_pinned_plan(plan: "_Plan") -> bool:
+    """
+    Plans of singletons are never evicted from a bounded cache: they hold the lock shared by their component.
+    """
+    return plan.singleton
+
+
+class _Plan:
+    """
+    Compiled resolution plan of a requested type.
+    """
+
+    __slots__ = (
+        'instance_type', 'kind', 'provider', 'singleton', 'steps', 'arguments', 'check_existing', 'builder', 'lock',
+        'awaitable', 'may_await', 'cyclic', 'lazy', 'prototype', 'per_resolution', 'generation',
+    )
+
+    def __init__(self, instance_type: Type):
         self.instance_type = instance_type
-        self.instance = instance
-        self.created = created
-        self._initialised = initialised
-        self.dependencies: List[_InitState] = []
 
-    @property
-    def initialised(self):
-        return (
-            self.created and
-            self._initialised and
-            self.has_dependencies_resolved()
-        )
+        # The way an instance is provided, and the value or callable used for that.
+        self.kind: str = None
+        self.provider: Any = None
 
-    def has_dependencies_resolved(self, stack=None):
-        if not self.dependencies:
-            return True
-        if stack:
-            if self in stack:
-                # Circular dependency
-                return True
-        else:
-            stack = []
-        check_stack = stack + [self]
-        for d in self.dependencies:
-            resolved = d.has_dependencies_resolved(stack=check_stack)
-            if not resolved:
-                return False
-        return True
+        self.singleton = False
+
+        # Attribute injection steps, (attr_name, kind, provider, attr_type), compiled with the plan
+        # for composite types and on first use for existing instances of other types.
+        self.steps: List[Tuple[str, str, Any, Type]] = None
+
+        # Required constructor arguments, (attr_name, attr_type).
+        self.arguments: List[Tuple[str, Type]] = None
+
+        self.check_existing = True
+
+        # Generated function that creates a fully initialised instance, if any, see _generate_builder().
+        self.builder: Callable = None
+
+        # Lock under which the singleton is created, assigned on first creation.
+        self.lock: threading.RLock = None
+
+        # Set if the provider is a coroutine function.
+        self.awaitable = False
+
+        # Results of the analysis of the graph of plans reachable from this one, see _analyse_plan_graph().
+        self.may_await: Optional[bool] = None
+        self.cyclic: Optional[bool] = None
+
+        # Set if attributes that require creation of other instances are injected lazily.
+        self.lazy = False
+
+        # Set for types registered with register_prototype() and register_per_resolution().
+        self.prototype: Optional[_Prototype] = None
+        self.per_resolution = False
+
+        # Orders the plans by the time they were cached, see _is_inheritable_plan().
+        self.generation = 0
+
+    def with_steps(self, steps: List[Tuple]) -> "_Plan":
+        plan = copy.copy(self)
+        plan.steps = steps
+        plan.builder = None
+        return plan
+
+    def dependency_types(self) -> List[Type]:
+        """
+        Returns the types that are resolved recursively when following this plan.
+        """
+        if self.kind is _COMPOSITE:
+            nested = [attr_type for _, attr_kind, _, attr_type in self.steps if attr_kind is _NESTED]
+            if self.arguments:
+                return [attr_type for _, attr_type in self.arguments] + nested
+            return nested
+        if self.kind is _CONSTRUCTOR:
+            return [attr_type for _, attr_type in self.arguments]
+        return []
 
     def __repr__(self):
-        return f'<{self.__class__.__name__} {self.instance_type.__name__!r}>'
+        return f'<{self.__class__.__name__} {self.instance_type!r} {self.kind}>'
 
 
-def none_factory():
-    return None
+# Name of the instance attribute holding the _LazyBinding of an instance with lazy attributes.
+_LAZY_BINDING_ATTR = '__auto_init_lazy__'
 
 
-class InstanceType(str):
+class _LazyBinding:
     """
-    Type annotations helper. Represents a type hint as a string.
+    Context and the stack of pending types with which lazy attributes of an instance are resolved.
     """
 
-    def __new__(cls, instance_type):
-        s = super().__new__(cls, instance_type)
-        s._instance_type = instance_type
-        return s
+    __slots__ = ('context', 'pending_types')
 
-    @property
-    def original_type(self) -> Type:
-        return self._instance_type
+    def __init__(self, context: AutoInitContext, pending_types: Tuple[Type, ...]):
+        self.context = context
+        self.pending_types = pending_types
 
-    @property
-    def is_typing(self):
-        return self.startswith('typing.')
 
-    @property
-    def is_forward_ref(self):
-        return self.startswith('ForwardRef(')
+class _LazyAttribute:
+    """
+    Non-data descriptor of lazily injected attributes. On first access, resolves the attribute through
+    the context bound to the instance and stores it in the instance ``__dict__``, which takes precedence from then on.
 
-    @property
-    def is_list(self):
-        return self.startswith('typing.List[') or self == 'typing.List'
+    Descriptors stay on the class for good and are shared by all contexts, since instances bound to a lazy context
+    may be accessed at any time. Other contexts are not affected: without a binding, and on the class itself,
+    the attribute is missing as if there were no descriptor.
+    """
 
-    @property
-    def is_dict(self):
-        return self.startswith('typing.Dict[') or self == 'typing.Dict'
+    __slots__ = ('name',)
 
-    @property
-    def is_classvar(self):
-        return self.startswith('typing.ClassVar[') or self == 'typing.ClassVar'
+    def __init__(self, name: str):
+        self.name = name
 
-    @property
-    def is_tuple(self):
-        return self.startswith('typing.Tuple[') or self == 'typing.Tuple'
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            raise AttributeError(self.name)
+        binding = instance.__dict__.get(_LAZY_BINDING_ATTR)
+        if binding is None:
+            raise AttributeError(self.name)
+        return binding.context._resolve_lazy_attribute(instance, self.name, binding)
 
-    @property
-    def factory(self) -> Type:
-        if self.is_typing:
-            if self.is_list:
-                return list
-            elif self.is_dict:
-                return dict
-            else:
-                return none_factory
-        elif self.is_forward_ref:
-            return none_factory
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.name!r}>'
+
+
+def _install_lazy_attribute(instance_type: Type, attr_name: str) -> bool:
+    """
+    Installs a ``_LazyAttribute`` for ``attr_name`` unless the class already has an attribute of that name.
+    Returns ``True`` if the attribute can be injected lazily.
+    """
+    if not getattr(instance_type, '__dictoffset__', 0):
+        return False
+    for klass in instance_type.__mro__:
+        if attr_name in klass.__dict__:
+            return isinstance(klass.__dict__[attr_name], _LazyAttribute)
+    setattr(instance_type, attr_name, _LazyAttribute(attr_name))
+    return True
+
+
+def _has_plain_class_attribute(instance_type: Type, attr_name: str) -> bool:
+    """
+    Returns ``True`` if ``attr_name`` is a class attribute of ``instance_type`` that is not a descriptor,
+    i.e. an attribute that every instance of the type is guaranteed to have.
+    """
+    for klass in getattr(instance_type, '__mro__', ()):
+        if attr_name in klass.__dict__:
+            return not hasattr(type(klass.__dict__[attr_name]), '__get__')
+    return False
+
+
+class _Resolution:
+    """
+    State of a single top-level resolution. Never shared between threads.
+    Asynchronous resolutions fork it for each concurrent branch, which shares all but the pending types and locks.
+    """
+
+    __slots__ = ('pending_types', 'states', 'singletons', 'created_singletons', 'locks', 'shared')
+
+    def __init__(self, parent: "_Resolution"=None):
+        if parent is None:
+            # Stack of types, instances of which are being initialised.
+            self.pending_types: List[Type] = []
+
+            # Init states created during the resolution that couldn't be decided as soon as their
+            # attributes were set. Once the resolution is over, their initialisation is decided at once.
+            self.states: List[_InitState] = []
+
+            # Singletons created by this resolution but not published to the context yet,
+            # also grouped by the lock under which they were created.
+            self.singletons: Dict[Type, _InitState] = {}
+            self.created_singletons: Dict[Any, List[Tuple[Type, _InitState]]] = {}
+
+            # Singleton locks held by this resolution.
+            self.locks = set()
+
+            # Instances of types registered with register_per_resolution() with their init states,
+            # or the tasks creating them in asynchronous resolutions.
+            self.shared: Dict[Type, Any] = {}
         else:
-            return self._instance_type
+            self.pending_types = list(parent.pending_types)
+            self.states = parent.states
+            self.singletons = parent.singletons
+            self.created_singletons = parent.created_singletons
+            self.locks = set(parent.locks)
+            self.shared = parent.shared
+
+    def fork(self) -> "_Resolution":
+        return _Resolution(self)
 
-    def __call__(self, *args, **kwargs):
+    def add_singleton(self, instance_type: Type, init_state: "_InitState", lock):
+        self.singletons[instance_type] = init_state
+        self.created_singletons.setdefault(lock, []).append((instance_type, init_state))
+
+    def publish(self, singletons: Dict[Type, "_InitState"], lock):
         """
-        Create a new instance of this type.
+        Completes and publishes singletons created under ``lock``.
         """
-        try:
-            return self.factory(*args, **kwargs)
-        except TypeError:
-            raise
+        created = self.created_singletons.pop(lock, ())
+        _complete_init_states([init_state for _, init_state in created])
+        for instance_type, init_state in created:
+            # Only the instance is kept so that the states of the graph it was created with can be released
+            singletons[instance_type] = init_state.released()
+            self.singletons.pop(instance_type, None)
+
+    def discard_singletons(self, lock):
+        for instance_type, _ in self.created_singletons.pop(lock, ()):
+            self.singletons.pop(instance_type, None)
+
+
+class _TopLevelResolution:
+    """
+    Runs a top-level resolution of ``context``, of the current thread unless it is asynchronous.
+    The states of the instances it creates are decided once it succeeds.
+    """
+
+    __slots__ = ('context', 'resolution', 'thread_local', 'outer_resolution')
+
+    def __init__(self, context: "AutoInitContext", pending_types: Iterable[Type] = (), thread_local: bool = True):
+        self.context = context
+        self.resolution = _Resolution()
+        self.resolution.pending_types.extend(pending_types)
+        self.thread_local = thread_local
+
+    def __enter__(self) -> _Resolution:
+        if self.thread_local:
+            self.outer_resolution = self.context._local.resolution
+            self.context._local.resolution = self.resolution
+        return self.resolution
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.thread_local:
+            self.context._local.resolution = self.outer_resolution
+        if exc_type is None:
+            _complete_init_states(self.resolution.states)
+
+
+class _ThreadState(threading.local):
+    resolution: Optional[_Resolution] = None
+
+
+class _InitState:
+    """
+    Represents the initialisation state of an instance of non-primitive type `instance_type`.
+    """
+    __slots__ = ('instance_type', 'instance', 'created', '_initialised', 'initialised', 'dependencies')
+
+    def __init__(self, instance_type: Type, instance: Any, *, created: bool=True, initialised: bool=False):
+        self.instance_type = instance_type
+        self.instance = instance
+        self.created = created
+
+        # Set once all attributes of the instance itself have been set.
+        self._initialised = initialised
+
+        # Set once the whole graph reachable from the instance is initialised. Decided at the end of
+        # the top-level resolution for instances in circular references, see _complete_init_states().
+        self.initialised = initialised
+
+        # Shared empty tuple until the first dependency is added, see add_dependency()
+        self.dependencies: Union[Tuple[()], List[_InitState]] = ()
+
+    def add_dependency(self, dependency: "_InitState"):
+        if self.dependencies:
+            self.dependencies.append(dependency)
+        else:
+            self.dependencies = [dependency]
+
+    def released(self) -> "_InitState":
+        """
+        Returns a copy of a decided state without the dependencies, to be kept once the resolution is over.
+        """
+        return _InitState(self.instance_type, self.instance, created=self.created, initialised=self.initialised)
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.instance_type.__name__!r}>'
+
+
+def _complete_init_states(states: List[_InitState]):
+    """
+    Marks init states as initialised if they and everything reachable from them is initialised, in O(V+E):
+    each circular reference is decided after the components it points to.
+    """
+    def undecided_dependencies(state: _InitState):
+        return [d for d in state.dependencies if d.created and not d.initialised]
+
+    undecided = [state for state in states if not state.initialised]
+    for component in _strongly_connected_components(undecided, undecided_dependencies):
+        member_ids = {id(member) for member in component}
+        initialised = all(
+            member.created and member._initialised and all(
+                id(d) in member_ids or d.initialised for d in member.dependencies
+            )
+            for member in component
+        )
+        for member in component:
+            member.initialised = initialised
+
+
+def _strongly_connected_components(nodes: List[Any], successors: Callable[[Any], List[Any]]) -> List[List[Any]]:
+    """
+    Returns strongly connected components of the graph reachable from ``nodes``, each component after all
+    the components it has edges to. Iterative Tarjan's algorithm, nodes are compared by identity.
+    """
+    index: Dict[int, int] = {}
+    lowlink: Dict[int, int] = {}
+    on_stack = set()
+    stack = []
+    components = []
+
+    for root in nodes:
+        if id(root) in index:
+            continue
+
+        index[id(root)] = lowlink[id(root)] = len(index)
+        stack.append(root)
+        on_stack.add(id(root))
+        work = [(root, iter(successors(root)))]
+
+        while work:
+            node, node_successors = work[-1]
+            for successor in node_successors:
+                if id(successor) not in index:
+                    index[id(successor)] = lowlink[id(successor)] = len(index)
+                    stack.append(successor)
+                    on_stack.add(id(successor))
+                    work.append((successor, iter(successors(successor))))
+                    break
+                elif id(successor) in on_stack:
+                    lowlink[id(node)] = min(lowlink[id(node)], index[id(successor)])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[id(parent)] = min(lowlink[id(parent)], lowlink[id(node)])
+
+                if lowlink[id(node)] == index[id(node)]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(id(member))
+                        component.append(member)
+                        if member is node:
+                            break
+                    components.append(component)
+
+    return components
+
+
+auto_init_context_stack = ContextVar('auto_init_context_stack', default=[AutoInitContext()])
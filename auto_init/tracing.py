@@ -0,0 +1,203 @@
+"""
+Instrumentation of ``AutoInitContext`` resolutions.
+
+Hooks added with ``AutoInitContext.add_hook`` are called with a ``ResolutionEvent`` for every step
+of every resolution. ``ResolutionStats`` and ``ResolutionTree`` are hooks that aggregate the events.
+"""
+import threading
+from typing import Any, Dict, List, Optional, Type
+
+# Resolution of an instance of ``instance_type`` starts.
+RESOLVE_START = 'resolve_start'
+
+# Resolution of an instance of ``instance_type`` ends after ``duration`` seconds.
+RESOLVE_END = 'resolve_end'
+
+# Registered factory of ``instance_type`` has been called, ``duration`` includes its dependencies.
+FACTORY_CALL = 'factory_call'
+
+# Existing singleton instance of ``instance_type`` is provided.
+SINGLETON_HIT = 'singleton_hit'
+
+# Instance of ``instance_type`` is requested while one is being initialised, the attribute is left ``None``.
+CYCLE_BREAK = 'cycle_break'
+
+# Resolution of an instance of ``instance_type`` fails with ``error``.
+FAILURE = 'failure'
+
+# Type hints of ``instance_type`` are looked up, ``cached`` tells whether they were already cached.
+TYPE_HINTS = 'type_hints'
+
+
+class ResolutionEvent:
+    __slots__ = ('name', 'instance_type', 'duration', 'error', 'singleton', 'cached')
+
+    def __init__(
+        self,
+        name: str,
+        instance_type: Type,
+        duration: float = None,
+        error: Exception = None,
+        singleton: bool = False,
+        cached: bool = False,
+    ):
+        self.name = name
+        self.instance_type = instance_type
+        self.duration = duration
+        self.error = error
+        self.singleton = singleton
+        self.cached = cached
+
+    def __repr__(self):
+        return f'<ResolutionEvent {self.name} {self.instance_type!r}>'
+
+
+def _hit_rate(hits: int, misses: int) -> Dict[str, Any]:
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else None}
+
+
+class ResolutionStats:
+    """
+    Hook that keeps per-type counters and timings and the hit rates of the singleton and type hints caches.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._types: Dict[Type, Dict[str, Any]] = {}
+        self._singleton_hits = 0
+        self._singleton_misses = 0
+        self._type_hints_hits = 0
+        self._type_hints_misses = 0
+
+    def _type_stats(self, instance_type: Type) -> Dict[str, Any]:
+        stats = self._types.get(instance_type)
+        if stats is None:
+            stats = self._types[instance_type] = {
+                'resolved': 0,
+                'total_time': 0.0,
+                'max_time': 0.0,
+                'singleton_hits': 0,
+                'factory_calls': 0,
+                'cycle_breaks': 0,
+                'failures': 0,
+            }
+        return stats
+
+    def __call__(self, event: ResolutionEvent):
+        name = event.name
+        if name == RESOLVE_START:
+            return
+        with self._lock:
+            if name == TYPE_HINTS:
+                if event.cached:
+                    self._type_hints_hits += 1
+                else:
+                    self._type_hints_misses += 1
+                return
+
+            stats = self._type_stats(event.instance_type)
+            if name == RESOLVE_END:
+                stats['resolved'] += 1
+                stats['total_time'] += event.duration
+                stats['max_time'] = max(stats['max_time'], event.duration)
+                if event.singleton:
+                    self._singleton_misses += 1
+            elif name == SINGLETON_HIT:
+                stats['singleton_hits'] += 1
+                self._singleton_hits += 1
+            elif name == FACTORY_CALL:
+                stats['factory_calls'] += 1
+            elif name == CYCLE_BREAK:
+                stats['cycle_breaks'] += 1
+            elif name == FAILURE:
+                stats['failures'] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'types': {t: dict(stats) for t, stats in self._types.items()},
+                'singletons': _hit_rate(self._singleton_hits, self._singleton_misses),
+                'type_hints': _hit_rate(self._type_hints_hits, self._type_hints_misses),
+            }
+
+
+def _type_name(instance_type: Type) -> str:
+    return getattr(instance_type, '__qualname__', None) or repr(instance_type)
+
+
+class ResolutionNode:
+    __slots__ = ('instance_type', 'event', 'duration', 'error', 'children')
+
+    def __init__(self, instance_type: Type, event: str):
+        self.instance_type = instance_type
+
+        # RESOLVE_START for resolved instances, SINGLETON_HIT or CYCLE_BREAK for leaves
+        self.event = event
+
+        self.duration: Optional[float] = None
+        self.error: Optional[Exception] = None
+        self.children: List[ResolutionNode] = []
+
+    @property
+    def self_time(self) -> float:
+        return max(0.0, (self.duration or 0.0) - sum(c.duration or 0.0 for c in self.children))
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = {'type': _type_name(self.instance_type), 'event': self.event, 'duration': self.duration}
+        if self.error is not None:
+            d['error'] = repr(self.error)
+        if self.children:
+            d['children'] = [c.to_dict() for c in self.children]
+        return d
+
+
+class ResolutionTree:
+    """
+    Hook that records the tree of resolutions done by the thread that created it,
+    see ``AutoInitContext.record_tree``.
+    Concurrent branches of asynchronous resolutions may be attributed to the wrong parent.
+    """
+
+    def __init__(self):
+        self.roots: List[ResolutionNode] = []
+        self._stack: List[ResolutionNode] = []
+        self._thread = threading.get_ident()
+
+    def __call__(self, event: ResolutionEvent):
+        if threading.get_ident() != self._thread or event.name == TYPE_HINTS or event.name == FACTORY_CALL:
+            return
+        if event.name == RESOLVE_END or event.name == FAILURE:
+            # The innermost pending node of the type, concurrent asynchronous branches do not end in order.
+            for i in range(len(self._stack) - 1, -1, -1):
+                if self._stack[i].instance_type == event.instance_type:
+                    node = self._stack.pop(i)
+                    node.duration = event.duration
+                    node.error = event.error
+                    return
+            return
+
+        node = ResolutionNode(event.instance_type, event.name)
+        (self._stack[-1].children if self._stack else self.roots).append(node)
+        if event.name == RESOLVE_START:
+            self._stack.append(node)
+
+    def to_dict(self) -> List[Dict[str, Any]]:
+        return [root.to_dict() for root in self.roots]
+
+    def folded(self) -> str:
+        """
+        Returns the tree in the folded stacks format of flame graph tools: one line per path
+        with the self time in microseconds.
+        """
+        lines = []
+
+        def fold(node: ResolutionNode, path: str):
+            path = f'{path};{_type_name(node.instance_type)}' if path else _type_name(node.instance_type)
+            lines.append(f'{path} {round(node.self_time * 1e6)}')
+            for child in node.children:
+                fold(child, path)
+
+        for root in self.roots:
+            fold(root, '')
+        return '\n'.join(lines)
@@ -0,0 +1,288 @@
+"""
+Classification of type annotations, memoised for the whole process, see ``classify_type``.
+"""
+import dataclasses
+import inspect
+import threading
+import weakref
+from types import FunctionType
+from typing import Any, Callable, ClassVar, Dict, List, Optional, Tuple, Type, Union, get_type_hints
+
+from .compat import ForwardRef, UnionType, get_args, get_origin
+from .exceptions import CreationFailed
+from .hints_cache import active_hints_cache
+
+# Marks a missing value where None is a valid value.
+_NOTHING = object()
+
+
+def none_factory():
+    return None
+
+
+class TypeInfo:
+    """
+    Classification of a type annotation.
+    """
+
+    __slots__ = (
+        'annotation', 'key', 'origin', 'args', 'hints_type', 'factory', 'hints', 'arguments', 'anchor', '__weakref__',
+        'is_typing', 'is_forward_ref', 'is_list', 'is_dict', 'is_tuple', 'is_classvar', 'is_union', 'is_optional',
+    )
+
+    def __init__(self, annotation, key):
+        self.annotation = annotation
+
+        # Normalised annotation under which the type is stored in the registries, the same object for equal annotations.
+        self.key = key
+
+        self.origin = get_origin(annotation)
+        self.args = get_args(annotation)
+
+        # Class whose type hints describe the attributes of instances, None for annotations that aren't classes.
+        self.hints_type = None
+
+        # Creates a new instance when nothing is registered for the type.
+        self.factory: Callable = none_factory
+
+        # Evaluated type hints and required constructor arguments of hints_type, cached for the whole process.
+        self.hints: Optional[Dict[str, Type]] = None
+        self.arguments: Optional[List[Tuple[str, Type]]] = _NOTHING
+
+        # For annotations that aren't classes, a class they refer to on which the classification and registry
+        # entries of the annotation are stored, so that they don't keep the class alive.
+        self.anchor: Optional[type] = None
+
+        self.is_typing = True
+        self.is_forward_ref = isinstance(annotation, (str, ForwardRef))
+        self.is_list = self.origin is list
+        self.is_dict = self.origin is dict
+        self.is_tuple = self.origin is tuple
+        self.is_classvar = self.origin is ClassVar
+        self.is_union = self.origin is Union or self.origin is UnionType
+        self.is_optional = self.is_union and type(None) in self.args
+
+        if self.is_list:
+            self.factory = list
+        elif self.is_dict:
+            self.factory = dict
+        elif self.origin is None:
+            if isinstance(annotation, type) and annotation.__module__ != 'typing':
+                self.is_typing = False
+                self.hints_type = annotation
+                self.factory = annotation
+        elif self.is_union or self.is_classvar:
+            # The origin of PEP 604 unions is types.UnionType, a class, but they are not generic classes
+            pass
+        elif isinstance(self.origin, type) and self.origin.__module__ not in _NON_INJECTABLE_GENERIC_MODULES:
+            # Parametrised user-defined generic class
+            self.is_typing = False
+            self.hints_type = self.origin
+            self.factory = annotation
+
+    def type_hints(self) -> Dict[str, Type]:
+        """
+        Returns the evaluated type hints of ``hints_type``, shared by all contexts and not to be modified.
+        Failures such as unresolved forward references are not cached, the class may be resolvable later.
+        """
+        hints = self.hints
+        if hints is None:
+            if self.hints_type is None:
+                # Do not attempt to get type hints from typing.* classes because it doesn't work in Python 3.7
+                # and we are not expecting anything useful anyway.
+                hints = {}
+            elif self.hints_type is not self.annotation:
+                hints = classify_type(self.hints_type).type_hints()
+            else:
+                hints = _evaluate_type_hints(self.hints_type)
+            self.hints = hints
+        return hints
+
+    def constructor_arguments(self) -> Optional[List[Tuple[str, Type]]]:
+        """
+        Returns ``(name, type)`` of the required parameters of the constructor of ``hints_type``, or ``None``
+        if it cannot be called with injected keyword arguments. Shared by all contexts and not to be modified.
+        """
+        arguments = self.arguments
+        if arguments is _NOTHING:
+            if self.hints_type is None:
+                arguments = []
+            elif self.hints_type is not self.annotation:
+                arguments = classify_type(self.hints_type).constructor_arguments()
+            else:
+                arguments = _inspect_constructor(self.hints_type, self.type_hints())
+            self.arguments = arguments
+        return arguments
+
+    def __repr__(self):
+        return f'<{self.__class__.__name__} {self.annotation!r}>'
+
+
+def _inspect_constructor(cls: Type, class_hints: Dict[str, Type]) -> Optional[List[Tuple[str, Type]]]:
+    try:
+        signature = inspect.signature(cls)
+    except (TypeError, ValueError):
+        # Builtin or extension types without a signature
+        return []
+
+    # Generated constructors of dataclasses and named tuples are described by the hints of the class
+    init = getattr(cls, '__init__', None)
+    if isinstance(init, FunctionType) and not dataclasses.is_dataclass(cls) and not _is_named_tuple(cls):
+        init_annotations = getattr(init, '__annotations__', {})
+    else:
+        init_annotations = {}
+
+    arguments = []
+    for parameter in signature.parameters.values():
+        if parameter.default is not inspect.Parameter.empty:
+            continue
+        if parameter.kind in (inspect.Parameter.VAR_POSITIONAL, inspect.Parameter.VAR_KEYWORD):
+            continue
+        if parameter.kind is inspect.Parameter.POSITIONAL_ONLY:
+            return None
+        attr_type = None
+        if parameter.name in init_annotations:
+            try:
+                attr_type = _evaluate_parameter_hint(init, parameter.name)
+            except Exception as e:
+                if parameter.name not in class_hints:
+                    raise CreationFailed(
+                        f"Type of constructor argument {parameter.name} of {cls} cannot be evaluated: {e!r}"
+                    ) from e
+        if attr_type is None:
+            attr_type = class_hints.get(parameter.name)
+        if attr_type is None:
+            return None
+        arguments.append((parameter.name, attr_type))
+    return arguments
+
+
+def _evaluate_parameter_hint(function: FunctionType, name: str) -> Type:
+    """
+    Evaluates the annotation of a single parameter of ``function``. The annotations of the other parameters
+    may refer to names that only exist for type checkers, such as the types of optional parameters.
+    """
+    annotated = FunctionType(_evaluate_parameter_hint.__code__, function.__globals__)
+    annotated.__annotations__ = {name: function.__annotations__[name]}
+    return get_type_hints(annotated)[name]
+
+
+def _is_named_tuple(instance_type: Type) -> bool:
+    return isinstance(instance_type, type) and issubclass(instance_type, tuple) and hasattr(instance_type, '_fields')
+
+
+def _evaluate_type_hints(cls: Type) -> Dict[str, Type]:
+    """
+    Evaluates the type hints of the class, or looks them up in the persistent cache if one is enabled,
+    see ``auto_init.hints_cache``.
+    """
+    cache = active_hints_cache()
+    if cache is None:
+        return dict(get_type_hints(cls))
+    hints = cache.get(cls)
+    if hints is None:
+        hints = dict(get_type_hints(cls))
+        cache.put(cls, hints)
+    return hints
+
+
+# Modules of generic origins which are not created by auto-init unless they are lists or dictionaries.
+_NON_INJECTABLE_GENERIC_MODULES = ('builtins', 'typing', 'collections.abc', '_collections_abc')
+
+
+class _AnnotationMemo:
+    """
+    Classifications of annotations that aren't classes, memoised by the id of the annotation object,
+    and their canonical annotation objects, so that registries are keyed by a single object per distinct annotation.
+    Each TypeInfo keeps its annotation alive so the id cannot be reused by another object.
+    """
+
+    __slots__ = ('type_infos', 'canonical')
+
+    def __init__(self):
+        self.type_infos: Dict[int, TypeInfo] = {}
+        self.canonical: Dict[Any, Any] = {}
+
+
+# Attribute of classes under which their classification is stored.
+# Classifications of classes are stored on the classes themselves, so that they don't keep
+# dynamically created classes alive.
+_TYPE_INFO_ATTR = '__auto_init_type_info__'
+
+# Attribute of classes under which the memo of the annotations anchored on them is stored, see ``TypeInfo.anchor``.
+_ANNOTATION_MEMO_ATTR = '__auto_init_annotations__'
+
+# Memo of the annotations that refer to no class able to hold attributes, such as ``List[int]``.
+_annotation_memo = _AnnotationMemo()
+
+# All classifications of annotations that aren't classes by the id of the annotation object, for fast lookup.
+# The memos above keep them alive.
+_type_infos: "weakref.WeakValueDictionary[int, TypeInfo]" = weakref.WeakValueDictionary()
+
+# Guards creation of the memo of a class.
+_annotation_memo_lock = threading.Lock()
+
+
+def _find_anchor(annotation) -> Optional[type]:
+    """
+    Returns the last class, in the order of the arguments, an annotation refers to that can hold attributes.
+    """
+    anchor = None
+    stack = [annotation]
+    while stack:
+        arg = stack.pop()
+        origin = get_origin(arg)
+        if origin is not None:
+            stack.extend(reversed(get_args(arg)))
+            stack.append(origin)
+        elif isinstance(arg, (list, tuple)):
+            # Arguments of Callable
+            stack.extend(reversed(arg))
+        elif isinstance(arg, type) and classify_type(arg) is arg.__dict__.get(_TYPE_INFO_ATTR):
+            anchor = arg
+    return anchor
+
+
+def _anchored_memo(anchor: Optional[type]) -> _AnnotationMemo:
+    if anchor is None:
+        return _annotation_memo
+    memo = anchor.__dict__.get(_ANNOTATION_MEMO_ATTR)
+    if memo is None:
+        with _annotation_memo_lock:
+            memo = anchor.__dict__.get(_ANNOTATION_MEMO_ATTR)
+            if memo is None:
+                memo = _AnnotationMemo()
+                setattr(anchor, _ANNOTATION_MEMO_ATTR, memo)
+    return memo
+
+
+def classify_type(annotation) -> TypeInfo:
+    """
+    Returns the memoised classification of the annotation.
+    """
+    if isinstance(annotation, type):
+        type_info = annotation.__dict__.get(_TYPE_INFO_ATTR)
+        if type_info is not None:
+            return type_info
+        type_info = TypeInfo(annotation, annotation)
+        try:
+            setattr(annotation, _TYPE_INFO_ATTR, type_info)
+            return type_info
+        except (TypeError, AttributeError):
+            # Builtin and extension types
+            pass
+
+    type_info = _type_infos.get(id(annotation))
+    if type_info is None:
+        anchor = None if isinstance(annotation, type) else _find_anchor(annotation)
+        memo = _anchored_memo(anchor)
+        try:
+            key = memo.canonical.setdefault(annotation, annotation)
+        except TypeError:
+            # Unhashable annotation
+            key = annotation
+        type_info = TypeInfo(annotation, key)
+        type_info.anchor = anchor
+        type_info = memo.type_infos.setdefault(id(annotation), type_info)
+        _type_infos[id(annotation)] = type_info
+    return type_info
@@ -0,0 +1,82 @@
+"""
+Evaluation of type hints in a fresh process with and without the persistent hints cache,
+see ``auto_init.hints_cache``.
+
+A module of ``count`` classes with postponed annotations is generated in a temporary directory.
+Each measurement runs in a new interpreter which imports the module and compiles the plans of all classes.
+
+Run with::
+
+    python -m benchmarks.bench_hints_cache [--count N]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+MODULE_HEADER = '''
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+'''
+
+CLASS_TEMPLATE = '''
+
+class Model{i}:
+    previous: Model{previous}
+    names: List[str]
+    counts: Dict[str, int]
+    parent: Optional[Model{previous}]
+'''
+
+RUNNER = '''
+import sys
+import time
+
+from auto_init import AutoInitContext
+from auto_init.hints_cache import enable_hints_cache
+
+import bench_hints_models as models
+
+if sys.argv[1] != '-':
+    enable_hints_cache(sys.argv[1])
+classes = [getattr(models, f'Model{{i}}') for i in range({count})]
+started = time.perf_counter()
+AutoInitContext().compile(classes)
+print(time.perf_counter() - started)
+'''
+
+
+def _run(directory: str, count: int, cache_path: str) -> float:
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([directory, os.getcwd()]))
+    output = subprocess.run(
+        [sys.executable, '-c', RUNNER.format(count=count), cache_path],
+        env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return float(output)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, 'bench_hints_models.py'), 'w') as f:
+            f.write(MODULE_HEADER)
+            for i in range(args.count):
+                f.write(CLASS_TEMPLATE.format(i=i, previous=max(0, i - 1)))
+        cache_path = os.path.join(directory, 'hints.json')
+
+        evaluated = _run(directory, args.count, '-')
+        populated = _run(directory, args.count, cache_path)
+        cached = _run(directory, args.count, cache_path)
+
+    print(f'{"no cache":>16} {evaluated * 1e3:>8.1f} ms')
+    print(f'{"populating":>16} {populated * 1e3:>8.1f} ms')
+    print(f'{"cached":>16} {cached * 1e3:>8.1f} ms {evaluated / cached:>6.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Scaling of the initialisation bookkeeping with the size of the object graph.
+
+Every type in the generated graph is a singleton that depends on the next ``fan_out`` types
+and on the first type of the graph, so the graph has many shared nodes and one big cycle.
+The time per node should stay flat as the graph grows.
+
+Run with::
+
+    python -m benchmarks.bench_init_state
+"""
+import sys
+import time
+
+from auto_init import AutoInitContext
+
+
+def generate_singleton_graph(size: int, fan_out: int = 3):
+    types = [type(f'Node{i}', (), {}) for i in range(size)]
+    for i, t in enumerate(types):
+        t.__annotations__ = {
+            f'dep{j}': types[i + j] for j in range(1, fan_out + 1) if i + j < size
+        }
+        t.__annotations__['root'] = types[0]
+    return types
+
+
+def measure(size: int, fan_out: int = 3) -> float:
+    types = generate_singleton_graph(size, fan_out)
+    ctx = AutoInitContext()
+    for t in types:
+        ctx.register_singleton(t)
+
+    started = time.perf_counter()
+    ctx.get_instance(types[0])
+    return time.perf_counter() - started
+
+
+def main(sizes=(10, 100, 1000, 5000)):
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20 * max(sizes)))
+    print(f'{"types":>8} {"total ms":>10} {"us per type":>12}')
+    for size in sizes:
+        elapsed = measure(size)
+        print(f'{size:>8} {elapsed * 1000:>10.2f} {elapsed / size * 1e6:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
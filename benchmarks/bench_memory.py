@@ -0,0 +1,104 @@
+"""
+Memory that auto_init keeps alive per created instance once the resolutions are over.
+
+The memory retained by instances created by the context is compared with the memory retained by the
+same instances created by hand. Plans and type hints are compiled before measuring, so the difference
+is the bookkeeping left behind per instance.
+
+Run with::
+
+    python -m benchmarks.bench_memory [--count N]
+"""
+import argparse
+import gc
+import sys
+import tracemalloc
+
+from auto_init import AutoInitContext
+
+from .bench_init_state import generate_singleton_graph
+
+
+class Leaf:
+    value: int
+
+
+class Branch:
+    left: Leaf
+    right: Leaf
+
+
+class Tree:
+    branch: Branch
+    leaf: Leaf
+
+
+def _retained(func) -> int:
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current
+
+
+def _build_tree() -> Tree:
+    def leaf():
+        instance = Leaf()
+        instance.value = 0
+        return instance
+
+    branch = Branch()
+    branch.left = leaf()
+    branch.right = leaf()
+    tree = Tree()
+    tree.branch = branch
+    tree.leaf = leaf()
+    return tree
+
+
+def transient_overhead(count: int) -> float:
+    """
+    Bytes retained per transient instance beyond the instance itself.
+    """
+    ctx = AutoInitContext()
+    ctx.get_instance(Tree)
+    by_context = _retained(lambda: [ctx.get_instance(Tree) for _ in range(count)])
+    by_hand = _retained(lambda: [_build_tree() for _ in range(count)])
+    return (by_context - by_hand) / (count * 5)
+
+
+def singleton_overhead(count: int) -> float:
+    """
+    Bytes retained per singleton beyond the instance itself, in a graph of ``count`` singletons.
+    """
+    types = generate_singleton_graph(count)
+    ctx = AutoInitContext()
+    for t in types:
+        ctx.register_singleton(t)
+    ctx.compile([types[0]])
+
+    def by_hand():
+        instances = {t: t() for t in types}
+        for t, instance in instances.items():
+            for name, dep in t.__annotations__.items():
+                setattr(instance, name, instances[dep])
+        return instances
+
+    by_context = _retained(lambda: ctx.get_instance(types[0]))
+    return (by_context - _retained(by_hand)) / count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=10000)
+    args = parser.parse_args()
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 20 * args.count))
+    print(f'transient: {transient_overhead(args.count):>8.1f} bytes per instance')
+    print(f'singleton: {singleton_overhead(args.count):>8.1f} bytes per instance')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Overriding the registration of one type in a context with warm plans, with incremental invalidation
+through the reverse-dependency index compared with clearing all plans.
+
+The graph has ``depth`` layers of ``width`` types. The overridden type is taken from layer ``--layer``:
+only its plan and the plans of the types that refer to it, directly or transitively, are compiled again.
+Only plans are compiled, no instances are created: the graph of plain types is a tree of exponential size.
+
+Run with::
+
+    python -m benchmarks.bench_override [--width N] [--depth N] [--fan-out N] [--layer N] [--repeat N]
+"""
+import argparse
+import time
+
+from auto_init import AutoInitContext
+
+from .graphs import generate_graph
+
+
+def clear_plans(ctx: AutoInitContext):
+    """
+    Drops all plans and the reverse-dependency index, as contexts did before incremental invalidation.
+    """
+    with ctx._index_lock:
+        ctx._plans.clear()
+        ctx._dependents.clear()
+
+
+def measure(ctx: AutoInitContext, types: list, overridden, incremental: bool, repeat: int) -> float:
+    """
+    Returns the mean time to override the registration and get the plans of all ``types`` again.
+    """
+    total = 0.0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        ctx.register_factory(overridden, overridden, override=True)
+        if not incremental:
+            clear_plans(ctx)
+        for t in types:
+            ctx._get_plan(t)
+        total += time.perf_counter() - started
+    return total / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--width', type=int, default=100)
+    parser.add_argument('--depth', type=int, default=30)
+    parser.add_argument('--fan-out', type=int, default=2)
+    parser.add_argument('--layer', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    graph = generate_graph(width=args.width, depth=args.depth, fan_out=args.fan_out)
+    ctx = graph.register(AutoInitContext())
+    ctx.compile([graph.root])
+    types = list(ctx._plans)
+    overridden = next(t for t in graph.layers[args.layer] if t in ctx._plans)
+    ctx.register_factory(overridden, overridden, override=True)
+    evicted = len(types) - ctx.cache_sizes()['plans']
+
+    incremental = measure(ctx, types, overridden, True, args.repeat)
+    full = measure(ctx, types, overridden, False, args.repeat)
+
+    print(f'{graph.size} types, {len(types)} plans, {evicted} evicted by the override')
+    print(f'{"clear all plans":>16} {full * 1e3:>8.2f} ms')
+    print(f'{"incremental":>16} {incremental * 1e3:>8.2f} ms {full / incremental:>6.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Creation of transient instances cloned from a prototype compared with ``get_instance``
+with and without generated builders.
+
+Each request is a tree of transient instances that share a few singletons.
+
+Run with::
+
+    python -m benchmarks.bench_prototype [--count N]
+"""
+import argparse
+import time
+from typing import Dict, List
+
+from auto_init import AutoInitContext
+
+
+class Config:
+    retries: int
+    timeout: float
+
+
+class Connection:
+    config: Config
+
+
+class Cache:
+    entries: Dict[str, str]
+
+
+class Repository:
+    connection: Connection
+    cache: Cache
+
+
+class Validator:
+    config: Config
+    errors: List[str]
+
+
+class Service:
+    repository: Repository
+    validator: Validator
+    config: Config
+
+
+class Request:
+    service: Service
+    audit: Repository
+    headers: Dict[str, str]
+    path: str
+
+
+def make_context(prototype: bool = False, codegen: bool = False) -> AutoInitContext:
+    ctx = AutoInitContext(codegen=codegen)
+    ctx.register_singleton(Config)
+    ctx.register_singleton(Connection)
+    if prototype:
+        ctx.register_prototype(Request)
+    ctx.get_instance(Request)
+    return ctx
+
+
+def measure(ctx: AutoInitContext, count: int) -> float:
+    started = time.perf_counter()
+    for _ in range(count):
+        ctx.get_instance(Request)
+    return (time.perf_counter() - started) / count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=20000)
+    args = parser.parse_args()
+
+    baseline = measure(make_context(), args.count)
+    print(f'{"get_instance":>24} {baseline * 1e6:>8.2f} us')
+    for name, ctx in (
+        ('codegen', make_context(codegen=True)),
+        ('prototype', make_context(prototype=True)),
+    ):
+        elapsed = measure(ctx, args.count)
+        print(f'{name:>24} {elapsed * 1e6:>8.2f} us {baseline / elapsed:>6.1f}x')
+
+
+if __name__ == '__main__':
+    main()
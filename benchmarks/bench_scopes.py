@@ -0,0 +1,66 @@
+"""
+Per-request child contexts that register an instance, compared with ``get_instance`` on the parent.
+
+The parent has the warm plans of a graph of ``depth`` layers of ``width`` types. Each request creates
+a child context, registers the current user in it and resolves a handler that refers to the user.
+The child falls back to the registries and plans of the parent, so the cost of a request does not
+grow with the number of plans of the parent.
+
+Run with::
+
+    python -m benchmarks.bench_scopes [--width N] [--depth N] [--count N]
+"""
+import argparse
+import time
+
+from auto_init import AutoInitContext
+
+from .graphs import generate_graph
+
+
+class User:
+    pass
+
+
+def make_handler(service: type) -> type:
+    return type('Handler', (), {'__annotations__': {'user': User, 'service': service}})
+
+
+def measure(request, count: int) -> float:
+    """
+    Returns the mean time of a request.
+    """
+    started = time.perf_counter()
+    for _ in range(count):
+        request()
+    return (time.perf_counter() - started) / count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--width', type=int, default=200)
+    parser.add_argument('--depth', type=int, default=30)
+    parser.add_argument('--count', type=int, default=10000)
+    args = parser.parse_args()
+
+    graph = generate_graph(width=args.width, depth=args.depth)
+    ctx = graph.register(AutoInitContext())
+    ctx.compile([graph.root])
+    handler = make_handler(graph.layers[-1][0])
+    ctx.get_instance(handler)
+
+    def scoped():
+        with ctx.child() as scope:
+            scope.register_instance(User())
+            scope.get_instance(handler)
+
+    plain = measure(lambda: ctx.get_instance(handler), args.count)
+    child = measure(scoped, args.count)
+
+    print(f'{graph.size} types, {ctx.cache_sizes()["plans"]} plans')
+    print(f'{"get_instance":>12} {plain * 1e6:>8.2f} us')
+    print(f'{"child scope":>12} {child * 1e6:>8.2f} us {child / plain:>6.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""
+Benchmark suite over synthetic class graphs, see ``benchmarks/graphs.py``.
+
+For each scenario and graph size it measures:
+
+* ``cold_ms`` -- first ``get_instance`` of the root on a fresh context, including compilation of all plans;
+* ``get_us`` -- median latency of a warm ``get_instance`` of the root;
+* ``init_us`` -- median latency of ``init_instance`` of a fresh root instance;
+* ``throughput`` -- instances of the root created per second;
+* ``peak_kb`` -- peak memory allocated by the cold ``get_instance``, measured with ``tracemalloc``.
+
+Graph sizes go from 10 to 10k types so that superlinear behaviour shows up as growing time per type
+(for ``cold_ms``) or per created instance (for the others, as circular references make the number of transient
+instances grow faster than the number of types).
+
+Run with::
+
+    python -m benchmarks.bench_suite [--sizes 10 100 1000 10000] [--save results.json]
+
+As a regression gate::
+
+    python -m benchmarks.bench_suite --compare results.json [--tolerance 1.5] [--max-scaling 4]
+
+exits with status 1 if any time metric is slower than ``tolerance`` times the saved result,
+or if the time per type or instance of the largest graph is more than ``max-scaling`` times that of the smallest.
+"""
+import argparse
+import gc
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+
+from auto_init import AutoInitContext
+
+from .graphs import generate_graph
+
+# Graph generator arguments of each scenario, graphs of a given size have ``size // depth`` types per layer.
+SCENARIOS = {
+    'transient': dict(depth=5, fan_out=2, mix={'plain': 1.0}),
+    'mixed': dict(depth=5, fan_out=2),
+    'cyclic': dict(depth=5, fan_out=2, cycle_density=0.2),
+    'singletons': dict(depth=5, fan_out=3, cycle_density=0.2, mix={'singleton': 1.0}),
+}
+
+TIME_METRICS = ('cold_ms', 'get_us', 'init_us')
+
+# What the time metrics are divided by to check the scaling.
+SCALING_UNITS = {'cold_ms': 'types', 'get_us': 'instances', 'init_us': 'instances'}
+
+
+def count_instances(root) -> int:
+    """
+    Counts the distinct objects reachable from ``root`` through instance attributes.
+    """
+    seen = {id(root)}
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        for value in getattr(obj, '__dict__', {}).values():
+            if value is not None and id(value) not in seen:
+                seen.add(id(value))
+                stack.append(value)
+    return len(seen)
+
+
+def _median_time(func, repeat: int) -> float:
+    func()
+    gc.collect()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def measure(scenario: str, size: int, repeat: int = 7) -> dict:
+    """
+    Measures one scenario and graph size. Like ``timeit``, the garbage collector is disabled while timing
+    as its cost depends on everything else alive in the process.
+    """
+    options = dict(SCENARIOS[scenario])
+    depth = options.pop('depth')
+    graph = generate_graph(width=max(1, size // depth), depth=depth, **options)
+
+    gc.collect()
+    gc.disable()
+    try:
+        return _measure(graph, repeat)
+    finally:
+        gc.enable()
+
+
+def _measure(graph, repeat: int) -> dict:
+    # Memory is measured on a separate context because tracing slows down allocations
+    tracemalloc.start()
+    graph.register(AutoInitContext()).get_instance(graph.root)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    ctx = graph.register(AutoInitContext())
+    started = time.perf_counter()
+    root = ctx.get_instance(graph.root)
+    cold = time.perf_counter() - started
+
+    get = _median_time(lambda: ctx.get_instance(graph.root), repeat)
+    init = _median_time(lambda: ctx.init_instance(graph.root()), repeat)
+
+    count = 0
+    started = time.perf_counter()
+    deadline = started + max(0.1, get * repeat)
+    while time.perf_counter() < deadline:
+        ctx.get_instance(graph.root)
+        count += 1
+    throughput = count / (time.perf_counter() - started)
+
+    return {
+        'types': graph.size,
+        'instances': count_instances(root),
+        'cold_ms': cold * 1e3,
+        'get_us': get * 1e6,
+        'init_us': init * 1e6,
+        'throughput': throughput,
+        'peak_kb': peak / 1024,
+    }
+
+
+def run(scenarios, sizes, repeat: int = 7) -> dict:
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 100 * max(sizes)))
+    results = {}
+    print(f'{"scenario":>12} {"types":>7} {"objects":>8} {"cold ms":>10} {"get us":>12} {"init us":>12} '
+          f'{"per sec":>10} {"peak kB":>10}')
+    for scenario in scenarios:
+        results[scenario] = {}
+        for size in sizes:
+            r = measure(scenario, size, repeat)
+            results[scenario][str(size)] = r
+            print(f'{scenario:>12} {r["types"]:>7} {r["instances"]:>8} {r["cold_ms"]:>10.2f} '
+                  f'{r["get_us"]:>12.1f} {r["init_us"]:>12.1f} {r["throughput"]:>10.1f} {r["peak_kb"]:>10.1f}')
+    return results
+
+
+def check_scaling(results: dict, max_scaling: float) -> list:
+    """
+    Returns failures for scenarios where the time per type or instance grows by more than ``max_scaling``
+    from the smallest to the largest graph.
+    """
+    failures = []
+    for scenario, by_size in results.items():
+        sizes = sorted(by_size, key=int)
+        smallest, largest = by_size[sizes[0]], by_size[sizes[-1]]
+        for metric in TIME_METRICS:
+            unit = SCALING_UNITS[metric]
+            ratio = (largest[metric] / largest[unit]) / (smallest[metric] / smallest[unit])
+            if ratio > max_scaling:
+                failures.append(f'{scenario} {metric}: time per {unit[:-1]} grows {ratio:.1f}x from '
+                                f'{smallest["types"]} to {largest["types"]} types')
+    return failures
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Returns failures for time metrics slower than ``tolerance`` times the baseline.
+    """
+    failures = []
+    for scenario, by_size in results.items():
+        for size, r in by_size.items():
+            base = baseline.get(scenario, {}).get(size)
+            if base is None:
+                continue
+            for metric in TIME_METRICS:
+                if r[metric] > base[metric] * tolerance:
+                    failures.append(f'{scenario} {size} {metric}: {r[metric]:.1f} vs baseline {base[metric]:.1f}')
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenarios', nargs='+', default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=[10, 100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--save', help='save the results to a JSON file')
+    parser.add_argument('--compare', help='compare the results with a JSON file saved earlier')
+    parser.add_argument('--tolerance', type=float, default=1.5)
+    parser.add_argument('--max-scaling', type=float, default=4.0)
+    args = parser.parse_args(argv)
+
+    results = run(args.scenarios, args.sizes, args.repeat)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    failures = check_scaling(results, args.max_scaling) if len(args.sizes) > 1 else []
+    if args.compare:
+        with open(args.compare) as f:
+            failures += compare(results, json.load(f), args.tolerance)
+
+    for failure in failures:
+        print(f'FAIL {failure}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Throughput of ``get_instance`` on a context shared by several threads.
+
+Each request builds a small service graph with a transient repository and a shared connection
+singleton. With ``--io-latency`` the repository factory sleeps to simulate I/O, in which case
+throughput should scale with the number of threads. Without it the work is CPU bound
+and scaling is limited by the GIL.
+
+Run with::
+
+    python -m benchmarks.bench_threads [--io-latency SECONDS] [--duration SECONDS]
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from auto_init import AutoInitContext
+
+
+class Connection:
+    pass
+
+
+class Config:
+    retries: int
+    timeout: float
+
+
+class Repository:
+    connection: Connection
+    config: Config
+
+
+class Service:
+    repository: Repository
+    config: Config
+    name: str
+
+
+def create_context(io_latency: float) -> AutoInitContext:
+    ctx = AutoInitContext()
+    ctx.register_singleton(Connection)
+
+    if io_latency:
+        def repository_factory():
+            time.sleep(io_latency)
+            return Repository()
+        ctx.register_factory(Repository, repository_factory)
+
+    return ctx
+
+
+def measure(threads: int, duration: float, io_latency: float) -> float:
+    ctx = create_context(io_latency)
+    deadline = time.perf_counter() + duration
+    barrier = threading.Barrier(threads)
+
+    def worker():
+        barrier.wait()
+        count = 0
+        while time.perf_counter() < deadline:
+            ctx.get_instance(Service)
+            count += 1
+        return count
+
+    with ThreadPoolExecutor(threads) as executor:
+        futures = [executor.submit(worker) for _ in range(threads)]
+        return sum(f.result() for f in futures) / duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--io-latency', type=float, default=0.001)
+    parser.add_argument('--duration', type=float, default=1.0)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    print(f'{"threads":>8} {"ops/s":>12} {"speed-up":>9}')
+    baseline = None
+    for threads in args.threads:
+        throughput = measure(threads, args.duration, args.io_latency)
+        baseline = baseline or throughput
+        print(f'{threads:>8} {throughput:>12.0f} {throughput / baseline:>9.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Creation of singletons with slow factories by ``warm_up`` with an executor compared with ``get_instance``.
+
+The singletons form ``depth`` layers of ``width`` types, each depending on two types of the next layer,
+and each takes ``delay`` seconds to create. Created one after another they take
+``width * depth * delay`` seconds, level by level ``depth * delay`` seconds.
+
+Run with::
+
+    python -m benchmarks.bench_warm_up [--width N] [--depth N] [--delay SECONDS]
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from auto_init import AutoInitContext
+
+from .graphs import generate_graph
+
+
+def make_context(args) -> tuple:
+    graph = generate_graph(width=args.width, depth=args.depth, fan_out=2, mix={'singleton': 1.0})
+    delay = args.delay
+
+    def __init__(self):
+        time.sleep(delay)
+
+    for t in graph.kinds:
+        t.__init__ = __init__
+    ctx = graph.register(AutoInitContext())
+    ctx.register_singleton(graph.root)
+    return ctx, graph.root
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--width', type=int, default=8)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--delay', type=float, default=0.01)
+    args = parser.parse_args()
+
+    ctx, root = make_context(args)
+    started = time.perf_counter()
+    ctx.get_instance(root)
+    sequential = time.perf_counter() - started
+
+    ctx, root = make_context(args)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.width) as executor:
+        ctx.warm_up([root], executor=executor)
+    parallel = time.perf_counter() - started
+
+    print(f'{"get_instance":>16} {sequential * 1e3:>8.1f} ms')
+    print(f'{"warm_up":>16} {parallel * 1e3:>8.1f} ms {sequential / parallel:>6.1f}x')
+
+
+if __name__ == '__main__':
+    main()
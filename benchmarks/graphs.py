@@ -0,0 +1,78 @@
+"""
+Generators of synthetic class graphs for the benchmarks.
+
+A graph is made of ``depth`` layers of ``width`` types. Every type depends on ``fan_out`` types
+of the next layer and, with probability ``cycle_density``, on a type of an earlier layer, which
+creates circular references. Each type is a dataclass, a singleton, a type created by a registered
+factory or a plain class, drawn according to ``mix``.
+"""
+import dataclasses
+import random
+from typing import Dict, List, Type
+
+from auto_init import AutoInitContext
+
+DEFAULT_MIX = {'plain': 0.6, 'singleton': 0.2, 'dataclass': 0.1, 'factory': 0.1}
+
+
+class Graph:
+    def __init__(self, root: Type, layers: List[List[Type]], kinds: Dict[Type, str]):
+        # Plain class that depends on all the types of the first layer
+        self.root = root
+
+        self.layers = layers
+
+        # Kind of each generated type, one of the keys of ``DEFAULT_MIX``
+        self.kinds = kinds
+
+    @property
+    def size(self) -> int:
+        return len(self.kinds)
+
+    def register(self, ctx: AutoInitContext) -> AutoInitContext:
+        for t, kind in self.kinds.items():
+            if kind == 'singleton':
+                ctx.register_singleton(t)
+            elif kind == 'factory':
+                ctx.register_factory(t, t)
+        return ctx
+
+
+def generate_graph(
+    width: int = 10,
+    depth: int = 10,
+    fan_out: int = 2,
+    cycle_density: float = 0.0,
+    mix: Dict[str, float] = None,
+    seed: int = 0,
+) -> Graph:
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    kind_names = list(mix)
+    kind_weights = [mix[k] for k in kind_names]
+
+    kinds = {}
+    layers = []
+    for layer_index in range(depth):
+        layer = []
+        for i in range(width):
+            t = type(f'L{layer_index}T{i}', (), {})
+            kinds[t] = rng.choices(kind_names, kind_weights)[0]
+            layer.append(t)
+        layers.append(layer)
+
+    for layer_index, layer in enumerate(layers):
+        for t in layer:
+            hints = {}
+            if layer_index + 1 < depth:
+                for j, dep in enumerate(rng.sample(layers[layer_index + 1], min(fan_out, width))):
+                    hints[f'dep{j}'] = dep
+            # Dataclasses are created through their constructor and cannot break a cycle themselves
+            if layer_index > 0 and kinds[t] != 'dataclass' and rng.random() < cycle_density:
+                hints['back'] = rng.choice(layers[rng.randrange(layer_index)])
+            t.__annotations__ = hints
+            if kinds[t] == 'dataclass':
+                dataclasses.dataclass(t)
+
+    root = type('Root', (), {'__annotations__': {f'entry{i}': t for i, t in enumerate(layers[0])}})
+    return Graph(root, layers, kinds)
@@ -1,3 +1,5 @@
+import asyncio
+
 import pytest
 
 from auto_init import AutoInitContext
@@ -6,3 +8,19 @@ from auto_init import AutoInitContext
 @pytest.fixture
 def ctx() -> AutoInitContext:
     return AutoInitContext()
+
+
+def _run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+@pytest.fixture
+def run():
+    """
+    Runs a coroutine in a new event loop, ``asyncio.run`` is not available in Python 3.6.
+    """
+    return getattr(asyncio, 'run', _run)
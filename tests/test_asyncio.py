@@ -0,0 +1,161 @@
+import asyncio
+import threading
+
+import pytest
+
+from auto_init.safe_context import CreationFailed
+
+
+class Connection:
+    pass
+
+
+class Cache:
+    pass
+
+
+class Repository:
+    connection: Connection
+    cache: Cache
+    retries: int
+
+
+class Service:
+    repository: Repository
+    peer: 'Peer'
+
+
+class Peer:
+    service: Service
+    connection: Connection
+
+
+async def connect():
+    await asyncio.sleep(0.05)
+    return Connection()
+
+
+async def connect_cache():
+    await asyncio.sleep(0.05)
+    return Cache()
+
+
+def test_async_factories_are_awaited(ctx, run):
+    ctx.register_factory(Connection, connect)
+
+    repository: Repository = run(ctx.aget_instance(Repository))
+    assert isinstance(repository.connection, Connection)
+    assert isinstance(repository.cache, Cache)
+    assert repository.retries == 0
+
+
+def test_sibling_attributes_are_created_concurrently(ctx, run):
+    running = []
+    concurrent = []
+
+    def entered(create):
+        async def factory():
+            running.append(create)
+            # Both creations have started by the time either of them resumes
+            instance = await create()
+            concurrent.append(len(running))
+            running.remove(create)
+            return instance
+        return factory
+
+    ctx.register_factory(Connection, entered(connect))
+    ctx.register_factory(Cache, entered(connect_cache))
+
+    repository: Repository = run(ctx.aget_instance(Repository))
+    assert max(concurrent) == 2
+    assert isinstance(repository.connection, Connection)
+    assert isinstance(repository.cache, Cache)
+
+
+def test_concurrent_awaiters_share_singleton_creation(ctx, run):
+    calls = []
+
+    async def create_connection():
+        calls.append(1)
+        return await connect()
+
+    ctx.register_singleton(Connection, create_connection)
+
+    async def main():
+        return await asyncio.gather(*(ctx.aget_instance(Repository) for _ in range(5)))
+
+    repositories = run(main())
+    assert len(calls) == 1
+    assert all(r.connection is repositories[0].connection for r in repositories)
+
+    # Created singletons are available to the synchronous API too
+    assert ctx.get_instance(Connection) is repositories[0].connection
+
+
+def test_singleton_created_by_another_thread_is_awaited(ctx, run):
+    started = threading.Event()
+    proceed = threading.Event()
+    calls = []
+
+    async def connect_slowly():
+        calls.append(1)
+        started.set()
+        await asyncio.get_event_loop().run_in_executor(None, proceed.wait)
+        return Connection()
+
+    ctx.register_factory(Connection, connect_slowly)
+    ctx.register_singleton(Repository)
+
+    created = []
+    thread = threading.Thread(target=lambda: created.append(run(ctx.aget_instance(Repository))))
+    thread.start()
+    started.wait()
+
+    async def main():
+        # The lock of the singleton is held by the other thread, which finishes once this loop runs
+        asyncio.get_event_loop().call_later(0.02, proceed.set)
+        return await ctx.aget_instance(Repository)
+
+    repository = run(main())
+    thread.join()
+    assert repository is created[0]
+    assert calls == [1]
+
+
+def test_circular_references(ctx, run):
+    ctx.register_factory(Connection, connect)
+
+    service: Service = run(ctx.aget_instance(Service))
+    assert isinstance(service.peer.connection, Connection)
+    assert service.peer.service is None
+    assert isinstance(service.repository.connection, Connection)
+
+
+def test_singletons_with_circular_references(ctx, run):
+    ctx.register_singleton(Service)
+    ctx.register_singleton(Peer)
+    ctx.register_singleton(Connection, connect)
+
+    async def main():
+        return await asyncio.gather(ctx.aget_instance(Peer), ctx.aget_instance(Service))
+
+    peer, service = run(main())
+    assert peer.service is service
+    assert service.peer is peer
+    assert peer.connection is service.repository.connection
+
+
+def test_ainit_instance(ctx, run):
+    ctx.register_factory(Connection, connect)
+
+    repository = Repository()
+    repository.retries = 3
+    run(ctx.ainit_instance(repository))
+    assert isinstance(repository.connection, Connection)
+    assert repository.retries == 3
+
+
+def test_async_factory_requires_async_api(ctx):
+    ctx.register_factory(Connection, connect)
+    with pytest.raises(CreationFailed):
+        ctx.get_instance(Connection)
@@ -0,0 +1,85 @@
+from auto_init import AutoInitContext
+
+
+class Config:
+    pass
+
+
+class Connection:
+    config: Config
+
+
+class Item:
+    config: Config
+    connection: Connection
+    name: str
+
+
+class Parent:
+    child: 'Child'
+
+
+class Child:
+    parent: Parent
+
+
+def test_get_instances_shares_singletons(ctx: AutoInitContext):
+    ctx.register_singleton(Config)
+    items = ctx.get_instances(Item, 3)
+
+    assert len(items) == 3
+    assert len({id(item) for item in items}) == 3
+    assert len({id(item.connection) for item in items}) == 3
+    assert all(item.config is ctx.get_instance(Config) for item in items)
+    assert all(item.connection.config is item.config for item in items)
+    assert all(item.name == '' for item in items)
+
+
+def test_get_instances_of_singletons_and_instances(ctx: AutoInitContext):
+    config = Config()
+    ctx.register_instance(config)
+    ctx.register_singleton(Connection)
+
+    assert ctx.get_instances(Config, 2) == [config, config]
+    connections = ctx.get_instances(Connection, 2)
+    assert connections[0] is connections[1] is ctx.get_instance(Connection)
+    assert ctx.get_instances(Item, 0) == []
+
+
+def test_get_instances_with_circular_references(ctx: AutoInitContext):
+    ctx.register_singleton(Parent)
+    children = ctx.get_instances(Child, 2)
+    parent = ctx.get_instance(Parent)
+
+    assert children[0].parent is children[1].parent is parent
+    assert parent.child is not None
+
+
+def test_init_instances_in_chunks(ctx: AutoInitContext):
+    ctx.register_singleton(Config)
+    consumed = []
+
+    def stream():
+        for i in range(5):
+            consumed.append(i)
+            yield Item()
+
+    items = ctx.init_instances(stream(), chunk_size=2)
+    first = next(items)
+    assert consumed == [0, 1]
+    assert first.config is ctx.get_instance(Config)
+
+    rest = list(items)
+    assert len(rest) == 4
+    assert all(item.config is first.config and item.connection.config is first.config for item in rest)
+
+
+def test_init_instances_keeps_existing_attributes(ctx: AutoInitContext):
+    item = Item()
+    item.name = 'existing'
+    config = Config()
+    ctx.register_singleton(Config)
+
+    assert list(ctx.init_instances([item, config])) == [item, config]
+    assert item.name == 'existing'
+    assert ctx.get_instance(Config) is config
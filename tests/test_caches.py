@@ -0,0 +1,216 @@
+import gc
+import sys
+import threading
+import weakref
+
+import pytest
+
+from auto_init import AutoInitContext
+from auto_init.type_info import classify_type
+
+requires_union_operator = pytest.mark.skipif(sys.version_info < (3, 10), reason='X | Y requires Python 3.10')
+
+
+class Config:
+    pass
+
+
+class Cached:
+    config: Config
+
+
+def make_model():
+    class Model:
+        config: Config
+
+    class Service:
+        model: Model
+
+    Model.__annotations__['parent'] = Model
+    return Model, Service
+
+
+def test_weak_types_do_not_keep_classes_alive():
+    ctx = AutoInitContext(weak_types=True)
+    ctx.register_singleton(Config)
+
+    Model, Service = make_model()
+    ctx.register_singleton(Model)
+    ctx.register_lazy(Service)
+    service = ctx.get_instance(Service)
+    assert service.model.config is ctx.get_instance(Config)
+    assert ctx.cache_sizes()['singletons'] == 2
+    assert ctx.cache_sizes()['plans'] == 3
+
+    model_ref = weakref.ref(Model)
+    del Model, Service, service
+    gc.collect()
+
+    assert model_ref() is None
+    assert ctx.cache_sizes() == {
+        'factories': 0,
+        'instances': 0,
+        'pools': 0,
+        'singleton_types': 1,
+        'singletons': 1,
+        'lazy_types': 0,
+        'prototype_types': 0,
+        'per_resolution_types': 0,
+        'fork_safe_types': 0,
+        'deferred': 0,
+        'plans': 1,
+    }
+
+
+@requires_union_operator
+def test_weak_types_with_typing_keys():
+    ctx = AutoInitContext(weak_types=True)
+    ctx.register_instance([1], list[int])
+    ctx.register_instance(None, int | None)
+
+    assert ctx.get_instance(list[int]) == [1]
+    assert ctx.cache_sizes()['instances'] == 2
+
+
+def test_classification_does_not_keep_classes_alive():
+    Model = make_model()[0]
+    assert classify_type(Model).hints_type is Model
+
+    model_ref = weakref.ref(Model)
+    del Model
+    gc.collect()
+    assert model_ref() is None
+
+
+def make_plugins():
+    class Plugin:
+        config: Config
+
+    class Host:
+        plugins: list[Plugin]
+        by_name: dict[str, Plugin]
+
+    return Plugin, Host
+
+
+@requires_union_operator
+def test_generic_annotations_do_not_keep_classes_alive():
+    # typing aliases such as List[Plugin] are also held by the bounded cache of the typing module
+    ctx = AutoInitContext(weak_types=True)
+    Plugin, Host = make_plugins()
+    ctx.register_instance([Plugin()], list[Plugin])
+    host = ctx.get_instance(Host)
+    assert isinstance(host.plugins[0], Plugin)
+    assert classify_type(Plugin | None).key == Plugin | None
+
+    plugin_ref = weakref.ref(Plugin)
+    del Plugin, Host, host
+    gc.collect()
+
+    assert plugin_ref() is None
+    assert ctx.cache_sizes()['instances'] == 0
+    assert ctx.cache_sizes()['plans'] == 0
+
+
+def test_bounded_weak_caches_do_not_keep_classes_alive():
+    ctx = AutoInitContext(weak_types=True, cache_size=4)
+    ctx.register_singleton(Config)
+    Model, Service = make_model()
+    ctx.get_instance(Service)
+    assert ctx.cache_sizes()['plans'] == 3
+
+    model_ref = weakref.ref(Model)
+    del Model, Service
+    gc.collect()
+
+    assert model_ref() is None
+    assert ctx.cache_sizes()['plans'] == 1
+
+    classes = [type(f'Type{i}', (), {}) for i in range(6)]
+    for cls in classes:
+        ctx.get_instance(cls)
+    assert ctx.cache_sizes()['plans'] == 4
+    assert Config in ctx._plans and classes[-1] in ctx._plans and classes[0] not in ctx._plans
+
+
+def test_bounded_caches_evict_least_recently_used():
+    ctx = AutoInitContext(cache_size=2)
+    ctx.register_singleton(Config)
+    Model, Service = make_model()
+
+    ctx.get_instance(Config)
+    ctx.get_instance(Service)
+    # The singleton plan is never evicted
+    assert ctx.cache_sizes()['plans'] == 2
+    assert Config in ctx._plans
+    assert Model in ctx._plans and Service not in ctx._plans
+
+    service = ctx.get_instance(Service)
+    assert service.model.config is ctx.get_instance(Config)
+
+
+def test_plans_evicted_during_analysis():
+    class Leaf:
+        pass
+
+    class Middle:
+        leaf: Leaf
+
+    class Branch:
+        middle: Middle
+
+    class Root:
+        branch: Branch
+
+    ctx = AutoInitContext(cache_size=2)
+    ctx.register_singleton(Root)
+    assert isinstance(ctx.get_instance(Root).branch.middle.leaf, Leaf)
+
+
+@pytest.mark.parametrize('cache_size', [2, 10])
+def test_generated_builders_with_bounded_cache_and_cycles(cache_size: int):
+    types = [type(f'Node{i}', (), {}) for i in range(30)]
+    for i, t in enumerate(types):
+        t.__annotations__ = {'next': types[(i + 1) % 30], 'other': types[(i + 7) % 30]}
+    ctx = AutoInitContext(codegen=True, cache_size=cache_size)
+    for t in types[::3]:
+        ctx.register_singleton(t)
+
+    node = ctx.get_instance(types[1])
+    assert isinstance(node.other, types[8])
+    assert node.next.next is ctx.get_instance(types[3])
+
+
+def test_bounded_caches_are_thread_safe():
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    types = [type(f'Type{i}', (), {}) for i in range(64)]
+    ctx = AutoInitContext(cache_size=8)
+    errors = []
+
+    def resolve():
+        try:
+            for _ in range(50):
+                for t in types:
+                    ctx.get_instance(t)
+                list(ctx._plans.values())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=resolve) for _ in range(8)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    assert errors == []
+    assert ctx.cache_sizes()['plans'] == 8
+
+
+def test_type_hints_are_shared_by_contexts():
+    hints = AutoInitContext()._get_type_hints(Cached)
+    assert hints == {'config': Config}
+    assert AutoInitContext()._get_type_hints(Cached) is hints
+    assert classify_type(Cached).hints is hints
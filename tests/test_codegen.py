@@ -0,0 +1,69 @@
+import logging
+
+import pytest
+
+from auto_init import AutoInitContext
+from auto_init.safe_context import InitialisationFailed
+
+
+class Engine:
+    power: int
+
+
+class Car:
+    engine: Engine
+    log: logging.Logger
+    name: str = 'car'
+    tags: dict
+
+
+class Garage:
+    car: Car
+    spare: 'Garage'
+
+
+def failing_factory():
+    raise ValueError('no fuel')
+
+
+@pytest.fixture
+def ctx() -> AutoInitContext:
+    ctx = AutoInitContext(codegen=True)
+    ctx.register_instance(logging.getLogger(__name__))
+    return ctx
+
+
+def test_builder_is_generated_for_acyclic_types(ctx):
+    car: Car = ctx.get_instance(Car)
+    assert ctx._plans[Car].builder is not None
+    assert ctx._plans[Engine].builder is not None
+
+    assert car.engine.power == 0
+    assert car.log is logging.getLogger(__name__)
+    assert car.name == 'car'
+    assert 'name' not in car.__dict__
+    assert car.tags == {}
+    assert car.tags is not ctx.get_instance(Car).tags
+    assert not ctx._pending_types
+
+
+def test_falls_back_to_generic_path_for_cycles(ctx):
+    garage: Garage = ctx.get_instance(Garage)
+    assert ctx._plans[Garage].builder is None
+    assert ctx._plans[Car].builder is not None
+    assert garage.spare is None
+    assert isinstance(garage.car.engine, Engine)
+
+
+def test_falls_back_to_generic_path_for_singletons(ctx):
+    ctx.register_singleton(Car)
+    assert ctx.get_instance(Car) is ctx.get_instance(Car)
+    assert ctx._plans[Car].builder is None
+
+
+def test_builder_is_regenerated_after_registration(ctx):
+    ctx.get_instance(Car)
+    ctx.register_factory(Engine, failing_factory)
+
+    with pytest.raises(InitialisationFailed):
+        ctx.get_instance(Car)
@@ -0,0 +1,67 @@
+import pytest
+
+from auto_init import AutoInitContext
+from auto_init.safe_context import CompilationFailed, RegistrationFailed
+
+
+class Config:
+    pass
+
+
+class Connection:
+    def __init__(self, url):
+        self.url = url
+
+
+class Broken:
+    missing: 'DoesNotExist'  # noqa: F821
+
+
+class Service:
+    config: Config
+    connection: Connection
+    broken: Broken
+
+
+class Repository:
+    config: Config
+    service: 'Service'
+
+
+def test_compile_precomputes_plans(ctx: AutoInitContext):
+    ctx.register_singleton(Config)
+    ctx.register_factory(Connection, lambda: Connection('db'))
+    ctx.register_instance(Broken())
+    ctx.compile([Repository])
+
+    assert {Repository, Service, Config}.issubset(ctx._plans)
+    assert all(plan.may_await is not None for plan in ctx._plans.values())
+    repository = ctx.get_instance(Repository)
+    assert repository.service.connection.url == 'db'
+
+
+def test_compile_reports_all_errors(ctx: AutoInitContext):
+    with pytest.raises(CompilationFailed) as exc_info:
+        ctx.compile([Repository])
+
+    assert set(exc_info.value.errors) == {Connection, Broken}
+    assert isinstance(exc_info.value.errors[Broken], NameError)
+    assert 'Connection' in str(exc_info.value) and 'Broken' in str(exc_info.value)
+
+
+def test_frozen_context_rejects_registrations(ctx: AutoInitContext):
+    ctx.register_singleton(Config)
+    ctx.compile([Config])
+    ctx.freeze()
+
+    with pytest.raises(RegistrationFailed):
+        ctx.register_singleton(Repository)
+    with pytest.raises(RegistrationFailed):
+        ctx.register_instance(Config())
+    with pytest.raises(RegistrationFailed):
+        ctx.register_lazy(Repository)
+    assert ctx.get_instance(Config) is ctx.get_instance(Config)
+
+    child = ctx.child()
+    child.register_factory(Connection, lambda: Connection('child'))
+    assert child.get_instance(Connection).url == 'child'
@@ -0,0 +1,140 @@
+import dataclasses
+import sys
+from typing import NamedTuple, Optional
+
+import pytest
+
+from auto_init import AutoInitContext
+from auto_init.safe_context import CompilationFailed, CreationFailed
+from auto_init.type_info import classify_type
+
+
+class Config:
+    pass
+
+
+class Connection:
+    def __init__(self, config: Config, retries: int = 3):
+        self.config = config
+        self.retries = retries
+
+
+class Repository:
+    def __init__(self, connection: 'Connection'):
+        self.connection = connection
+
+
+@dataclasses.dataclass(frozen=True)
+class FrozenService:
+    repository: Repository
+    name: str = 'frozen'
+
+
+# Slotted dataclasses require Python 3.10
+@dataclasses.dataclass(**({'slots': True} if sys.version_info >= (3, 10) else {}))
+class SlottedService:
+    repository: Repository
+    config: Config
+
+
+class Point(NamedTuple):
+    config: Config
+    x: int = 1
+
+
+class Mixed:
+    config: Config
+
+    def __init__(self, connection: Connection):
+        self.connection = connection
+
+
+class Parent:
+    def __init__(self, child: 'Child'):
+        self.child = child
+
+
+class Child:
+    def __init__(self, parent: Optional[Parent]):
+        self.parent = parent
+
+
+class Unannotated:
+    def __init__(self, value):
+        self.value = value
+
+
+class OptionalClient:
+    # Client is only imported for type checkers
+    def __init__(self, config: Config, client: 'Client' = None):  # noqa: F821
+        self.config = config
+        self.client = client
+
+
+class MissingClient:
+    def __init__(self, client: 'Client'):  # noqa: F821
+        self.client = client
+
+
+def test_init_arguments_are_injected(ctx: AutoInitContext):
+    repository = ctx.get_instance(Repository)
+    assert isinstance(repository.connection.config, Config)
+    assert repository.connection.retries == 3
+
+
+def test_signature_is_inspected_once_per_class(ctx: AutoInitContext):
+    arguments = classify_type(Connection).constructor_arguments()
+    assert arguments == [('config', Config)]
+    assert classify_type(Connection).constructor_arguments() is arguments
+
+
+def test_frozen_and_slotted_dataclasses(ctx: AutoInitContext):
+    ctx.register_singleton(Config)
+    frozen = ctx.get_instance(FrozenService)
+    assert frozen.name == 'frozen'
+    assert isinstance(frozen.repository, Repository)
+
+    slotted = ctx.get_instance(SlottedService)
+    assert slotted.config is ctx.get_instance(Config)
+    assert slotted.repository.connection.config is slotted.config
+
+
+def test_named_tuple(ctx: AutoInitContext):
+    point = ctx.get_instance(Point)
+    assert isinstance(point.config, Config)
+    assert point.x == 1
+
+
+def test_constructor_arguments_and_attributes_are_both_injected(ctx: AutoInitContext):
+    mixed = ctx.get_instance(Mixed)
+    assert isinstance(mixed.connection, Connection)
+    assert isinstance(mixed.config, Config)
+
+
+def test_circular_constructor_arguments_are_left_none(ctx: AutoInitContext):
+    parent = ctx.get_instance(Parent)
+    assert parent.child.parent is None
+
+
+def test_async_resolution(ctx: AutoInitContext, run):
+    ctx.register_singleton(Config)
+    service = run(ctx.aget_instance(SlottedService))
+    assert service.repository.connection.config is service.config
+
+
+def test_unannotated_required_arguments_are_reported(ctx: AutoInitContext):
+    assert classify_type(Unannotated).constructor_arguments() is None
+    with pytest.raises(CompilationFailed) as exc_info:
+        ctx.compile([Unannotated])
+    assert list(exc_info.value.errors) == [Unannotated]
+
+
+def test_annotations_of_optional_arguments_are_not_evaluated(ctx: AutoInitContext):
+    client = ctx.get_instance(OptionalClient)
+    assert isinstance(client.config, Config)
+    assert client.client is None
+
+
+def test_unresolvable_required_arguments_are_reported(ctx: AutoInitContext):
+    with pytest.raises(CreationFailed):
+        ctx.get_instance(MissingClient)
@@ -1,5 +1,9 @@
 import collections
-from typing import Callable, Dict, List, Tuple
+import collections.abc
+import sys
+from typing import Callable, Dict, List, Optional, Tuple
+
+import pytest
 
 
 class Item:
@@ -50,3 +54,42 @@ def test_registered_factory_of_specific_container_type(ctx):
     ic: ItemConsumer = ctx.get_instance(ItemConsumer)
     assert isinstance(ic.item_dict, collections.OrderedDict)
     assert not isinstance(ic.item_dict_simple, collections.OrderedDict)
+
+
+requires_builtin_generics = pytest.mark.skipif(sys.version_info < (3, 9), reason='Builtin generics require Python 3.9')
+
+if sys.version_info >= (3, 9):
+    class ModernItemConsumer:
+        item_list: list[Item]
+        item_dict: dict[str, Item]
+        item_sequence: collections.abc.Sequence[Item]
+        item_optional: Optional[Item]
+
+
+@requires_builtin_generics
+def test_builtin_generics_initialised_as_containers(ctx):
+    ic: ModernItemConsumer = ctx.get_instance(ModernItemConsumer)
+    assert ic.item_list == []
+    assert ic.item_dict == {}
+
+
+@requires_builtin_generics
+def test_abstract_and_optional_annotations_initialised_as_none(ctx):
+    ic: ModernItemConsumer = ctx.get_instance(ModernItemConsumer)
+    assert ic.item_sequence is None
+    assert ic.item_optional is None
+
+
+requires_union_operator = pytest.mark.skipif(sys.version_info < (3, 10), reason='Union operator requires Python 3.10')
+
+if sys.version_info >= (3, 10):
+    class UnionItemConsumer:
+        item_optional: Item | None
+        item_union: Item | str
+
+
+@requires_union_operator
+def test_union_operator_annotations_initialised_as_none(ctx):
+    ic: UnionItemConsumer = ctx.get_instance(UnionItemConsumer)
+    assert ic.item_optional is None
+    assert ic.item_union is None
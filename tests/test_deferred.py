@@ -0,0 +1,116 @@
+import os
+import sys
+import textwrap
+
+import pytest
+
+from auto_init import AutoInitContext
+from auto_init.safe_context import CompilationFailed, CreationFailed
+
+MODELS_SOURCE = '''
+class Database:
+    url = None
+
+
+class Repository:
+    database: Database
+
+
+class Settings:
+    pass
+
+
+settings = Settings()
+'''
+
+IMPL_SOURCE = '''
+from {models} import Database
+
+
+def make_db():
+    db = Database()
+    db.url = 'sqlite://'
+    return db
+'''
+
+
+@pytest.fixture
+def modules(tmp_path, monkeypatch):
+    """
+    Writes a models module and an implementation module that is only imported on demand.
+    """
+    suffix = os.path.basename(tmp_path)
+    models, impl = f'deferred_models_{suffix}', f'deferred_impl_{suffix}'
+    (tmp_path / f'{models}.py').write_text(textwrap.dedent(MODELS_SOURCE))
+    (tmp_path / f'{impl}.py').write_text(textwrap.dedent(IMPL_SOURCE.format(models=models)))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield models, impl
+    sys.modules.pop(models, None)
+    sys.modules.pop(impl, None)
+
+
+def test_modules_are_imported_when_type_is_first_requested(ctx: AutoInitContext, modules):
+    models, impl = modules
+    ctx.register_singleton(f'{models}:Database', factory=f'{impl}:make_db')
+    assert models not in sys.modules and impl not in sys.modules
+    assert ctx.cache_sizes()['deferred'] == 1
+
+    repository = ctx.get_instance(f'{models}:Repository')
+    assert impl in sys.modules
+    assert repository.database.url == 'sqlite://'
+    assert repository.database is ctx.get_instance(sys.modules[models].Database)
+    assert ctx.cache_sizes()['deferred'] == 0
+    assert ctx.cache_sizes()['singleton_types'] == 1
+
+
+def test_type_with_deferred_factory(ctx: AutoInitContext, modules):
+    models, impl = modules
+    __import__(models)
+    Database = sys.modules[models].Database
+    ctx.register_factory(Database, f'{impl}:make_db')
+    assert impl not in sys.modules
+    assert ctx.is_custom_provided_type(Database)
+
+    assert ctx.get_instance(Database) is not ctx.get_instance(Database)
+    assert ctx.get_instance(Database).url == 'sqlite://'
+
+
+def test_deferred_instance(ctx: AutoInitContext, modules):
+    models, _ = modules
+    ctx.register_instance(f'{models}:settings', f'{models}:Settings', import_instance=True)
+    assert models not in sys.modules
+
+    settings = ctx.get_instance(f'{models}:Settings')
+    assert settings is sys.modules[models].settings
+    assert ctx.get_instance(sys.modules[models].Settings) is settings
+
+
+def test_string_instances_are_not_imported(ctx: AutoInitContext, modules):
+    models, _ = modules
+    ctx.register_instance('postgres://localhost:5432/db', f'{models}:Settings')
+
+    assert ctx.get_instance(f'{models}:Settings') == 'postgres://localhost:5432/db'
+
+
+def test_import_errors_are_reported_on_request(ctx: AutoInitContext, modules):
+    models, impl = modules
+    ctx.register_singleton(f'{models}:Database', factory=f'{impl}:missing')
+
+    with pytest.raises(CreationFailed):
+        ctx.get_instance(f'{models}:Database')
+
+    with pytest.raises(CompilationFailed) as exc_info:
+        ctx.compile([f'{models}:Repository'])
+    assert len(exc_info.value.errors) == 1
+
+
+def test_child_shares_deferred_singletons_of_parent(ctx: AutoInitContext, modules):
+    models, impl = modules
+    ctx.register_singleton(f'{models}:Database', factory=f'{impl}:make_db')
+    child = ctx.child()
+    child.register_singleton(f'{models}:Repository')
+
+    repository = child.get_instance(f'{models}:Repository')
+    assert repository is child.get_instance(f'{models}:Repository')
+    assert repository.database is ctx.get_instance(f'{models}:Database')
+    assert not ctx.is_custom_provided_type(sys.modules[models].Repository)
@@ -0,0 +1,140 @@
+import os
+import threading
+
+import pytest
+
+from auto_init import AutoInitContext
+from auto_init.safe_context import CompilationFailed, _reset_after_fork
+
+
+class Config:
+    pass
+
+
+class Connection:
+    config: Config
+
+
+class Repository:
+    connection: Connection
+
+
+class Service:
+    repository: Repository
+
+
+class Broken:
+    def __init__(self, required):
+        pass
+
+
+class NeedsBroken:
+    broken: Broken
+
+
+def make_context() -> AutoInitContext:
+    ctx = AutoInitContext(fork_aware=True)
+    ctx.register_singleton(Config, fork_safe=True)
+    ctx.register_singleton(Connection)
+    return ctx
+
+
+def test_warm_up_compiles_plans_without_creating_instances():
+    ctx = make_context()
+    ctx.warm_up([Service])
+
+    assert ctx.cache_sizes()['plans'] == 4
+    assert ctx.cache_sizes()['singletons'] == 0
+
+
+def test_warm_up_reports_all_errors():
+    ctx = make_context()
+    ctx.register_factory(Broken, Broken)
+    with pytest.raises(CompilationFailed) as exc_info:
+        ctx.warm_up([NeedsBroken])
+    assert list(exc_info.value.errors) == [Broken]
+
+
+def test_per_process_singletons_are_dropped_after_fork():
+    ctx = make_context()
+    ctx.register_prototype(Repository)
+    repository = ctx.get_instance(Repository)
+    config = ctx.get_instance(Config)
+    ctx.get_instance(Repository)
+
+    _reset_after_fork()
+
+    assert ctx.cache_sizes()['plans'] == 3
+    assert ctx.get_instance(Config) is config
+    connection = ctx.get_instance(Connection)
+    assert connection is not repository.connection
+    assert connection.config is config
+    assert ctx.get_instance(Repository).connection is connection
+
+
+def test_contexts_that_are_not_fork_aware_keep_singletons():
+    ctx = AutoInitContext()
+    ctx.register_singleton(Connection)
+    connection = ctx.get_instance(Connection)
+
+    _reset_after_fork()
+
+    assert ctx.get_instance(Connection) is connection
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires os.fork')
+def test_fork_with_lock_held_by_another_thread():
+    ctx = make_context()
+    ctx.warm_up([Service])
+    connection = ctx.get_instance(Connection)
+
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold_lock():
+        with ctx._get_plan(Connection).lock:
+            held.set()
+            release.wait()
+
+    thread = threading.Thread(target=hold_lock)
+    thread.start()
+    held.wait()
+    try:
+        pid = os.fork()
+        if pid == 0:
+            ok = ctx.get_instance(Connection) is not connection and ctx.get_instance(Service).repository is not None
+            os._exit(0 if ok else 1)
+    finally:
+        release.set()
+        thread.join()
+
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+
+
+def test_fork_with_cache_lock_held_by_another_thread():
+    ctx = AutoInitContext(cache_size=10, fork_aware=True)
+    ctx.register_singleton(Connection)
+    ctx.get_instance(Connection)
+
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold_lock():
+        with ctx._plans._lock:
+            held.set()
+            release.wait()
+
+    thread = threading.Thread(target=hold_lock)
+    thread.start()
+    held.wait()
+    try:
+        # Runs in this process, where the lock is still held, like in a child process after a fork
+        reset = threading.Thread(target=_reset_after_fork, daemon=True)
+        reset.start()
+        reset.join(timeout=5)
+        assert not reset.is_alive()
+        assert isinstance(ctx.get_instance(Service).repository.connection, Connection)
+    finally:
+        release.set()
+        thread.join()
@@ -0,0 +1,139 @@
+import dataclasses
+import json
+from typing import Optional
+
+import pytest
+
+from auto_init import AutoInitContext
+from auto_init.graph import DATACLASS, FACTORY, INSTANCE, PRIMITIVE, SINGLETON, TRANSIENT
+from auto_init.safe_context import CompilationFailed
+
+
+class Config:
+    pass
+
+
+class Clock:
+    pass
+
+
+class Engine:
+    config: Config
+    car: 'Car'
+
+
+class Car:
+    engine: Engine
+    clock: Clock
+    wheels: int
+    owner: Optional[Config]
+
+
+@dataclasses.dataclass
+class Wheel:
+    config: Config
+
+
+class Garage:
+    car: Car
+    spare: Car
+    wheel: Wheel
+
+
+class Broken:
+    def __init__(self, value):
+        self.value = value
+
+
+class NeedsBroken:
+    broken: Broken
+
+
+def make_context() -> AutoInitContext:
+    ctx = AutoInitContext()
+    ctx.register_singleton(Config)
+    ctx.register_factory(Clock, Clock)
+    return ctx
+
+
+def test_nodes_are_annotated_with_provider_kinds():
+    ctx = make_context()
+    graph = ctx.graph([Garage])
+
+    kinds = {node.instance_type: node.kind for node in graph.nodes.values()}
+    assert kinds == {
+        Garage: TRANSIENT,
+        Car: TRANSIENT,
+        Engine: TRANSIENT,
+        Wheel: DATACLASS,
+        Config: SINGLETON,
+        Clock: FACTORY,
+        int: PRIMITIVE,
+        Optional[Config]: PRIMITIVE,
+    }
+    assert ctx.cache_sizes()['singletons'] == 0
+
+
+def test_metrics_follow_the_resolution():
+    ctx = make_context()
+    graph = ctx.graph([Garage])
+    garage = ctx.get_instance(Garage)
+
+    # Garage, a wheel and two of car, engine and clock
+    assert graph.nodes[Garage].objects == 8
+    assert graph.nodes[Garage].depth == 4
+    assert graph.nodes[Car].fan_out == 4
+    assert graph.nodes[Car].fan_in == 3
+
+    cycle_breaks = {(edge.source.instance_type, edge.attr_name) for edge in graph.edges if edge.cycle_break}
+    assert cycle_breaks == {(Engine, 'car')}
+    assert garage.car.engine.car is None
+
+    metrics = graph.metrics()
+    assert metrics['roots'][f'{__name__}:Garage'] == {'depth': 4, 'objects': 8, 'singletons': 1, 'cost': 8.0}
+    assert metrics['max_fan_out'] == 4
+
+
+def test_costs_weighted_by_timings():
+    ctx = make_context()
+    graph = ctx.graph([Garage], timings={Garage: 0.001, Clock: 0.1})
+
+    assert graph.nodes[Garage].cost == pytest.approx(0.201)
+    # Each car costs as much as its clock, the engine creates a car when requested directly
+    assert {node.instance_type for node in graph.dominant(0.4)} == {Car, Engine, Clock}
+    assert graph.metrics()['dominant'] == []
+
+
+def test_registered_instances_are_leaves(ctx: AutoInitContext):
+    ctx.register_instance(Car())
+    graph = ctx.graph([Garage])
+    assert graph.nodes[Car].kind == INSTANCE
+    assert graph.nodes[Car].fan_out == 0
+    assert Engine not in graph.nodes
+
+
+def test_exports(ctx: AutoInitContext):
+    graph = ctx.graph([Garage])
+
+    exported = json.loads(graph.to_json())
+    assert len(exported['nodes']) == len(graph.nodes)
+    assert {'source', 'target', 'attr_name', 'lazy', 'cycle_break'} <= set(exported['edges'][0])
+
+    dot = graph.to_dot()
+    assert dot.startswith('digraph "dependencies" {')
+    assert '[label="car", style=dashed];' in dot
+
+
+def test_errors_are_reported_like_compile(ctx: AutoInitContext):
+    with pytest.raises(CompilationFailed):
+        ctx.graph([NeedsBroken])
+
+
+def test_long_chains_are_analysed(ctx: AutoInitContext):
+    types = [type(f'Link{i}', (), {}) for i in range(1500)]
+    for link, next_link in zip(types, types[1:]):
+        link.__annotations__ = {'next': next_link}
+
+    graph = ctx.graph([types[0]])
+    assert graph.nodes[types[0]].depth == 1500
+    assert graph.nodes[types[0]].objects == 1500
@@ -0,0 +1,185 @@
+import importlib
+import json
+import os
+import sys
+import textwrap
+from typing import Dict, List, Optional
+
+import pytest
+
+from auto_init import AutoInitContext, type_info
+from auto_init.hints_cache import HASH, HintsCache, disable_hints_cache, enable_hints_cache
+
+MODULE_SOURCE = '''
+from typing import Dict, List, Optional
+
+
+class Config:
+    name: str
+
+
+class Repository:
+    config: Config
+    names: List[str]
+    extra: Optional[Dict[str, int]]
+
+
+class Service(Repository):
+    repository: Repository
+    fallback: Optional[Config]
+
+
+def make_local():
+    class Local:
+        config: Config
+    return Local
+'''
+
+
+@pytest.fixture
+def module(tmp_path, monkeypatch):
+    """
+    Imports a fresh module written to a temporary directory, so that each test sees new classes.
+    """
+    name = f'hints_cache_models_{os.path.basename(tmp_path)}'
+    (tmp_path / f'{name}.py').write_text(textwrap.dedent(MODULE_SOURCE))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield importlib.import_module(name)
+    sys.modules.pop(name, None)
+    disable_hints_cache()
+
+
+def touch(module, delta_ns=10 ** 9):
+    stat = os.stat(module.__file__)
+    os.utime(module.__file__, ns=(stat.st_atime_ns, stat.st_mtime_ns + delta_ns))
+
+
+def test_round_trips_hints_of_classes(module, tmp_path):
+    path = str(tmp_path / 'hints.json')
+    cache = HintsCache(path)
+    hints = {
+        'config': module.Config,
+        'names': List[str],
+        'extra': Optional[Dict[str, int]],
+        'repository': module.Repository,
+        'fallback': Optional[module.Config],
+    }
+    if sys.version_info >= (3, 10):
+        hints['pipe'] = module.Config | None
+        hints['builtin'] = list[int]
+    cache.put(module.Service, hints)
+    cache.save()
+
+    with open(path) as f:
+        assert module.__name__ + ':Service' in json.load(f)['entries']
+
+    assert HintsCache(path).get(module.Service) == hints
+
+
+def test_does_not_store_classes_that_cannot_be_looked_up(module, tmp_path):
+    cache = HintsCache(str(tmp_path / 'hints.json'))
+    local = module.make_local()
+    cache.put(local, {'config': module.Config})
+    cache.put(module.Repository, {'config': local})
+    assert len(cache) == 0
+
+
+def test_stale_entries_are_ignored(module, tmp_path):
+    path = str(tmp_path / 'hints.json')
+    cache = HintsCache(path)
+    cache.put(module.Config, {'name': str})
+    cache.save()
+
+    touch(module)
+    fresh = HintsCache(path)
+    assert fresh.get(module.Config) is None
+    assert fresh.misses == 1
+
+
+def test_new_module_stamp_drops_entries_stored_for_the_old_one(module, tmp_path):
+    path = str(tmp_path / 'hints.json')
+    cache = HintsCache(path)
+    cache.put(module.Config, {'name': str})
+    cache.save()
+
+    touch(module)
+    cache = HintsCache(path)
+    cache.put(module.Repository, {'config': module.Config})
+    assert cache.get(module.Config) is None
+    assert cache.get(module.Repository) == {'config': module.Config}
+
+
+def test_hash_validation_ignores_modification_time(module, tmp_path):
+    path = str(tmp_path / 'hints.json')
+    cache = HintsCache(path, validate=HASH)
+    cache.put(module.Config, {'name': str})
+    cache.save()
+
+    touch(module)
+    assert HintsCache(path, validate=HASH).get(module.Config) == {'name': str}
+
+    # Files written with another validation mode are not used
+    assert HintsCache(path).get(module.Config) is None
+
+
+def test_other_library_version_and_corrupt_files_are_ignored(module, tmp_path):
+    path = tmp_path / 'hints.json'
+    cache = HintsCache(str(path))
+    cache.put(module.Config, {'name': str})
+    cache.save()
+
+    data = json.loads(path.read_text())
+    data['version'] = '0.0.0'
+    path.write_text(json.dumps(data))
+    assert HintsCache(str(path)).get(module.Config) is None
+
+    path.write_text('{not json')
+    assert HintsCache(str(path)).get(module.Config) is None
+
+
+def test_contexts_use_cached_hints_instead_of_evaluating_them(module, tmp_path, monkeypatch):
+    path = str(tmp_path / 'hints.json')
+    cache = enable_hints_cache(path, save_at_exit=False)
+    service = AutoInitContext().get_instance(module.Service)
+    assert isinstance(service.repository.config, module.Config)
+    cache.save()
+
+    # A fresh process: classes not classified yet and hints not evaluated
+    for cls in (module.Config, module.Repository, module.Service):
+        delattr(cls, type_info._TYPE_INFO_ATTR)
+
+    def fail(cls):
+        raise AssertionError(f'evaluated hints of {cls}')
+
+    monkeypatch.setattr(type_info, 'get_type_hints', fail)
+    cache = enable_hints_cache(path, save_at_exit=False)
+    service = AutoInitContext().get_instance(module.Service)
+    assert isinstance(service.repository.config, module.Config)
+    assert service.names == []
+    assert cache.hits == 3
+
+
+def test_entries_are_stale_once_an_imported_module_changes(tmp_path, monkeypatch):
+    suffix = os.path.basename(tmp_path)
+    helpers = f'hints_cache_helpers_{suffix}'
+    models = f'hints_cache_aliases_{suffix}'
+    (tmp_path / f'{helpers}.py').write_text('from typing import List\n\nItems = List[int]\n')
+    (tmp_path / f'{models}.py').write_text(
+        f'from {helpers} import Items\n\n\nclass Batch:\n    items: "Items"\n'
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    try:
+        module = importlib.import_module(models)
+        path = str(tmp_path / 'hints.json')
+        cache = HintsCache(path)
+        cache.put(module.Batch, {'items': List[int]})
+        cache.save()
+        assert HintsCache(path).get(module.Batch) == {'items': List[int]}
+
+        # The module of the class is unchanged, the alias it imports is not
+        (tmp_path / f'{helpers}.py').write_text('from typing import List\n\nItems = List[str]\n')
+        touch(sys.modules[helpers])
+        assert HintsCache(path).get(module.Batch) is None
+    finally:
+        sys.modules.pop(models, None)
+        sys.modules.pop(helpers, None)
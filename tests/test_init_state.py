@@ -206,3 +206,81 @@ def wtest_singletons_with_circular_references(ctx):
     assert init_state.initialised
 
     assert presenter.view.model is presenter.model
+
+
+def test_singletons_with_circular_references_are_initialised(ctx):
+    ctx.register_singleton(Model)
+    ctx.register_singleton(Presenter)
+    ctx.register_singleton(View)
+
+    presenter, init_state = ctx._create_instance(Presenter)
+    assert init_state.initialised
+    assert init_state.dependencies[1].initialised
+
+    assert presenter.view.model is presenter.model
+    assert presenter.view.presenter is presenter
+
+
+def test_large_graph_of_shared_singletons(ctx):
+    types = [type(f'Node{i}', (), {}) for i in range(200)]
+    for i, t in enumerate(types):
+        t.__annotations__ = {f'dep{j}': types[i + j] for j in (1, 2, 3) if i + j < len(types)}
+        t.__annotations__['root'] = types[0]
+        ctx.register_singleton(t)
+
+    root, init_state = ctx._create_instance(types[0])
+    assert init_state.initialised
+    assert root.dep1.dep2.root is root
+
+
+@pytest.mark.parametrize('singleton', [False, True])
+def test_deep_chain(ctx, singleton: bool):
+    types = [type(f'Link{i}', (), {}) for i in range(400)]
+    for i, t in enumerate(types[1:], 1):
+        t.__annotations__ = {'previous': types[i - 1]}
+        if singleton:
+            ctx.register_singleton(t)
+
+    link = ctx.get_instance(types[-1])
+    for _ in range(len(types) - 1):
+        link = link.previous
+    assert isinstance(link, types[0])
+
+
+def test_failed_resolution_leaves_no_pending_types(ctx):
+    class Broken:
+        def __init__(self, required):
+            pass
+
+    class HasBroken:
+        node: Node
+        broken: Broken
+
+    with pytest.raises(Exception):
+        ctx.get_instance(HasBroken)
+    assert not ctx._pending_types
+
+    assert isinstance(ctx.get_instance(Node), Node)
+
+
+def test_init_states_are_compact():
+    state = _InitState(Model, Model())
+    assert not hasattr(state, '__dict__')
+    assert state.dependencies == ()
+
+    state.add_dependency(_InitState(View, View()))
+    assert [d.instance_type for d in state.dependencies] == [View]
+
+
+def test_published_singletons_release_dependencies(ctx):
+    ctx.register_singleton(Model)
+    ctx.register_singleton(Presenter)
+    ctx.register_singleton(View)
+
+    presenter, init_state = ctx._create_instance(Presenter)
+    assert init_state.dependencies
+
+    for t in (Model, Presenter, View):
+        assert ctx._singletons[t].dependencies == ()
+        assert ctx._singletons[t].initialised
+    assert ctx._singletons[Presenter].instance is presenter
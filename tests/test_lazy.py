@@ -0,0 +1,142 @@
+import logging
+
+import pytest
+
+from auto_init import AutoInitContext
+
+
+class Connection:
+    created = 0
+
+    def __init__(self):
+        Connection.created += 1
+
+
+class Repository:
+    connection: Connection
+
+
+class Handler:
+    repository: Repository
+    name: str
+    log: logging.Logger
+
+
+class Worker:
+    enterprise: 'Enterprise'
+    log: logging.Logger
+
+
+class Reporter:
+    enterprise: 'Enterprise'
+    log: logging.Logger
+
+
+class Enterprise:
+    worker: Worker
+    reporter: Reporter
+
+
+class C:
+    d: 'D'
+
+
+class D:
+    c: C
+
+
+@pytest.fixture
+def lazy_ctx() -> AutoInitContext:
+    ctx = AutoInitContext(lazy=True)
+    ctx.register_instance(logging.getLogger(__name__))
+    return ctx
+
+
+def test_dependencies_are_created_on_first_access(lazy_ctx):
+    Connection.created = 0
+
+    handler: Handler = lazy_ctx.get_instance(Handler)
+    assert handler.name == ''
+    assert handler.log is logging.getLogger(__name__)
+    assert 'repository' not in handler.__dict__
+    assert Connection.created == 0
+
+    repository = handler.repository
+    assert isinstance(repository.connection, Connection)
+    assert handler.repository is repository
+    assert handler.__dict__['repository'] is repository
+    assert Connection.created == 1
+
+
+def test_circular_references_of_singletons(lazy_ctx):
+    lazy_ctx.register_singleton(Enterprise)
+
+    enterprise: Enterprise = lazy_ctx.get_instance(Enterprise)
+    assert enterprise.worker.log is enterprise.reporter.log
+    assert enterprise.worker.enterprise is enterprise
+    assert enterprise.reporter.enterprise is enterprise
+
+
+def test_circular_references(lazy_ctx):
+    c: C = lazy_ctx.get_instance(C)
+    assert isinstance(c.d, D)
+    assert c.d.c is None
+
+
+def test_lazy_types(ctx):
+    ctx.register_instance(logging.getLogger(__name__))
+    ctx.register_lazy(Handler)
+
+    handler: Handler = ctx.get_instance(Handler)
+    assert 'repository' not in handler.__dict__
+    assert 'connection' in handler.repository.__dict__
+
+
+def test_does_not_affect_other_contexts(lazy_ctx, ctx):
+    lazy_ctx.get_instance(Repository)
+
+    # The class now has a lazy attribute descriptor, but it's invisible to instances without binding.
+    assert not hasattr(Repository(), 'connection')
+
+    repository = Repository()
+    ctx.init_instance(repository)
+    assert 'connection' in repository.__dict__
+
+
+def test_init_instance_does_not_overwrite_attributes(lazy_ctx):
+    connection = Connection()
+    repository = Repository()
+    repository.connection = connection
+
+    lazy_ctx.init_instance(repository)
+    assert repository.connection is connection
+
+    other = Repository()
+    lazy_ctx.init_instance(other)
+    lazy_ctx.init_instance(other)
+    assert 'connection' not in other.__dict__
+    assert isinstance(other.connection, Connection)
+
+
+@pytest.mark.parametrize('codegen', [False, True])
+@pytest.mark.parametrize('lazy_first', [False, True])
+def test_lazy_and_eager_contexts_share_classes(codegen: bool, lazy_first: bool):
+    lazy_ctx = AutoInitContext(lazy=True, codegen=codegen)
+    eager_ctx = AutoInitContext(codegen=codegen)
+    contexts = [lazy_ctx, eager_ctx] if lazy_first else [eager_ctx, lazy_ctx]
+    for ctx in contexts:
+        ctx.register_instance(logging.getLogger(__name__))
+        ctx.get_instance(Handler)
+
+    # The descriptors installed by the lazy context are not visible on the class
+    with pytest.raises(AttributeError):
+        Handler.repository
+    assert not hasattr(Handler(), 'repository')
+
+    eager = eager_ctx.get_instance(Handler)
+    assert isinstance(eager.__dict__['repository'], Repository)
+    assert isinstance(eager.repository.__dict__['connection'], Connection)
+
+    lazy = lazy_ctx.get_instance(Handler)
+    assert 'repository' not in lazy.__dict__
+    assert isinstance(lazy.repository.connection, Connection)
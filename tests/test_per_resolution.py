@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+from auto_init import AutoInitContext
+
+
+class Settings:
+    pass
+
+
+class Helper:
+    settings: Settings
+
+
+class Left:
+    helper: Helper
+
+
+class Right:
+    helper: Helper
+    settings: Settings
+
+
+class Request:
+    left: Left
+    right: Right
+    helper: Helper
+
+
+class Session:
+    request: 'Handler'
+
+
+class Handler:
+    session: Session
+
+
+async def make_settings():
+    await asyncio.sleep(0.01)
+    return Settings()
+
+
+class AsyncRequest:
+    left: Left
+    right: Right
+
+
+@pytest.mark.parametrize('codegen', [False, True])
+def test_instance_is_shared_within_a_resolution(codegen: bool):
+    ctx = AutoInitContext(codegen=codegen)
+    ctx.register_per_resolution(Helper)
+
+    request = ctx.get_instance(Request)
+    assert request.left.helper is request.right.helper is request.helper
+    assert request.right.settings is not request.helper.settings
+
+    other = ctx.get_instance(Request)
+    assert other.helper is not request.helper
+    assert ctx.get_instance(Helper) is not ctx.get_instance(Helper)
+
+
+def test_registered_factory_is_called_once_per_resolution(ctx: AutoInitContext):
+    created = []
+
+    def make_helper():
+        created.append(Helper())
+        return created[-1]
+
+    ctx.register_factory(Helper, make_helper)
+    ctx.register_per_resolution(Helper)
+
+    request = ctx.get_instance(Request)
+    assert created == [request.helper]
+    assert request.left.helper is request.helper
+
+
+def test_circular_reference_gets_instance_being_initialised(ctx: AutoInitContext):
+    ctx.register_per_resolution(Handler)
+
+    handler = ctx.get_instance(Handler)
+    assert handler.session.request is handler
+
+    # Transient types still break circular references with None
+    session = ctx.get_instance(Session)
+    assert session.request.session is None
+
+
+def test_batch_is_one_resolution(ctx: AutoInitContext):
+    ctx.register_per_resolution(Helper)
+
+    lefts = ctx.get_instances(Left, 3)
+    assert len({id(left.helper) for left in lefts}) == 1
+
+    helpers = ctx.get_instances(Helper, 3)
+    assert helpers[0] is helpers[1] is helpers[2]
+    assert ctx.get_instances(Helper, 2)[0] is not helpers[0]
+
+
+def test_concurrent_branches_share_asynchronous_creation(ctx: AutoInitContext, run):
+    ctx.register_factory(Settings, make_settings)
+    ctx.register_per_resolution(Settings)
+
+    first = run(ctx.aget_instance(AsyncRequest))
+    assert first.left.helper.settings is first.right.settings is first.right.helper.settings
+
+    second = run(ctx.aget_instance(AsyncRequest))
+    assert second.right.settings is not first.right.settings
+
+
+def test_graph_counts_shared_instances_once(ctx: AutoInitContext):
+    assert ctx.graph([Request]).nodes[Request].objects == 10
+
+    ctx.register_per_resolution(Helper)
+    assert ctx.graph([Request]).nodes[Request].objects == 6
+
+
+def test_singletons_cannot_be_per_resolution(ctx: AutoInitContext):
+    ctx.register_singleton(Settings)
+    with pytest.raises(AssertionError):
+        ctx.register_per_resolution(Settings)
+
+
+def test_per_resolution_types_cannot_become_singletons(ctx: AutoInitContext):
+    ctx.register_per_resolution(Settings)
+    with pytest.raises(AssertionError):
+        ctx.register_singleton(Settings)
+    with pytest.raises(AssertionError):
+        ctx.register_instance(Settings())
+    assert not ctx.is_custom_provided_type(Settings)
+    assert ctx.get_instance(Settings) is not ctx.get_instance(Settings)
@@ -0,0 +1,111 @@
+import pytest
+
+from auto_init.safe_context import _COMPOSITE, _FACTORY, _INSTANCE, _NESTED, _PRIMITIVE
+
+
+class Engine:
+    pass
+
+
+class ElectricEngine(Engine):
+    pass
+
+
+class Car:
+    engine: Engine
+    wheels: int
+    name: str = 'car'
+
+
+class Garage:
+    car: Car
+
+
+class Bicycle:
+    wheels: int
+
+
+def test_plan_is_compiled_once_per_type(ctx):
+    ctx.get_instance(Car)
+    plan = ctx._plans[Car]
+    assert plan.kind is _COMPOSITE
+
+    ctx.get_instance(Car)
+    assert ctx._plans[Car] is plan
+
+
+def test_plan_steps(ctx):
+    ctx.get_instance(Car)
+    steps = {attr_name: (kind, attr_type) for attr_name, kind, _, attr_type in ctx._plans[Car].steps}
+
+    # Attributes set on the class are never injected into fresh instances
+    assert steps == {
+        'engine': (_NESTED, Engine),
+        'wheels': (_PRIMITIVE, int),
+    }
+
+
+def test_plan_is_invalidated_on_registration(ctx):
+    car1: Car = ctx.get_instance(Car)
+    assert type(car1.engine) is Engine
+
+    ctx.register_factory(Engine, ElectricEngine)
+    assert Car not in ctx._plans
+
+    car2: Car = ctx.get_instance(Car)
+    assert isinstance(car2.engine, ElectricEngine)
+    assert ('engine', _FACTORY, ElectricEngine, Engine) in ctx._plans[Car].steps
+
+    ctx.register_singleton(Car)
+    car3: Car = ctx.get_instance(Car)
+    assert car3 is ctx.get_instance(Car)
+    assert ctx._plans[Car].singleton
+
+
+def test_registration_evicts_only_dependent_plans(ctx):
+    ctx.get_instance(Garage)
+    ctx.get_instance(Bicycle)
+    bicycle_plan = ctx._plans[Bicycle]
+
+    ctx.register_factory(Engine, ElectricEngine)
+    assert Engine not in ctx._plans
+    assert Car not in ctx._plans
+    assert Garage not in ctx._plans
+    assert ctx._plans[Bicycle] is bicycle_plan
+    assert isinstance(ctx.get_instance(Garage).car.engine, ElectricEngine)
+
+
+def test_registration_can_be_overridden(ctx):
+    ctx.register_singleton(Engine)
+    engine = ctx.get_instance(Car).engine
+    assert ctx.get_instance(Engine) is engine
+
+    with pytest.raises(AssertionError):
+        ctx.register_factory(Engine, ElectricEngine)
+
+    ctx.register_factory(Engine, ElectricEngine, override=True)
+    assert isinstance(ctx.get_instance(Car).engine, ElectricEngine)
+    assert ctx.get_instance(Engine) is not ctx.get_instance(Engine)
+
+    ctx.register_singleton(Engine, override=True)
+    assert ctx.get_instance(Engine) is not engine
+    assert ctx.get_instance(Engine) is ctx.get_instance(Car).engine
+
+
+def test_registered_instance_is_inlined_in_steps(ctx):
+    engine = Engine()
+    ctx.register_instance(engine)
+
+    car: Car = ctx.get_instance(Car)
+    assert car.engine is engine
+    assert ('engine', _INSTANCE, engine, Engine) in ctx._plans[Car].steps
+
+
+def test_init_instance_does_not_overwrite_attributes_set_by_init(ctx):
+    class Bus(Car):
+        def __init__(self):
+            self.wheels = 6
+
+    bus: Bus = ctx.get_instance(Bus)
+    assert bus.wheels == 6
+    assert isinstance(bus.engine, Engine)
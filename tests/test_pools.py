@@ -0,0 +1,203 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from auto_init import AutoInitContext
+from auto_init.pools import Pool
+from auto_init.safe_context import CompilationFailed, CreationFailed
+
+
+class Connection:
+    pass
+
+
+class Repository:
+    connection: Connection
+
+
+class Service:
+    repository: Repository
+    connection: Connection
+
+
+async def connect():
+    await asyncio.sleep(0.01)
+    return Connection()
+
+
+def test_scope_checks_out_one_object_returned_when_it_closes(ctx: AutoInitContext):
+    ctx.register_pool(Connection, Connection, size=1, timeout=0.1)
+
+    with ctx.child() as scope:
+        service = scope.get_instance(Service)
+        assert service.connection is service.repository.connection
+        # Further resolutions in the scope reuse its checkout instead of waiting for it
+        assert scope.get_instance(Connection) is service.connection
+        assert scope.get_instance(Repository).connection is service.connection
+        assert ctx.pool_stats()[Connection]['in_use'] == 1
+
+    stats = ctx.pool_stats()[Connection]
+    assert stats['in_use'] == 0
+    assert stats['idle'] == 1
+    assert stats['checkouts'] == 1
+    assert stats['timeouts'] == 0
+
+    with ctx.child() as scope:
+        assert scope.get_instance(Connection) is service.connection
+    assert ctx.pool_stats()[Connection]['live'] == 1
+
+
+def test_exhausted_pool_waits_for_release(ctx: AutoInitContext):
+    ctx.register_pool(Connection, Connection, size=1)
+    scope = ctx.child()
+    connection = scope.get_instance(Connection)
+
+    threading.Timer(0.05, scope.close).start()
+    with ctx.child() as other:
+        assert other.get_instance(Connection) is connection
+
+    stats = ctx.pool_stats()[Connection]
+    assert stats['waits'] == 1
+    assert stats['max_wait_time'] > 0
+    assert stats['live'] == 1
+
+
+def test_exhausted_pool_times_out(ctx: AutoInitContext):
+    ctx.register_pool(Connection, Connection, size=1, timeout=0.01)
+    scope = ctx.child()
+    scope.get_instance(Connection)
+
+    with pytest.raises(CreationFailed):
+        ctx.child().get_instance(Connection)
+    assert ctx.pool_stats()[Connection]['timeouts'] == 1
+
+
+def test_idle_objects_are_discarded(ctx: AutoInitContext):
+    disposed = []
+    ctx.register_pool(Connection, Connection, size=2, max_idle=0.01, dispose=disposed.append)
+    with ctx.child() as scope:
+        connection = scope.get_instance(Connection)
+
+    time.sleep(0.02)
+    with ctx.child() as scope:
+        assert scope.get_instance(Connection) is not connection
+    assert disposed == [connection]
+    assert ctx.pool_stats()[Connection]['discarded'] == 1
+
+
+def test_async_resolutions_wait_without_blocking_the_loop(ctx: AutoInitContext, run):
+    ctx.register_pool(Connection, connect, size=2)
+
+    async def request():
+        scope = ctx.child()
+        try:
+            service = await scope.aget_instance(Service)
+            assert service.connection is service.repository.connection
+            await asyncio.sleep(0.01)
+            return service.connection
+        finally:
+            scope.close()
+
+    async def main():
+        return await asyncio.gather(*(request() for _ in range(6)))
+
+    connections = run(main())
+    assert len(set(map(id, connections))) == 2
+
+    stats = ctx.pool_stats()[Connection]
+    assert stats['checkouts'] == 6
+    assert stats['waits'] == 4
+    assert stats['in_use'] == 0
+
+
+def test_concurrent_async_resolutions_in_a_scope_share_its_checkout(ctx: AutoInitContext, run):
+    ctx.register_pool(Connection, connect, size=1, timeout=0.1)
+    scope = ctx.child()
+
+    async def main():
+        return await asyncio.gather(*(scope.aget_instance(Service) for _ in range(3)))
+
+    services = run(main())
+    assert len({id(service.connection) for service in services}) == 1
+    assert run(scope.aget_instance(Connection)) is services[0].connection
+    assert ctx.pool_stats()[Connection]['checkouts'] == 1
+
+    scope.close()
+    stats = ctx.pool_stats()[Connection]
+    assert stats['in_use'] == 0
+    assert stats['timeouts'] == 0
+
+
+@pytest.mark.parametrize('prototype', [False, True])
+def test_scopes_sharing_generated_builders_return_their_checkouts(prototype: bool):
+    ctx = AutoInitContext(codegen=True)
+    ctx.register_pool(Connection, Connection, size=1, timeout=0.1)
+    if prototype:
+        ctx.register_prototype(Service)
+
+    for _ in range(3):
+        with ctx.child() as scope:
+            scope.get_instance(Service)
+        assert ctx.pool_stats()[Connection]['in_use'] == 0
+    assert ctx.pool_stats()[Connection]['timeouts'] == 0
+
+
+def test_root_context_checks_out_until_closed():
+    with AutoInitContext() as ctx:
+        ctx.register_pool(Connection, Connection, size=1, timeout=0.1)
+        connection = ctx.get_instance(Service).connection
+        assert ctx.get_instance(Service).connection is connection
+        assert ctx.pool_stats()[Connection]['in_use'] == 1
+
+        with ctx.child() as scope:
+            # Waits for the root context
+            with pytest.raises(CreationFailed):
+                scope.get_instance(Connection)
+
+    stats = ctx.pool_stats()[Connection]
+    assert stats['checkouts'] == 1
+    assert stats['in_use'] == 0
+
+
+@pytest.mark.parametrize('registered_in', ['parent', 'scope', 'parent of scope with own registries'])
+def test_singletons_cannot_hold_pooled_objects(ctx: AutoInitContext, run, registered_in: str):
+    ctx.register_pool(Connection, Connection, size=1)
+    scope = ctx.child()
+    (scope if registered_in == 'scope' else ctx).register_singleton(Repository)
+    if registered_in.endswith('own registries'):
+        # Created by the parent on behalf of the scope
+        scope.register_factory(int, int)
+
+    with pytest.raises(CreationFailed):
+        scope.get_instance(Service)
+    with pytest.raises(CreationFailed):
+        run(scope.aget_instance(Repository))
+    assert ctx.pool_stats()[Connection]['checkouts'] == 0
+
+    with pytest.raises(CompilationFailed) as e:
+        scope.compile([Service])
+    assert list(e.value.errors) == [Repository]
+
+
+def test_asynchronous_factory_requires_aget_instance(ctx: AutoInitContext):
+    ctx.register_pool(Connection, connect, size=1)
+    with pytest.raises(CreationFailed):
+        ctx.get_instance(Connection)
+
+
+def test_failed_creation_frees_the_slot():
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError()
+        return Connection()
+
+    pool = Pool(flaky, size=1)
+    with pytest.raises(RuntimeError):
+        pool.acquire()
+    assert isinstance(pool.acquire(), Connection)
+    assert pool.stats()['live'] == 1
@@ -0,0 +1,97 @@
+import logging
+from typing import List
+
+from auto_init import AutoInitContext
+
+
+class Config:
+    pass
+
+
+class Counter:
+    created = 0
+
+    def __init__(self):
+        Counter.created += 1
+
+
+class Session:
+    config: Config
+    items: List[int]
+
+
+class Custom:
+    session: Session
+
+    def __init__(self):
+        self.initialised = True
+
+
+class Request:
+    config: Config
+    log: logging.Logger
+    session: Session
+    counter: Counter
+    custom: Custom
+    name: str
+
+
+class Parent:
+    child: 'Child'
+
+
+class Child:
+    parent: Parent
+
+
+def test_clones_share_singletons_and_copy_transients(ctx: AutoInitContext):
+    log = logging.getLogger(__name__)
+    ctx.register_instance(log)
+    ctx.register_singleton(Config)
+    ctx.register_factory(Counter, Counter)
+    ctx.register_prototype(Request)
+
+    first = ctx.get_instance(Request)
+    assert ctx._plans[Request].prototype.clone is not None
+
+    created = Counter.created
+    second, third = ctx.get_instances(Request, 2)
+    assert Counter.created == created + 2
+
+    for request in (first, second, third):
+        assert request.config is ctx.get_instance(Config)
+        assert request.log is log
+        assert request.session.config is request.config
+        assert request.session.items == []
+        assert request.name == ''
+        assert request.custom.initialised
+        assert request.custom.session.config is request.config
+    assert second is not third
+    assert second.session is not third.session
+    assert second.session.items is not third.session.items
+    assert second.counter is not third.counter
+    assert second.custom is not third.custom
+
+
+def test_prototypes_with_circular_references(ctx: AutoInitContext):
+    ctx.register_prototype(Parent)
+    ctx.get_instance(Parent)
+    assert ctx._plans[Parent].prototype.types == {Parent, Child}
+
+    parent = ctx.get_instance(Parent)
+    assert parent.child.parent is None
+
+    # Nested in a resolution of Child the prototype cannot be used
+    child = ctx.get_instance(Child)
+    assert child.parent.child is None
+
+
+def test_registration_discards_prototypes(ctx: AutoInitContext):
+    ctx.register_prototype(Session)
+    first = ctx.get_instance(Session)
+    ctx.register_singleton(Config)
+    second = ctx.get_instance(Session)
+    third = ctx.get_instance(Session)
+
+    assert first.config is not second.config
+    assert second.config is third.config is ctx.get_instance(Config)
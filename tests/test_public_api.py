@@ -99,3 +99,16 @@ def test_registered_instance(ctx):
 
     b: WithLogger = ctx.get_instance(WithLogger)
     assert a.log is b.log
+
+
+def test_registered_singleton_factory_and_dataclass(ctx):
+    @dataclasses.dataclass
+    class Settings:
+        timeout: int
+
+    ctx.register_singleton(Settings)
+    ctx.register_singleton(Timer, lambda: DefaultTimer())
+
+    assert ctx.get_instance(Settings) is ctx.get_instance(Settings)
+    assert isinstance(ctx.get_instance(Timer), DefaultTimer)
+    assert ctx.get_instance(Timer) is ctx.get_instance(Timer)
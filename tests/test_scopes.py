@@ -0,0 +1,197 @@
+import pytest
+
+from auto_init import AutoInitContext
+
+
+class Config:
+    pass
+
+
+class Session:
+    config: Config
+
+
+class Request:
+    session: Session
+    config: Config
+
+
+async def make_session():
+    return Session()
+
+
+def test_child_shares_registries_until_registration(ctx: AutoInitContext):
+    ctx.register_singleton(Config)
+    child = ctx.child()
+
+    assert child._plans is ctx._plans
+    assert child.get_instance(Config) is ctx.get_instance(Config)
+
+    child.register_singleton(Session)
+    assert child._plans is not ctx._plans
+    assert not ctx.is_custom_provided_type(Session)
+    assert child.get_instance(Session) is child.get_instance(Session)
+    assert ctx.get_instance(Session) is not ctx.get_instance(Session)
+
+
+def test_parent_singletons_are_created_by_parent(ctx: AutoInitContext):
+    ctx.register_singleton(Config)
+    child = ctx.child()
+    child.register_singleton(Session)
+
+    request = child.get_instance(Request)
+    assert request.config is request.session.config
+    assert request.config is ctx.get_instance(Config)
+    assert Config in ctx._singletons
+    assert Config not in child._singletons
+
+
+def test_child_singletons_are_dropped_on_exit(ctx: AutoInitContext):
+    ctx.register_singleton(Config)
+    with ctx.child() as child:
+        child.register_singleton(Session)
+        first = child.get_instance(Session)
+    assert not child._singletons
+    assert ctx._singletons
+
+    with ctx.child() as child:
+        child.register_singleton(Session)
+        second = child.get_instance(Session)
+    assert first is not second
+    assert first.config is second.config
+
+
+def test_child_overrides_parent_registration(ctx: AutoInitContext):
+    config = Config()
+    ctx.register_singleton(Config)
+    child = ctx.child()
+    child.register_instance(config)
+
+    assert child.get_instance(Session).config is config
+    assert ctx.get_instance(Session).config is not config
+
+
+def test_child_resolves_async_parent_singletons(ctx: AutoInitContext, run):
+    ctx.register_singleton(Session, make_session)
+    child = ctx.child()
+    child.register_singleton(Config)
+
+    request = run(child.aget_instance(Request))
+    assert request.session is ctx._singletons[Session].instance
+    assert request.config is child.get_instance(Config)
+
+
+class Audit:
+    pass
+
+
+def test_child_keeps_parent_plans_not_affected_by_its_registrations():
+    ctx = AutoInitContext(codegen=True)
+    ctx.register_singleton(Config)
+    ctx.get_instance(Request)
+
+    child = ctx.child()
+    child.register_singleton(Audit)
+    assert child._plans[Request] is ctx._plans[Request]
+    request = child.get_instance(Request)
+    assert request.config is ctx.get_instance(Config)
+    assert Config not in child._singletons
+
+    child.register_singleton(Session)
+    assert Session not in child._plans and Request not in child._plans
+    assert child.get_instance(Request).session is child.get_instance(Session)
+    assert ctx.get_instance(Request).session is not ctx.get_instance(Request).session
+
+
+def test_child_registration_does_not_leak_into_shared_builders():
+    ctx = AutoInitContext(codegen=True)
+    child = ctx.child()
+    child.get_instance(Request)
+
+    config = Config()
+    child.register_instance(config)
+    assert child.get_instance(Request).session.config is config
+    assert ctx.get_instance(Request).session.config is not config
+
+
+def test_child_registration_does_not_leak_into_shared_prototypes(ctx: AutoInitContext):
+    ctx.register_prototype(Request)
+    child = ctx.child()
+    child.get_instance(Request)
+    child.get_instance(Request)
+
+    config = Config()
+    child.register_instance(config)
+    assert child.get_instance(Request).session.config is config
+    assert ctx.get_instance(Request).session.config is not config
+
+
+def test_child_falls_back_to_parent_registries_and_plans(ctx: AutoInitContext):
+    ctx.register_singleton(Config)
+    ctx.get_instance(Request)
+    child = ctx.child()
+    child.register_instance(Audit())
+
+    assert child.is_custom_provided_type(Config) and child.is_custom_provided_type(Audit)
+    assert not ctx.is_custom_provided_type(Audit)
+    assert child.get_instance(Request).config is ctx.get_instance(Config)
+    assert Request not in child._plans.local
+
+
+def test_child_does_not_use_parent_plans_compiled_after_its_registration():
+    ctx = AutoInitContext(codegen=True)
+    child = ctx.child()
+    config = Config()
+    child.register_instance(config)
+
+    assert ctx.get_instance(Request).session.config is not config
+    assert child.get_instance(Request).session.config is config
+
+
+class LocalConfig(Config):
+    pass
+
+
+class OverriddenConfig(Config):
+    pass
+
+
+@pytest.mark.parametrize('codegen', [False, True])
+@pytest.mark.parametrize('through_scope', [False, True])
+def test_parent_registration_evicts_plans_compiled_by_children(codegen: bool, through_scope: bool):
+    ctx = AutoInitContext(codegen=codegen)
+    ctx.register_factory(Config, LocalConfig)
+    # Registrations of the parent reach children of a child that still shares its plans
+    child = ctx.child().child() if through_scope else ctx.child()
+    child.register_singleton(Audit)
+    assert isinstance(child.get_instance(Request).session.config, LocalConfig)
+
+    ctx.register_factory(Config, OverriddenConfig, override=True)
+    assert isinstance(child.get_instance(Request).session.config, OverriddenConfig)
+    assert isinstance(child.get_instance(Config), OverriddenConfig)
+
+
+@pytest.mark.parametrize('codegen', [False, True])
+def test_parent_singleton_registered_after_child_compiled_is_shared(codegen: bool):
+    ctx = AutoInitContext(codegen=codegen)
+    child = ctx.child()
+    child.register_singleton(Audit)
+    child.get_instance(Request)
+
+    ctx.register_singleton(Config)
+    request = child.get_instance(Request)
+    assert request.config is request.session.config
+    assert request.config is child.get_instance(Config)
+    assert request.config is ctx.get_instance(Config)
+    assert Config not in child._singletons
+
+
+def test_parent_registration_keeps_registrations_of_children(ctx: AutoInitContext):
+    config = Config()
+    child = ctx.child()
+    child.register_instance(config)
+    child.get_instance(Request)
+
+    ctx.register_factory(Config, OverriddenConfig)
+    assert child.get_instance(Request).config is config
+    assert isinstance(ctx.get_instance(Request).config, OverriddenConfig)
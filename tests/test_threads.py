@@ -0,0 +1,125 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from auto_init.safe_context import CreationFailed
+
+
+class Connection:
+    created = 0
+
+    def __init__(self):
+        time.sleep(0.01)
+        Connection.created += 1
+
+
+class Repository:
+    connection: Connection
+
+
+class Service:
+    repository: Repository
+    peer: 'Peer'
+
+
+class Peer:
+    service: Service
+
+
+def resolve_concurrently(ctx, instance_types, threads=8):
+    barrier = threading.Barrier(threads)
+
+    def resolve(instance_type):
+        barrier.wait()
+        return ctx.get_instance(instance_type)
+
+    with ThreadPoolExecutor(threads) as executor:
+        return list(executor.map(resolve, [instance_types[i % len(instance_types)] for i in range(threads)]))
+
+
+def test_singleton_is_created_once_under_contention(ctx):
+    Connection.created = 0
+    ctx.register_singleton(Connection)
+
+    connections = resolve_concurrently(ctx, [Connection])
+    assert Connection.created == 1
+    assert all(c is connections[0] for c in connections)
+
+    repositories = resolve_concurrently(ctx, [Repository])
+    assert all(r.connection is connections[0] for r in repositories)
+
+
+def test_singleton_plan_compiled_concurrently_is_shared(ctx):
+    Connection.created = 0
+    ctx.register_singleton(Connection)
+    compile_plan = ctx._compile_plan
+    compiling = threading.Barrier(4)
+
+    def concurrent_compile_plan(instance_type):
+        plan = compile_plan(instance_type)
+        if instance_type is Connection:
+            # All threads have compiled their own plan before any of them publishes it
+            compiling.wait(timeout=5)
+        return plan
+
+    ctx._compile_plan = concurrent_compile_plan
+    connections = resolve_concurrently(ctx, [Connection], threads=4)
+    assert Connection.created == 1
+    assert all(c is connections[0] for c in connections)
+
+
+def test_singletons_with_circular_references_requested_from_many_threads(ctx):
+    ctx.register_singleton(Service)
+    ctx.register_singleton(Peer)
+
+    instances = resolve_concurrently(ctx, [Service, Peer])
+    service = ctx.get_instance(Service)
+    peer = ctx.get_instance(Peer)
+    assert service.peer is peer
+    assert peer.service is service
+    assert all(i is service or i is peer for i in instances)
+
+
+def test_pending_types_are_per_thread(ctx):
+    started = threading.Event()
+    release = threading.Event()
+
+    def blocking_connection():
+        if not started.is_set():
+            started.set()
+            release.wait(5)
+        return Connection.__new__(Connection)
+
+    ctx.register_factory(Connection, blocking_connection)
+
+    with ThreadPoolExecutor(1) as executor:
+        future = executor.submit(ctx.get_instance, Service)
+        assert started.wait(5)
+
+        # Service and Repository are being initialised in the other thread.
+        assert not ctx._pending_types
+        peer: Peer = ctx.get_instance(Peer)
+        assert isinstance(peer.service.repository, Repository)
+        assert peer.service.peer is None
+
+        release.set()
+        service: Service = future.result()
+        assert service.peer.service is None
+
+
+def test_failed_singleton_can_be_created_later(ctx):
+    attempts = []
+
+    def flaky_connection():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError('connection refused')
+        return Connection.__new__(Connection)
+
+    ctx.register_singleton(Connection, flaky_connection)
+    try:
+        ctx.get_instance(Connection)
+    except CreationFailed:
+        pass
+    assert ctx.get_instance(Connection) is ctx.get_instance(Connection)
+    assert len(attempts) == 2
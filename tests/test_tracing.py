@@ -0,0 +1,185 @@
+import threading
+import time
+
+import pytest
+
+from auto_init import AutoInitContext
+from auto_init.safe_context import CreationFailed
+from auto_init.tracing import CYCLE_BREAK, FACTORY_CALL, FAILURE, RESOLVE_END, RESOLVE_START, SINGLETON_HIT, TYPE_HINTS
+
+
+class Config:
+    pass
+
+
+class Connection:
+    config: Config
+
+
+class Node:
+    parent: 'Node'
+    config: Config
+
+
+class Service:
+    config: Config
+    connection: Connection
+    node: Node
+
+
+class Failing:
+    pass
+
+
+class Broken:
+    failing: Failing
+
+
+def fail():
+    raise ValueError('boom')
+
+
+async def make_connection():
+    return Connection()
+
+
+@pytest.fixture
+def events(ctx: AutoInitContext):
+    events = []
+    ctx.add_hook(lambda event: events.append((event.name, event.instance_type)))
+    return events
+
+
+def test_no_instrumentation_without_hooks(ctx: AutoInitContext):
+    hook = [].append
+    ctx.add_hook(hook)
+    assert '_provide' in ctx.__dict__
+    ctx.remove_hook(hook)
+    assert '_provide' not in ctx.__dict__
+
+
+def test_events(ctx: AutoInitContext, events):
+    ctx.register_singleton(Config)
+    ctx.register_factory(Connection, Connection)
+    ctx.get_instance(Service)
+
+    resolutions = [e for e in events if e[0] != TYPE_HINTS]
+    assert resolutions == [
+        (RESOLVE_START, Service),
+        (RESOLVE_START, Config),
+        (RESOLVE_END, Config),
+        (RESOLVE_START, Connection),
+        (FACTORY_CALL, Connection),
+        (RESOLVE_END, Connection),
+        (RESOLVE_START, Node),
+        (CYCLE_BREAK, Node),
+        (SINGLETON_HIT, Config),
+        (RESOLVE_END, Node),
+        (RESOLVE_END, Service),
+    ]
+    assert (TYPE_HINTS, Service) in events
+
+
+def test_failure_events(ctx: AutoInitContext, events):
+    ctx.register_factory(Failing, fail)
+    with pytest.raises(Exception):
+        ctx.get_instance(Broken)
+    assert events[-2:] == [(FAILURE, Failing), (FAILURE, Broken)]
+
+
+def test_stats(ctx: AutoInitContext):
+    ctx.register_singleton(Config)
+    ctx.enable_stats()
+    ctx.get_instance(Service)
+    ctx.get_instance(Service)
+
+    stats = ctx.stats()
+    assert stats['types'][Service]['resolved'] == 2
+    assert stats['types'][Service]['max_time'] <= stats['types'][Service]['total_time']
+    assert stats['types'][Node]['cycle_breaks'] == 2
+    assert stats['singletons'] == {'hits': 5, 'misses': 1, 'hit_rate': 5 / 6}
+    assert stats['type_hints']['hit_rate'] is not None
+
+
+def test_record_tree(ctx: AutoInitContext):
+    ctx.register_singleton(Config)
+    with ctx.record_tree() as tree:
+        ctx.get_instance(Service)
+    ctx.get_instance(Service)
+
+    [root] = tree.to_dict()
+    assert root['type'] == 'Service'
+    assert [c['type'] for c in root['children']] == ['Config', 'Connection', 'Node']
+    assert root['duration'] > 0
+    lines = tree.folded().splitlines()
+    assert lines[0].startswith('Service ')
+    assert any(line.startswith('Service;Connection;Config ') for line in lines)
+    assert not ctx._hooks
+
+
+def test_traced_async_resolution(ctx: AutoInitContext, run):
+    ctx.register_factory(Connection, make_connection)
+    ctx.enable_stats()
+    run(ctx.aget_instance(Service))
+
+    stats = ctx.stats()['types']
+    assert stats[Connection]['factory_calls'] == 1
+    assert stats[Service]['resolved'] == 1
+    assert stats[Config]['resolved'] == 2
+
+    with pytest.raises(CreationFailed):
+        ctx.get_instance(Service)
+
+
+def test_child_does_not_inherit_hooks(ctx: AutoInitContext, events):
+    child = ctx.child()
+    child.get_instance(Config)
+    assert events == []
+
+
+def test_child_resolutions_do_not_hide_creations_from_parent_hooks(ctx: AutoInitContext, events):
+    ctx.register_factory(Connection, Connection)
+    ctx.child().get_instance(Service)
+    ctx.get_instance(Service)
+    assert (FACTORY_CALL, Connection) in events
+
+
+def test_child_sharing_plans_compiles_them_for_parent_hooks(ctx: AutoInitContext):
+    ctx.register_factory(Connection, Connection)
+    child = ctx.child()
+    events = []
+    ctx.add_hook(lambda event: events.append((event.name, event.instance_type)))
+
+    child.get_instance(Service)
+    ctx.get_instance(Service)
+    assert (FACTORY_CALL, Connection) in events
+
+
+def test_hooks_added_while_singleton_is_created(ctx: AutoInitContext):
+    started = threading.Event()
+    proceed = threading.Event()
+    calls = []
+
+    def connect():
+        calls.append(1)
+        started.set()
+        proceed.wait()
+        return Connection()
+
+    ctx.register_factory(Connection, connect)
+    ctx.register_singleton(Service)
+    created = []
+    threads = [threading.Thread(target=lambda: created.append(ctx.get_instance(Service))) for _ in range(2)]
+    threads[0].start()
+    started.wait()
+
+    with ctx.record_tree():
+        threads[1].start()
+        # Let the second thread wait for the creation in progress
+        time.sleep(0.02)
+        proceed.set()
+        for thread in threads:
+            thread.join()
+
+    assert calls == [1]
+    assert created[0] is created[1]
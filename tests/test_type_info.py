@@ -0,0 +1,79 @@
+import sys
+import typing
+from typing import Dict, List, Optional, TypeVar, Union
+
+import pytest
+
+from auto_init.compat import ForwardRef
+from auto_init.type_info import classify_type, none_factory
+
+T = TypeVar('T')
+
+
+class Item:
+    pass
+
+
+class Box(typing.Generic[T]):
+    item: T
+
+
+# Builtin generics require Python 3.9
+BUILTIN_GENERICS = [(list[Item], list), (dict[str, Item], dict)] if sys.version_info >= (3, 9) else []
+
+# The union operator requires Python 3.10
+UNION_OPERATORS = [(Item | None, none_factory), (Item | str, none_factory)] if sys.version_info >= (3, 10) else []
+
+
+def test_classification_is_memoised():
+    assert classify_type(Dict[str, Item]) is classify_type(Dict[str, Item])
+    assert classify_type(Item) is classify_type(Item)
+
+
+def test_equal_annotations_share_the_key():
+    a = Dict[str, Item]
+    b = typing.Dict[str, Item].copy_with((str, Item))
+    assert a is not b
+    assert classify_type(a).key is classify_type(b).key
+
+
+@pytest.mark.parametrize('annotation, factory', [
+    (List, list),
+    (List[Item], list),
+    (Dict[str, Item], dict),
+    (typing.Tuple[Item, Item], none_factory),
+    (typing.Callable, none_factory),
+    (typing.Any, none_factory),
+    (Optional[Item], none_factory),
+    (Union[Item, str], none_factory),
+    (ForwardRef('Item'), none_factory),
+    (Item, Item),
+    (Box[Item], Box[Item]),
+    *BUILTIN_GENERICS,
+    *UNION_OPERATORS,
+])
+def test_factory(annotation, factory):
+    assert classify_type(annotation).factory == factory
+
+
+def test_flags():
+    assert classify_type(Optional[Item]).is_optional
+    assert classify_type(Union[Item, str]).is_union
+    assert not classify_type(Union[Item, str]).is_optional
+    assert classify_type(typing.ClassVar[int]).is_classvar
+    assert classify_type(ForwardRef('Item')).is_forward_ref
+    assert classify_type(typing.Tuple[int]).is_tuple
+
+
+@pytest.mark.skipif(sys.version_info < (3, 10), reason='The union operator requires Python 3.10')
+def test_union_operator_flags():
+    info = classify_type(Item | None)
+    assert info.is_union and info.is_optional and info.is_typing
+    assert info.hints_type is None
+    assert not classify_type(Item).is_typing
+    assert classify_type(Box[Item]).hints_type is Box
+
+
+def test_registered_factory_of_parametrised_generic(ctx):
+    ctx.register_factory(Dict[str, Item], dict)
+    assert ctx.is_custom_provided_type(typing.Dict[str, Item].copy_with((str, Item)))
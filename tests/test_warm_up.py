@@ -0,0 +1,125 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from auto_init import AutoInitContext
+from auto_init.safe_context import WarmUpFailed
+
+
+class Config:
+    pass
+
+
+# Threads that created instances of slow types
+created = []
+
+# Slow types being created, and the number of those created at the same time
+running = []
+overlaps = []
+running_lock = threading.Lock()
+
+
+class Slow:
+    def __init__(self):
+        created.append((type(self), threading.get_ident()))
+        with running_lock:
+            running.append(self)
+        time.sleep(0.05)
+        with running_lock:
+            overlaps.append(len(running))
+            running.remove(self)
+
+
+class Database(Slow):
+    config: Config
+
+
+class Cache(Slow):
+    config: Config
+
+
+class Client(Slow):
+    config: Config
+
+
+class Session:
+    # Transient between two singletons
+    database: Database
+
+
+class Service:
+    session: Session
+    cache: Cache
+
+
+class Left:
+    right: 'Right'
+
+
+class Right:
+    left: Left
+
+
+Left.__annotations__['right'] = Right
+
+
+class Broken:
+    pass
+
+
+def test_independent_singletons_are_created_concurrently_after_their_dependencies(ctx: AutoInitContext):
+    created.clear()
+    overlaps.clear()
+    for cls in (Config, Database, Cache, Client, Service):
+        ctx.register_singleton(cls)
+
+    with ThreadPoolExecutor(4) as executor:
+        ctx.warm_up([Service, Client], executor=executor)
+
+    assert max(overlaps) == 3
+    assert ctx.cache_sizes()['singletons'] == 5
+    assert len({thread for _, thread in created}) == 3
+    service = ctx.get_instance(Service)
+    assert service.session.database is ctx.get_instance(Database)
+    assert service.cache.config is ctx.get_instance(Config)
+
+
+def test_only_singletons_reachable_from_roots_are_created(ctx: AutoInitContext):
+    for cls in (Config, Database, Client, Broken):
+        ctx.register_singleton(cls)
+
+    with ThreadPoolExecutor(2) as executor:
+        ctx.warm_up([Session], executor=executor)
+
+    assert set(ctx._singletons) == {Config, Database}
+    # Compiled all the same
+    assert Client in ctx._plans and Broken in ctx._plans
+
+
+def test_circular_singletons_are_created_together(ctx: AutoInitContext):
+    ctx.register_singleton(Left)
+    ctx.register_singleton(Right)
+    with ThreadPoolExecutor(2) as executor:
+        ctx.warm_up(executor=executor)
+
+    left = ctx.get_instance(Left)
+    assert left.right.left is left
+
+
+def test_errors_are_reported_together(ctx: AutoInitContext):
+    def fail():
+        raise RuntimeError('unavailable')
+
+    ctx.register_singleton(Config, fail)
+    ctx.register_singleton(Database)
+    ctx.register_singleton(Broken, fail)
+    ctx.register_singleton(Left)
+
+    with ThreadPoolExecutor(2) as executor:
+        with pytest.raises(WarmUpFailed) as exc_info:
+            ctx.warm_up(executor=executor)
+
+    assert set(exc_info.value.errors) == {Config, Database, Broken}
+    assert ctx.cache_sizes()['singletons'] == 1